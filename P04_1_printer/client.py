@@ -4,7 +4,36 @@
 """
 Client script that sends a text to a server.
 
-Usage: client.py [-h] [--host HOST] [--port PORT] [--text]
+With --file, the client streams a whole document (of any size) to the server
+through a print job instead: the document is read and sent in chunks, with at
+most INFLIGHT of them pending at a time, so the memory used is bounded. The
+server keeps the chunks that arrive out of order only within a window (16 MiB
+by default), so INFLIGHT * CHUNK_SIZE must stay below it.
+
+The text can be sent REQUESTS times. Since printString returns nothing, the
+requests can be oneway (--mode oneway: the client does not wait for a reply)
+or batched oneway (--mode batch: they are queued by the client and sent
+together every FLUSH_EVERY requests). When the server falls behind, the
+connection fills up and the client waits (backpressure). At the end, the
+client waits until the server has printed them all: it polls the number of
+texts printed (a twoway call), which works with any number of dispatch
+threads in the server, whereas the reply to a single call may overtake the
+oneway requests sent before it.
+
+With --compress-threshold, the chunks and texts of at least that many bytes
+are sent compressed (bzip2), which saves bandwidth on slow networks at the
+cost of CPU. The chunks are read into a reused buffer and sent from it
+without any copy.
+
+With --transport udp, the requests are sent as datagrams instead (oneway by
+default, or batched): there is no connection to set up and no backpressure,
+but the datagrams the server cannot keep up with are lost (the client reports
+how many texts were printed). Documents can only be streamed over TCP, since
+their chunks must be acknowledged.
+
+Usage: client.py [-h] [--host HOST] [--port PORT] [--text] [--file FILE] [--chunk-size CHUNK_SIZE] [--inflight INFLIGHT]
+                 [--mode {twoway,oneway,batch}] [--transport {tcp,udp}] [--requests REQUESTS] [--flush-every FLUSH_EVERY]
+                 [--compress-threshold COMPRESS_THRESHOLD]
 
 Printer client script.
 
@@ -14,6 +43,21 @@ options:
                         Communication via the host. Use localhost (default) or give an IP address (e.g., 192.168.1.140).
   --port PORT, -p PORT  Port number. Use port 10000 (default) onwards.
   --text, -t            Allows text to be entered via the terminal.
+  --file FILE, -f FILE  Document streamed to the printer. Use - for the standard input (disabled by default).
+  --chunk-size CHUNK_SIZE, -cs CHUNK_SIZE
+                        Bytes sent per chunk of the document (default: 524288).
+  --inflight INFLIGHT, -i INFLIGHT
+                        Maximum number of chunks in flight (default: 8).
+  --mode {twoway,oneway,batch}, -m {twoway,oneway,batch}
+                        Invocation mode of printString (default: twoway, or oneway over UDP).
+  --transport {tcp,udp}, -tr {tcp,udp}
+                        Transport of the printString requests (default: tcp). UDP only allows the oneway and batch modes.
+  --requests REQUESTS, -r REQUESTS
+                        Number of times the text is sent (default: 1).
+  --flush-every FLUSH_EVERY, -fe FLUSH_EVERY
+                        Requests queued before a batch is sent, in batch mode (default: 1000).
+  --compress-threshold COMPRESS_THRESHOLD, -ct COMPRESS_THRESHOLD
+                        Compress the requests with a payload of at least the given bytes, e.g., 65536 for texts over a slow network. Use 0 (default) to never compress.
 
 Author: Andres J. Sanchez-Fernandez
 Email: sfandres@unex.es
@@ -23,8 +67,14 @@ Version: v1
 
 
 import sys, Ice                                                                                 # Import the sys and Ice libraries (Ice runtime).
-import Printer                                                                                  # Import the Printer module (proxies and skeletons).
 import argparse                                                                                 # Import the argparse library for cmd arguments.
+import os, time, collections                                                                    # Import the os, time and collections libraries.
+
+PATIENCE = 1.0                                                                                  # Seconds without new texts printed after which the rest are taken as lost.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))         # Make the shared 'common' package (repository root) importable.
+from common import payloads, proxies                                                            # Import the shared payload and proxy pool modules.
+import Printer                                                                                  # Import the Printer module (proxies and skeletons), after the shared package its sequences use.
 
 
 def get_args() -> argparse.Namespace:
@@ -46,7 +96,99 @@ def get_args() -> argparse.Namespace:
     parser.add_argument('--text', '-t', action='store_true',
                         help='Allows text to be entered via the terminal.')
 
-    return parser.parse_args(sys.argv[1:])                                                      # Parse and return the arguments.
+    parser.add_argument('--file', '-f', type=str, default=None,
+                        help='Document streamed to the printer. Use - for the standard input (disabled by default).')
+
+    parser.add_argument('--chunk-size', '-cs', type=int, default=512 * 1024,
+                        help='Bytes sent per chunk of the document (default: 524288).')
+
+    parser.add_argument('--inflight', '-i', type=int, default=8,
+                        help='Maximum number of chunks in flight (default: 8).')
+
+    parser.add_argument('--mode', '-m', type=str, choices=('twoway', 'oneway', 'batch'), default=None,
+                        help='Invocation mode of printString (default: twoway, or oneway over UDP).')
+
+    parser.add_argument('--transport', '-tr', type=str, choices=('tcp', 'udp'), default='tcp',
+                        help='Transport of the printString requests (default: tcp). UDP only allows the oneway and batch modes.')
+
+    parser.add_argument('--requests', '-r', type=int, default=1,
+                        help='Number of times the text is sent (default: 1).')
+
+    parser.add_argument('--flush-every', '-fe', type=int, default=1000,
+                        help='Requests queued before a batch is sent, in batch mode (default: 1000).')
+
+    payloads.add_compression_args(parser)
+
+    args = parser.parse_args(sys.argv[1:])                                                      # Parse the arguments.
+    if args.mode is None:
+        args.mode = 'oneway' if args.transport == 'udp' else 'twoway'
+    if args.transport == 'udp' and (args.mode == 'twoway' or args.file):                        # Datagrams get no reply.
+        parser.error('UDP only allows the oneway and batch modes, and no --file')
+    return args                                                                                 # Return the arguments.
+
+
+def stream(server, path: str, chunk_size: int, inflight: int, compress_threshold: int = 0) -> int:
+    """
+    Stream a document to the printer through a print job.
+
+    Args:
+        server: The 'Operation' proxy of the printer.
+        path: Path of the document ('-' for the standard input).
+        chunk_size: Bytes sent per chunk.
+        inflight: Maximum number of chunks sent and not yet acknowledged.
+        compress_threshold: Chunk size from which the chunks are compressed (0 to never compress).
+
+    Returns:
+        The number of bytes written by the printer.
+    """
+    source = sys.stdin.buffer if path == '-' else open(path, 'rb', buffering=0)                 # Unbuffered: read straight into our buffer.
+    job = server.openJob(os.path.basename(path) if path != '-' else 'stdin')                    # Start the print job and get its proxy.
+    compression = payloads.Compression(job, compress_threshold)
+
+    buffer = bytearray(chunk_size)                                                              # Reused for every chunk: the request is marshalled
+                                                                                                # from it before appendAsync returns.
+    pending = collections.deque()                                                               # Chunks sent and not yet acknowledged.
+    offset = 0
+    with source:
+        while True:
+            size = source.readinto(buffer)
+            if not size:
+                break
+            chunk = buffer if size == chunk_size else buffer[:size]                             # IcePy sends a bytearray straight from its memory
+                                                                                                # (a memoryview would be sent byte by byte).
+            if len(pending) >= inflight:                                                        # Wait for the oldest chunk before sending more,
+                pending.popleft().result()                                                      # so at most 'inflight' chunks are pending.
+            pending.append(compression.proxy(size).appendAsync(offset, chunk))
+            offset += size
+        for future in pending:
+            future.result()
+
+    return job.close()                                                                          # Flush the buffered bytes and end the job.
+
+
+def wait_printed(server, before: int, requests: int) -> int:
+    """
+    Wait until the printer has printed the texts sent without reply.
+
+    Args:
+        server: The (twoway) 'Operation' proxy of the printer.
+        before: Number of texts printed by the server before they were sent.
+        requests: Number of texts sent.
+
+    Returns:
+        The number of texts printed since they were sent, which is lower than 'requests' if some were lost
+        (datagrams) or dropped (admission control) and no new text was printed for PATIENCE seconds.
+    """
+    printed, progress = 0, time.monotonic()
+    while True:
+        count = server.printed() - before                                                       # Also counts the texts of other clients, if any.
+        if count >= requests:
+            return requests
+        if count > printed:
+            printed, progress = count, time.monotonic()
+        elif time.monotonic() - progress > PATIENCE:
+            return printed
+        time.sleep(0.005)
 
 
 def main(args: argparse.Namespace) -> bool:
@@ -66,18 +208,51 @@ def main(args: argparse.Namespace) -> bool:
 
     print(f'Host: {args.host} (connecting port: {args.port})')                                  # Print the host address and port number.
 
-    with Ice.initialize(sys.argv) as communicator:                                              # Initialize the Ice run time and create a communicator.
+    server = proxies.get(                                                                       # Get the 'Operation' proxy of the 'SimplePrinter' object, which can be communicated
+        f'SimplePrinter:default -h {args.host} -p {args.port}',                                 # with via the host with the IP address or localhost using the specified
+        Printer.OperationPrx                                                                    # port number and the default communication protocol. The proxy is checked
+    )                                                                                           # (checkedCast) only the first time and then reused with its connection.
+
+    if args.file:                                                                               # Stream the document, if given.
+        start = time.perf_counter()
+        written = stream(server, args.file, args.chunk_size, args.inflight, args.compress_threshold)
+        elapsed = time.perf_counter() - start
+        print(f'Document sent correctly to the printer! ({written} bytes in {elapsed:.3f} s, '
+              f'{written / elapsed / 2**20:.1f} MiB/s)')
+        return 0
 
-        proxy = communicator.stringToProxy(                                                     # Create a proxy for the 'SimplePrinter' object, which can be communicated
-            f'SimplePrinter:default -h {args.host} -p {args.port}'                              # with via the host with the IP address or localhost using the specified
-        )                                                                                       # port number and the default communication protocol.
+    if args.transport == 'udp':                                                                 # Proxy used for the requests over UDP: datagram
+        datagram = proxies.get(                                                                 # (sent at once) or batched datagram (queued and
+            f'SimplePrinter:udp -h {args.host} -p {args.port}',                                 # sent together, in datagrams of at most 64 KiB).
+            Printer.OperationPrx, validate=False                                                # Datagrams get no reply, so it cannot be checked.
+        )
+        printer = datagram.ice_datagram() if args.mode == 'oneway' else datagram.ice_batchDatagram()
+    else:
+        printer = {                                                                             # Proxy used for the requests: twoway (waits for each
+            'twoway': server,                                                                   # reply), oneway (does not wait) or batched oneway
+            'oneway': server.ice_oneway(),                                                      # (queued and sent together). All of them share the
+            'batch': server.ice_batchOneway(),                                                  # same connection.
+        }[args.mode]
+        compression = payloads.Compression(printer, args.compress_threshold)                    # Compress the text if it is large enough (a compressed
+        printer = compression.proxy(len(text.encode()))                                         # proxy uses a connection of its own).
 
-        server = Printer.OperationPrx.checkedCast(proxy)                                        # Cast the given 'proxy' to a 'Operation' proxy and assign the resulting
-        if not server:                                                                          # object to the variable 'server'. This allows communication with the
-            raise RuntimeError('Invalid proxy')                                                 # remote 'Operation' object via the 'server' object.
+    before = server.printed() if args.mode != 'twoway' else 0                                   # Texts printed so far, to wait for ours at the end.
+    start = time.perf_counter()
+    for i in range(args.requests):
+        printer.printString(text)                                                               # Call the 'printString' method on the 'server' object, passing the 'text'.
+        if args.mode == 'batch' and (i + 1) % args.flush_every == 0:
+            printer.ice_flushBatchRequests()                                                    # Send the queued requests.
+    if args.mode == 'batch':
+        printer.ice_flushBatchRequests()
+    printed = wait_printed(server, before, args.requests) if args.mode != 'twoway' else args.requests
+    elapsed = time.perf_counter() - start
 
-        server.printString(text)                                                                # Call the 'printString' method on the 'server' object, passing the 'text'.
+    if printed < args.requests:
+        print(f'Only {printed} of {args.requests} texts were printed (the rest were lost or dropped).')
+    else:
         print(f'Text sent correctly to the printer!')
+    if args.requests > 1:
+        print(f'{args.requests} requests in {elapsed:.3f} s ({args.requests/elapsed:.0f} requests/s)')
 
     return 0
 
@@ -4,13 +4,90 @@
 """
 Server script that displays a received text in the terminal.
 
-Usage: server.py [-h] [--port PORT]
+Large documents are streamed through print jobs: the client opens a job and
+appends the document in chunks, which the server coalesces in a buffer and
+writes in large blocks to the terminal or to a file per job (--output-dir),
+named after the document and the id of the job so that jobs of documents with
+the same name never share a file.
+The chunks are received without any copy (see common/payloads.py) and copied
+only once, into the buffer. The operations of the jobs are dispatched
+asynchronously (["amd"] in Printer.ice): the blocks are written in order by a
+single writer thread, and the dispatch thread returns a future that the
+writer completes, so it can go on receiving chunks while a block is being
+written. The jobs idle for longer than --job-timeout (e.g., those of clients
+that disappeared without closing them) are closed by a background thread.
+
+The requests are dispatched in order by a single thread, so oneway and batched
+requests flooding the server are slowed down by the connection (backpressure).
+The texts are written to the buffered standard output, not through the logger
+(which samples, rate limits and drops records, and adds a prefix to them), so
+none is dropped: the dispatch thread waits while the terminal catches up.
+
+The operation printed returns the number of texts printed so far, so the
+clients can wait until the texts they sent without reply have been printed
+(with several dispatch threads, a reply may overtake the oneway requests sent
+before it, so waiting for any reply is not enough).
+
+The server also listens on UDP, so the clients can send printString as
+datagrams (no connection, at the cost of lost or reordered texts).
+
+Usage: server.py [-h] [--port PORT] [--output-dir OUTPUT_DIR] [--buffer-size BUFFER_SIZE] [--job-timeout JOB_TIMEOUT]
+                 [--endpoints ENDPOINTS [ENDPOINTS ...]] [--threads THREADS] [--max-threads MAX_THREADS] [--message-size-max MESSAGE_SIZE_MAX]
+                 [--tcp-buffer-size TCP_BUFFER_SIZE] [--compress] [--acm-timeout ACM_TIMEOUT] [--config CONFIG] [--ice-property KEY=VALUE]
+                 [--log-level {DEBUG,INFO,WARNING,ERROR,CRITICAL}] [--log-format {text,json}]
+                 [--log-sample LOG_SAMPLE] [--log-rate LOG_RATE] [--log-queue LOG_QUEUE] [--log-overflow {drop,block}]
+                 [--metrics-port METRICS_PORT] [--trace-slow TRACE_SLOW]
+                 [--max-inflight MAX_INFLIGHT] [--operation-limit OPERATION=N] [--rate-limit RATE_LIMIT] [--burst BURST]
 
 Printer server script.
 
 options:
   -h, --help            show this help message and exit
   --port PORT, -p PORT  Port number. Use port 10000 (default) onwards.
+  --output-dir OUTPUT_DIR, -o OUTPUT_DIR
+                        Directory where each print job is written to a file. Use none (default) for the terminal.
+  --buffer-size BUFFER_SIZE, -b BUFFER_SIZE
+                        Bytes of a print job buffered before they are written (default: 4194304).
+  --job-timeout JOB_TIMEOUT, -jt JOB_TIMEOUT
+                        Seconds without chunks after which a print job is closed. Use 0 to keep them (default: 300).
+  --endpoints ENDPOINTS [ENDPOINTS ...], -e ENDPOINTS [ENDPOINTS ...]
+                        Endpoints of the adapter, where {port} is the port number, e.g., "tcp -p {port}" "udp -p {port}" (default: "default -p {port}" "udp -p {port}").
+  --threads THREADS, -t THREADS
+                        Initial number of threads dispatching requests (default: 1).
+  --max-threads MAX_THREADS, -mt MAX_THREADS
+                        Maximum number of dispatch threads; the pool grows on demand up to it (default: --threads).
+  --message-size-max MESSAGE_SIZE_MAX
+                        Maximum size of a message in KiB. Use 0 for no limit (default: 1024).
+  --tcp-buffer-size TCP_BUFFER_SIZE
+                        Size in bytes of the TCP receive and send buffers (default: system).
+  --compress            Publish the endpoints with compression, so the proxies created by the server compress.
+  --acm-timeout ACM_TIMEOUT
+                        Seconds after which the idle connections are closed. Use 0 to keep them (default: 60).
+  --config CONFIG       Configuration file with Ice properties (disabled by default).
+  --ice-property KEY=VALUE
+                        Ice property, e.g., Ice.Trace.Network=1 (may be repeated).
+  --log-level {DEBUG,INFO,WARNING,ERROR,CRITICAL}, -l {DEBUG,INFO,WARNING,ERROR,CRITICAL}
+                        Logging level. Use DEBUG to trace every request (default: INFO).
+  --log-format {text,json}
+                        Format of the log records (default: text).
+  --log-sample LOG_SAMPLE
+                        Fraction of the records below WARNING that are kept (default: 1.0).
+  --log-rate LOG_RATE   Maximum records per second below WARNING. Use 0 (default) for no limit.
+  --log-queue LOG_QUEUE
+                        Maximum number of records waiting to be written (default: 10000).
+  --log-overflow {drop,block}
+                        What to do with a record when the queue is full: drop it (default) or wait for room.
+  --metrics-port METRICS_PORT
+                        Port of the local HTTP endpoint of the metrics. Use 0 (default) to disable it.
+  --trace-slow TRACE_SLOW
+                        Log the calls slower than the given milliseconds. Use 0 (default) to disable it.
+  --max-inflight MAX_INFLIGHT
+                        Maximum number of calls in progress at a time. Use 0 (default) for no limit.
+  --operation-limit OPERATION=N
+                        Maximum number of calls of an operation in progress at a time, e.g., applyBatch=4 (may be repeated).
+  --rate-limit RATE_LIMIT
+                        Maximum number of calls admitted per second. Use 0 (default) for no limit.
+  --burst BURST         Number of calls admitted at once above --rate-limit (default: one second of calls).
 
 Author: Andres J. Sanchez-Fernandez
 Email: sfandres@unex.es
@@ -20,8 +97,21 @@ Version: v1
 
 
 import sys, Ice                                                                                 # Import the sys and Ice libraries (Ice runtime).
-import Printer                                                                                  # Import the Printer module (proxies and skeletons).
 import argparse                                                                                 # Import the argparse library for cmd arguments.
+import os, logging                                                                              # Import the os and logging libraries.
+import threading, time, uuid                                                                    # Import the threading, time and uuid libraries for the print jobs.
+from concurrent.futures import ThreadPoolExecutor                                               # Import the thread pool that writes the blocks of the print jobs.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))         # Make the shared 'common' package (repository root) importable.
+from common import bootstrap, logger, metrics, admission                                        # Import the shared start-up, logging, metrics and admission control modules.
+import Printer                                                                                  # Import the Printer module (proxies and skeletons), after the shared package its sequences use.
+
+EARLY_BLOCKS = 4                                                                                # Chunks received out of order are kept up to this many blocks
+                                                                                                # (buffer_size bytes each) ahead of the ones in order.
+
+log = logging.getLogger('SimplePrinter')                                                        # Logger used by the servant for diagnostics (configured in main).
+
+stdout_lock = threading.Lock()                                                                  # Serializes the writes of the texts and of the blocks to the terminal.
 
 
 def get_args() -> argparse.Namespace:
@@ -36,20 +126,252 @@ def get_args() -> argparse.Namespace:
     parser.add_argument('--port', '-p', type=int, default=10000,                                # Options.
                         help='Port number. Use port 10000 (default) onwards.')
 
+    parser.add_argument('--output-dir', '-o', type=str, default=None,
+                        help='Directory where each print job is written to a file. Use none (default) for the terminal.')
+
+    parser.add_argument('--buffer-size', '-b', type=int, default=4 * 1024 * 1024,
+                        help='Bytes of a print job buffered before they are written (default: 4194304).')
+
+    parser.add_argument('--job-timeout', '-jt', type=float, default=300.0,
+                        help='Seconds without chunks after which a print job is closed. Use 0 to keep them (default: 300).')
+
+    bootstrap.add_ice_args(parser, endpoints=('default -p {port}', 'udp -p {port}'))            # Listen on TCP and UDP (datagrams).
+    logger.add_logging_args(parser)
+    metrics.add_metrics_args(parser)
+    admission.add_admission_args(parser)
+
     return parser.parse_args(sys.argv[1:])                                                      # Parse and return the arguments.
 
 
+@metrics.instrument
+@admission.limited(Printer.Overloaded, exempt=('printed',), drop=('printString',))               # printString is sent oneway: its excess calls are dropped.
 class OperationI(Printer.Operation):                                                            # Define a class that inherits from the 'Operation' class in the 'Printer' module.
     """
     Class that implements the 'Operation' interface.
     This class inherits from the 'Operation' class in the 'Printer' module.
 
+    Attributes:
+        writer (ThreadPoolExecutor): Single thread that writes the blocks of all the print jobs.
+        output_dir (str): Directory of the files of the print jobs (None for the terminal).
+        buffer_size (int): Bytes of a print job buffered before they are written.
+        job_timeout (float): Seconds without chunks after which a print job is closed (0 to keep them).
+        texts (int): Number of texts printed so far.
+        jobs (dict): Print jobs in progress, by the name of their identity.
+
     Methods:
         printString(s, current=None): Method that prints the given string.
+        printed(current=None): Method that returns the number of texts printed so far.
+        openJob(name, current=None): Method that starts a print job and returns its proxy.
+        reap: Closes the print jobs idle for longer than the timeout.
+        start / stop: Start the thread that closes the idle jobs, and stop it closing every job left.
     """
+    def __init__(self, writer: ThreadPoolExecutor, output_dir: str = None, buffer_size: int = 4 * 1024 * 1024,
+                 job_timeout: float = 300.0):
+        self.writer = writer
+        self.output_dir = output_dir
+        self.buffer_size = buffer_size
+        self.job_timeout = job_timeout
+        self.texts = 0
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper = threading.Thread(target=self._run, name='JobReaper', daemon=True)
+
     def printString(self, s, current=None):
         """Method that prints the given string."""
-        print(s)
+        with stdout_lock:
+            sys.stdout.write(s + '\n')                                                          # Never dropped: flushed at each line on a terminal, in blocks otherwise.
+            self.texts += 1
+        log.debug('Printed a text of %d characters', len(s))
+
+    def printed(self, current=None):
+        """Method that returns the number of texts printed so far."""
+        return self.texts
+
+    def openJob(self, name, current=None):
+        """Method that starts a print job and returns its proxy."""
+        identity = Ice.Identity(str(uuid.uuid4()), 'job')
+        if self.output_dir:
+            filename = f'{os.path.basename(name) or "job"}.{identity.name}'                     # One file per job, even for documents with the same name,
+            path = os.path.join(self.output_dir, filename)                                      # kept inside the output directory.
+            sink = open(path, 'wb')                                                             # The large writes of the job bypass the file buffer.
+        else:
+            sink = None
+        job = JobI(name, sink, self.buffer_size, self.writer, current.adapter, identity, self._release)
+        with self._lock:
+            self.jobs[identity.name] = job
+        log.info('Print job %s started (%s)', name, identity.name)
+        return Printer.JobPrx.uncheckedCast(current.adapter.add(job, identity))
+
+    def _release(self, identity: Ice.Identity) -> None:
+        """Forgets a print job once it has ended."""
+        with self._lock:
+            self.jobs.pop(identity.name, None)
+
+    def reap(self) -> int:
+        """Closes the print jobs idle for longer than the timeout and returns how many were closed."""
+        cutoff = time.monotonic() - self.job_timeout
+        with self._lock:
+            idle = [job for job in self.jobs.values() if job.seen < cutoff]
+        for job in idle:
+            log.warning('Print job %s idle for %.0f s: closed', job.name, time.monotonic() - job.seen)
+            job.end()
+        return len(idle)
+
+    def start(self) -> None:
+        """Starts the thread that closes the idle print jobs (if there is a timeout)."""
+        if self.job_timeout > 0:
+            self._reaper.start()
+
+    def stop(self) -> None:
+        """Stops the thread that closes the idle print jobs and closes every job left, so their files are complete."""
+        self._stop.set()
+        with self._lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.end()
+
+    def _run(self) -> None:
+        """Closes the idle print jobs periodically (four times per timeout)."""
+        while not self._stop.wait(max(self.job_timeout / 4, 1.0)):
+            self.reap()
+
+
+@metrics.instrument
+@admission.limited(Printer.Overloaded)
+class JobI(Printer.Job):
+    """
+    Class that implements the 'Job' interface: a document streamed in chunks.
+
+    The chunks are put in order by their offset (they may be dispatched out of
+    order by several threads), coalesced in a buffer and written in blocks of
+    at least 'buffer_size' bytes, so the writes are few and large. The blocks
+    are handed over to the writer thread, and the operations return a future
+    completed once their block is written (asynchronous dispatch). The chunks
+    received out of order are kept only within a window of EARLY_BLOCKS blocks
+    after the bytes received in order (and up to that many bytes in total), so
+    a client that skips an offset cannot make the server keep the rest of the
+    document in memory; the chunks beyond the window are rejected (JobError).
+
+    Attributes:
+        name (str): Name of the document.
+        sink: File where the document is written (None for the terminal).
+        buffer_size (int): Bytes buffered before they are written.
+        writer (ThreadPoolExecutor): Single thread that writes the blocks in order.
+        adapter (Ice.ObjectAdapter): Adapter of the job.
+        identity (Ice.Identity): Identity of the job in the adapter.
+        release: Function called with the identity when the job ends.
+        received (int): Bytes received in order so far.
+        written (int): Bytes written so far (updated by the writer thread).
+        seen (float): Time (monotonic) of the last call to the job.
+        ended (bool): Whether the job has ended.
+
+    Methods:
+        append(offset, chunk, current=None): Method that adds a chunk of the document.
+        flush(current=None): Method that writes the buffered bytes and returns the bytes written.
+        close(current=None): Method that flushes and ends the job, and returns the bytes written.
+        end: Writes the last block, closes the sink and removes the job from the adapter.
+    """
+    def __init__(self, name: str, sink, buffer_size: int, writer: ThreadPoolExecutor,
+                 adapter: Ice.ObjectAdapter, identity: Ice.Identity, release):
+        self.name = name
+        self.sink = sink
+        self.buffer_size = buffer_size
+        self.writer = writer
+        self.adapter = adapter
+        self.identity = identity
+        self.release = release
+        self.received = 0
+        self.written = 0
+        self.seen = time.monotonic()
+        self.ended = False
+        self._buffer = bytearray()
+        self._early = {}                                                                        # Chunks received before the previous ones, by offset,
+        self._early_bytes = 0                                                                   # and their total size.
+        self._lock = threading.Lock()
+
+    def append(self, offset, chunk, current=None):
+        """Method that adds a chunk of the document."""
+        with self._lock:
+            if self.ended:                                                                      # Closed meanwhile (e.g., idle for too long).
+                raise Ice.ObjectNotExistException()
+            self.seen = time.monotonic()
+            if offset < self.received or offset in self._early:
+                raise Printer.JobError(f'Chunk at offset {offset} already received')
+            if offset == self.received:                                                         # The chunk is a view of the received message (zero copy),
+                self._buffer += chunk                                                           # copied once into the buffer.
+                self.received += len(chunk)
+            else:
+                window = EARLY_BLOCKS * self.buffer_size
+                if offset + len(chunk) > self.received + window or self._early_bytes + len(chunk) > window:
+                    raise Printer.JobError(f'Chunk at offset {offset} too far ahead of offset {self.received}')
+                self._early[offset] = bytes(chunk)                                              # Kept after the call: copy it out of the message.
+                self._early_bytes += len(chunk)
+            while self.received in self._early:                                                 # Move the chunks that are now in order to the buffer.
+                chunk = self._early.pop(self.received)
+                self._early_bytes -= len(chunk)
+                self._buffer += chunk
+                self.received += len(chunk)
+            if len(self._buffer) >= self.buffer_size:
+                return self.writer.submit(self._write, self._take())                            # Answered once the block is written.
+        return None
+
+    def flush(self, current=None):
+        """Method that writes the buffered bytes and returns the bytes written."""
+        with self._lock:
+            if self.ended:
+                raise Ice.ObjectNotExistException()
+            self.seen = time.monotonic()
+            return self.writer.submit(self._write, self._take())
+
+    def close(self, current=None):
+        """Method that flushes and ends the job, and returns the bytes written."""
+        future = self.end()
+        if future is None:                                                                      # Already closed (e.g., idle for too long).
+            raise Ice.ObjectNotExistException()
+        return future
+
+    def end(self):
+        """Writes the last block, closes the sink and removes the job. Returns the future of the bytes written (None if it had ended)."""
+        with self._lock:
+            if self.ended:
+                return None
+            self.ended = True
+            future = self.writer.submit(self._finish, self._take())
+            if self._early:
+                log.warning('Print job %s closed with %d chunks missing', self.name, len(self._early))
+        try:
+            self.adapter.remove(self.identity)
+        except Ice.LocalException:                                                              # The server is shutting down.
+            pass
+        self.release(self.identity)
+        return future
+
+    def _take(self) -> bytearray:
+        """Method that takes the buffered bytes and empties the buffer (with the lock held)."""
+        data, self._buffer = self._buffer, bytearray()
+        return data
+
+    def _write(self, data: bytearray) -> int:
+        """Method that writes a block to the sink in a single call (in the writer thread)."""
+        if data:
+            if self.sink:
+                self.sink.write(data)
+            else:
+                with stdout_lock:
+                    sys.stdout.flush()                                                          # Write the texts printed before the block first.
+                    sys.stdout.buffer.write(data)
+                    sys.stdout.buffer.flush()
+            self.written += len(data)
+        return self.written
+
+    def _finish(self, data: bytearray) -> int:
+        """Method that writes the last block and closes the sink (in the writer thread)."""
+        self._write(data)
+        if self.sink:
+            self.sink.close()
+        log.info('Print job %s finished (%d bytes)', self.name, self.written)
+        return self.written
 
 
 def main(args: argparse.Namespace) -> bool:
@@ -62,20 +384,24 @@ def main(args: argparse.Namespace) -> bool:
     Returns:
         A boolean indicating the success of the process.
     """
-    print(f'Listening port: {args.port}')                                                       # Print the host address and port number.
-
-    with Ice.initialize(sys.argv) as communicator:                                              # Initialize the Ice run time and create a communicator.
+    logger.setup_logging(args, 'SimplePrinter')                                                 # Start the asynchronous logging.
+    metrics.setup_metrics(args)                                                                 # Start the dispatch metrics.
+    admission.setup_admission(args)                                                             # Set the limits of the admission control.
 
-        adapter = communicator.createObjectAdapterWithEndpoints(                                # Create an object adapter with the name 'SimplePrinterAdapter' and an    
-            'SimplePrinterAdapter', f'default -p {args.port}'                                   # endpoint with the default protocol and the specified port number.
-        )
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='writer')                     # A single thread writes the blocks of the print jobs in order.
 
-        servant = OperationI()                                                                  # Create an instance of the 'OperationI' class.
+    with bootstrap.serve(args, 'SimplePrinterAdapter') as adapter:                              # Create the communicator and an object adapter with the name 'SimplePrinterAdapter'
+                                                                                                # and the given endpoints, which is activated at the end of the block.
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        servant = OperationI(writer, args.output_dir, args.buffer_size, args.job_timeout)        # Create an instance of the 'OperationI' class.
+        servant.start()                                                                         # Start closing the idle print jobs.
 
-        proxy = adapter.add(servant, communicator.stringToIdentity('SimplePrinter'))            # Add the 'servant' instance to the adapter with the identity 'SimplePrinter' and get the proxy.
+        proxy = adapter.add(servant, Ice.stringToIdentity('SimplePrinter'))                     # Add the 'servant' instance to the adapter with the identity 'SimplePrinter' and get the proxy.
+                                                                                                # The server runs until it is shut down (e.g., Ctrl+C).
 
-        adapter.activate()                                                                      # Activate the adapter to make the servant available for incoming requests.
-        communicator.waitForShutdown()                                                          # Wait for the communicator to be destroyed.
+    servant.stop()                                                                              # Close the print jobs left open,
+    writer.shutdown(wait=True)                                                                  # and write the blocks still pending.
 
     return 0
 
@@ -5,7 +5,20 @@
 Client script that sends two numbers to a server
 and displays the result received in the terminal.
 
-Usage: client.py [-h] [--host HOST] [--port PORT]
+With --batch, the operands are sent straight from the memory of their arrays
+(see common/payloads.py). With --compress-threshold, the batches whose
+operands take at least that many bytes are sent compressed. With --deadline,
+each call waits for its reply at most that many milliseconds.
+
+With --input, the operations are read from a file (or the standard input)
+instead, e.g., a trace of millions of them, and sent with at most INFLIGHT
+pending (see common/replay.py for the formats):
+
+    add,1.5,2
+    divide,7,3
+
+Usage: client.py [-h] [--host HOST] [--port PORT] [--batch BATCH] [--async] [--requests REQUESTS] [--inflight INFLIGHT]
+                 [--compress-threshold COMPRESS_THRESHOLD] [--deadline DEADLINE] [--input INPUT] [--format {csv,jsonl,binary}] [--output OUTPUT]
 
 Basic calculator client script.
 
@@ -14,6 +27,23 @@ options:
   --host HOST, -ht HOST
                         Communication via the host. Use localhost (default) or give an IP address (e.g., 192.168.1.140).
   --port PORT, -p PORT  Port number. Use port 10000 (default) onwards.
+  --batch BATCH, -b BATCH
+                        Number of operand pairs sent in a single batch call (disabled by default).
+  --async, -a           Send the operations asynchronously (AMI), pipelining them over the connection.
+  --requests REQUESTS, -r REQUESTS
+                        Number of times the four operations are sent (default: 1).
+  --inflight INFLIGHT, -i INFLIGHT
+                        Maximum number of asynchronous requests in flight (default: 100).
+  --compress-threshold COMPRESS_THRESHOLD, -ct COMPRESS_THRESHOLD
+                        Compress the requests with a payload of at least the given bytes, e.g., 65536 for texts over a slow network. Use 0 (default) to never compress.
+  --deadline DEADLINE, -dl DEADLINE
+                        Milliseconds to wait for each reply. Use 0 (default) to wait forever.
+  --input INPUT, -in INPUT
+                        File of operations to send instead of asking for them. Use - for the standard input (disabled by default).
+  --format {csv,jsonl,binary}, -fmt {csv,jsonl,binary}
+                        Format of the operations (default: from the file extension, or csv).
+  --output OUTPUT, -out OUTPUT
+                        File where the result of each operation is written. Use - for the standard output (disabled by default).
 
 Author: Andres J. Sanchez-Fernandez
 Email: sfandres@unex.es
@@ -25,6 +55,15 @@ Version: v1
 import sys, Ice                                                                                 # Import the sys and Ice libraries (Ice runtime).
 import Calculator                                                                               # Import the Calculator module (proxies and skeletons).
 import argparse                                                                                 # Import the argparse library for cmd arguments.
+import time                                                                                     # Import the time library to measure the calls.
+import numpy as np                                                                              # Import the NumPy library for the batch operands.
+import os                                                                                       # Import the os library to locate the shared modules.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))         # Make the shared 'common' package (repository root) importable.
+from common import payloads, pipeline, proxies, replay, resilience                              # Import the shared payload, asynchronous invocation, proxy pool, replay and call policy modules.
+
+OPERATIONS = {'add': (float, float), 'subtract': (float, float),                                # Operations that can be replayed from a file (--input)
+              'multiply': (float, float), 'divide': (float, float)}                             # and the types of their arguments.
 
 
 def get_args() -> argparse.Namespace:
@@ -43,6 +82,23 @@ def get_args() -> argparse.Namespace:
     parser.add_argument('--port', '-p', type=int, default=10000,
                         help='Port number. Use port 10000 (default) onwards.')
 
+    parser.add_argument('--batch', '-b', type=int, default=0,
+                        help='Number of operand pairs sent in a single batch call (disabled by default).')
+
+    parser.add_argument('--async', '-a', dest='use_async', action='store_true',
+                        help='Send the operations asynchronously (AMI), pipelining them over the connection.')
+
+    parser.add_argument('--requests', '-r', type=int, default=1,
+                        help='Number of times the four operations are sent (default: 1).')
+
+    parser.add_argument('--inflight', '-i', type=int, default=100,
+                        help='Maximum number of asynchronous requests in flight (default: 100).')
+
+    payloads.add_compression_args(parser)
+    resilience.add_resilience_args(parser, retries=False, hedging=False)                        # Only the deadline: with a single server, Ice itself retries
+                                                                                                # the idempotent operations after a connection failure.
+    replay.add_replay_args(parser)
+
     return parser.parse_args(sys.argv[1:])                                                      # Parse and return the arguments.
 
 
@@ -56,26 +112,63 @@ def main(args: argparse.Namespace) -> bool:
     Returns:
         A boolean indicating the success of the process.
     """
+    if args.input:                                                                              # Send the operations of the file instead of asking for them.
+        print(f'Host: {args.host} (connecting port: {args.port})')
+        server = proxies.get(f'BasicCalculator:default -h {args.host} -p {args.port}', Calculator.OperationsPrx)
+        server = resilience.CallPolicy.from_args(args).apply(server)
+        return replay.replay(args, OPERATIONS, lambda op, a, b: getattr(server, op + 'Async')(a, b), args.inflight)
+
     number1 = float(input('Enter the first number: '))
     number2 = float(input('Enter the second number: '))
  
     print(f'Numbers: {number1} and {number2}')                                                  # Print the numbers to be sent to the server.
     print(f'Host: {args.host} (connecting port: {args.port})')                                  # Print the host address and port number.
 
-    with Ice.initialize(sys.argv) as communicator:                                              # Initialize the Ice run time and create a communicator.
-
-        proxy = communicator.stringToProxy(                                                     # Create a proxy for the 'BasicCalculator' object, which can be communicated
-            f'BasicCalculator:default -h {args.host} -p {args.port}'                            # with via the host with the IP address or localhost using the specified
-        )                                                                                       # port number and the default communication protocol.
-
-        server = Calculator.OperationsPrx.checkedCast(proxy)                                    # Cast the given 'proxy' to a 'Operations' proxy and assign the resulting
-        if not server:                                                                          # object to the variable 'server'. This allows communication with the
-            raise RuntimeError('Invalid proxy')                                                 # remote 'Operations' object via the 'server' object.
-
-        print(f'Result of add.: {server.add(number1, number2)}')                                # Call the methods on the 'server' object, passing the 'number1' and 'number2'.
-        print(f'Result of sub.: {server.subtract(number1, number2)}')                             
-        print(f'Result of mul.: {server.multiply(number1, number2)}')
-        print(f'Result of div.: {server.divide(number1, number2)}')
+    server = proxies.get(                                                                       # Get the 'Operations' proxy of the 'BasicCalculator' object, which can be communicated
+        f'BasicCalculator:default -h {args.host} -p {args.port}',                               # with via the host with the IP address or localhost using the specified
+        Calculator.OperationsPrx                                                                # port number and the default communication protocol. The proxy is checked
+    )                                                                                           # (checkedCast) only the first time and then reused with its connection.
+    server = resilience.CallPolicy.from_args(args).apply(server)                                # Wait for each reply up to the deadline (if any).
+
+    start = time.perf_counter()
+    if args.use_async:                                                                          # Start every call without waiting for the previous
+        calls = [method for _ in range(args.requests) for method in (                           # replies, with up to 'inflight' of them pending.
+            lambda: server.addAsync(number1, number2),
+            lambda: server.subtractAsync(number1, number2),
+            lambda: server.multiplyAsync(number1, number2),
+            lambda: server.divideAsync(number1, number2),
+        )]
+        results = pipeline.run(calls, args.inflight)[:4]
+    else:
+        for _ in range(args.requests):                                                          # Call the methods on the 'server' object, passing the 'number1' and 'number2'.
+            results = (server.add(number1, number2), server.subtract(number1, number2),
+                       server.multiply(number1, number2), server.divide(number1, number2))
+    elapsed = time.perf_counter() - start
+
+    print(f'Result of add.: {results[0]}')
+    print(f'Result of sub.: {results[1]}')
+    print(f'Result of mul.: {results[2]}')
+    print(f'Result of div.: {results[3]}')
+    if args.requests > 1:
+        print(f'{4*args.requests} requests in {elapsed:.3f} s ({4*args.requests/elapsed:.0f} requests/s)')
+
+    if args.batch > 0:                                                                          # Send the same operations as batches of random operand
+        rng = np.random.default_rng()                                                           # pairs around the given numbers, all in one call each.
+        a = (number1 + rng.standard_normal(args.batch)).astype(np.float32)
+        b = (number2 + rng.standard_normal(args.batch)).astype(np.float32)
+        ops = rng.integers(Calculator.OpAdd, Calculator.OpDivide + 1, args.batch, dtype=np.int8)
+        compression = payloads.Compression(server, args.compress_threshold)                     # The batches are compressed if their operands
+        batch = compression.proxy(a.nbytes + b.nbytes)                                          # are large enough.
+
+        for name, call in (('add.', lambda: batch.addBatch(a, b)),                              # The arrays are sent from their memory (no copies).
+                           ('sub.', lambda: batch.subtractBatch(a, b)),
+                           ('mul.', lambda: batch.multiplyBatch(a, b)),
+                           ('div.', lambda: batch.divideBatch(a, b)),
+                           ('mix.', lambda: batch.computeBatch(ops, a, b))):
+            start = time.perf_counter()
+            res = call()
+            elapsed = time.perf_counter() - start
+            print(f'Batch of {name}: {res.size} results in {elapsed*1e3:.2f} ms (first: {res[:3]})')
 
     return 0
 
@@ -6,12 +6,56 @@ Server script that displays in the terminal the two numbers received,
 calculates the result and returns it to the client.
 
 Usage: server.py [-h] [--port PORT]
+                 [--endpoints ENDPOINTS [ENDPOINTS ...]] [--threads THREADS] [--max-threads MAX_THREADS] [--message-size-max MESSAGE_SIZE_MAX]
+                 [--tcp-buffer-size TCP_BUFFER_SIZE] [--compress] [--acm-timeout ACM_TIMEOUT] [--config CONFIG] [--ice-property KEY=VALUE]
+                 [--log-level {DEBUG,INFO,WARNING,ERROR,CRITICAL}] [--log-format {text,json}]
+                 [--log-sample LOG_SAMPLE] [--log-rate LOG_RATE] [--log-queue LOG_QUEUE] [--log-overflow {drop,block}]
+                 [--metrics-port METRICS_PORT] [--trace-slow TRACE_SLOW]
+                 [--max-inflight MAX_INFLIGHT] [--operation-limit OPERATION=N] [--rate-limit RATE_LIMIT] [--burst BURST]
 
 Basic calculator server script.
 
 options:
   -h, --help            show this help message and exit
   --port PORT, -p PORT  Port number. Use port 10000 (default) onwards.
+  --endpoints ENDPOINTS [ENDPOINTS ...], -e ENDPOINTS [ENDPOINTS ...]
+                        Endpoints of the adapter, where {port} is the port number, e.g., "tcp -p {port}" "udp -p {port}" (default: "default -p {port}").
+  --threads THREADS, -t THREADS
+                        Initial number of threads dispatching requests (default: 1).
+  --max-threads MAX_THREADS, -mt MAX_THREADS
+                        Maximum number of dispatch threads; the pool grows on demand up to it (default: --threads).
+  --message-size-max MESSAGE_SIZE_MAX
+                        Maximum size of a message in KiB. Use 0 for no limit (default: 1024).
+  --tcp-buffer-size TCP_BUFFER_SIZE
+                        Size in bytes of the TCP receive and send buffers (default: system).
+  --compress            Publish the endpoints with compression, so the proxies created by the server compress.
+  --acm-timeout ACM_TIMEOUT
+                        Seconds after which the idle connections are closed. Use 0 to keep them (default: 60).
+  --config CONFIG       Configuration file with Ice properties (disabled by default).
+  --ice-property KEY=VALUE
+                        Ice property, e.g., Ice.Trace.Network=1 (may be repeated).
+  --log-level {DEBUG,INFO,WARNING,ERROR,CRITICAL}, -l {DEBUG,INFO,WARNING,ERROR,CRITICAL}
+                        Logging level. Use DEBUG to trace every request (default: INFO).
+  --log-format {text,json}
+                        Format of the log records (default: text).
+  --log-sample LOG_SAMPLE
+                        Fraction of the records below WARNING that are kept (default: 1.0).
+  --log-rate LOG_RATE   Maximum records per second below WARNING. Use 0 (default) for no limit.
+  --log-queue LOG_QUEUE
+                        Maximum number of records waiting to be written (default: 10000).
+  --log-overflow {drop,block}
+                        What to do with a record when the queue is full: drop it (default) or wait for room.
+  --metrics-port METRICS_PORT
+                        Port of the local HTTP endpoint of the metrics. Use 0 (default) to disable it.
+  --trace-slow TRACE_SLOW
+                        Log the calls slower than the given milliseconds. Use 0 (default) to disable it.
+  --max-inflight MAX_INFLIGHT
+                        Maximum number of calls in progress at a time. Use 0 (default) for no limit.
+  --operation-limit OPERATION=N
+                        Maximum number of calls of an operation in progress at a time, e.g., applyBatch=4 (may be repeated).
+  --rate-limit RATE_LIMIT
+                        Maximum number of calls admitted per second. Use 0 (default) for no limit.
+  --burst BURST         Number of calls admitted at once above --rate-limit (default: one second of calls).
 
 Author: Andres J. Sanchez-Fernandez
 Email: sfandres@unex.es
@@ -23,6 +67,13 @@ Version: v1
 import sys, Ice                                                                                 # Import the sys and Ice libraries (Ice runtime).
 import Calculator                                                                               # Import the Calculator module (proxies and skeletons).
 import argparse                                                                                 # Import the argparse library for cmd arguments.
+import numpy as np                                                                              # Import the NumPy library for vectorized batch operations.
+import os, logging                                                                              # Import the os and logging libraries.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))         # Make the shared 'common' package (repository root) importable.
+from common import bootstrap, logger, metrics, admission                                        # Import the shared start-up, logging, metrics and admission control modules.
+
+log = logging.getLogger('BasicCalculator')                                                      # Logger used by the servant (configured in main).
 
 
 def get_args() -> argparse.Namespace:
@@ -37,9 +88,16 @@ def get_args() -> argparse.Namespace:
     parser.add_argument('--port', '-p', type=int, default=10000,                                # Options.
                         help='Port number. Use port 10000 (default) onwards.')
 
+    bootstrap.add_ice_args(parser)
+    logger.add_logging_args(parser)
+    metrics.add_metrics_args(parser)
+    admission.add_admission_args(parser)
+
     return parser.parse_args(sys.argv[1:])                                                      # Parse and return the arguments.
 
 
+@metrics.instrument
+@admission.limited(Calculator.Overloaded)
 class OperationsI(Calculator.Operations):                                                       # Define a class that inherits from the 'Operations' class in the 'Calculator' module.
     """
     Class that implements the 'Operations' interface.
@@ -50,25 +108,81 @@ class OperationsI(Calculator.Operations):
         subtract(a, b, current=None): Method that subtracts two numbers.
         multiply(a, b, current=None): Method that multiplies two numbers.
         divide(a, b, current=None): Method that divides two numbers.
+        addBatch(a, b, current=None): Method that adds two sequences element-wise.
+        subtractBatch(a, b, current=None): Method that subtracts two sequences element-wise.
+        multiplyBatch(a, b, current=None): Method that multiplies two sequences element-wise.
+        divideBatch(a, b, current=None): Method that divides two sequences element-wise.
+        computeBatch(ops, a, b, current=None): Method that applies a per-element operation code.
     """
+    UFUNCS = {                                                                                  # NumPy ufunc applied for each operation code.
+        Calculator.OpAdd: np.add,
+        Calculator.OpSubtract: np.subtract,
+        Calculator.OpMultiply: np.multiply,
+        Calculator.OpDivide: np.divide,
+    }
+
     def add(self, a, b, current=None):
         res = a + b
-        print(f'{a} + {b} = {res}')
+        log.debug('%s + %s = %s', a, b, res)
         return res
     def subtract(self, a, b, current=None):
         res = a - b
-        print(f'{a} - {b} = {res}')
+        log.debug('%s - %s = %s', a, b, res)
         return res
     def multiply(self, a, b, current=None):
         res = a * b
-        print(f'{a} · {b} = {res}')
+        log.debug('%s · %s = %s', a, b, res)
         return res
     def divide(self, a, b, current=None):
-        try:
-            res = a / b
-        except ZeroDivisionError:
-            print("Error: Division by zero!")
-        print(f'{a} / {b} = {res}')
+        if b == 0:
+            log.warning('Division by zero!')
+        with np.errstate(divide='ignore', invalid='ignore'):                                    # Division by zero yields inf/nan, as in divideBatch.
+            res = float(np.float64(a) / b)
+        log.debug('%s / %s = %s', a, b, res)
+        return res
+
+    @staticmethod
+    def _operands(a, b):
+        """Method that checks the operand sequences and views them as float32 arrays."""
+        a = np.asarray(a, dtype=np.float32)                                                     # No copy is made when the sequences are already
+        b = np.asarray(b, dtype=np.float32)                                                     # float32 arrays (the unmarshalled Ice buffers).
+        if a.shape != b.shape:
+            raise Calculator.InvalidBatch(f'Operand sizes differ ({a.size} and {b.size})')
+        return a, b
+
+    def addBatch(self, a, b, current=None):
+        a, b = self._operands(a, b)
+        res = np.add(a, b)
+        log.debug('Batch of %d additions', res.size)
+        return res
+    def subtractBatch(self, a, b, current=None):
+        a, b = self._operands(a, b)
+        res = np.subtract(a, b)
+        log.debug('Batch of %d subtractions', res.size)
+        return res
+    def multiplyBatch(self, a, b, current=None):
+        a, b = self._operands(a, b)
+        res = np.multiply(a, b)
+        log.debug('Batch of %d multiplications', res.size)
+        return res
+    def divideBatch(self, a, b, current=None):
+        a, b = self._operands(a, b)
+        with np.errstate(divide='ignore', invalid='ignore'):                                    # Division by zero yields inf/nan instead of failing the batch.
+            res = np.divide(a, b)
+        log.debug('Batch of %d divisions', res.size)
+        return res
+    def computeBatch(self, ops, a, b, current=None):
+        a, b = self._operands(a, b)
+        ops = np.asarray(ops, dtype=np.int8)
+        if ops.shape != a.shape:
+            raise Calculator.InvalidBatch(f'Operation codes and operands sizes differ ({ops.size} and {a.size})')
+        if ops.size and (ops.min() < 0 or ops.max() >= len(self.UFUNCS)):
+            raise Calculator.InvalidBatch('Unknown operation code')
+        res = np.empty_like(a)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for code, ufunc in self.UFUNCS.items():                                             # Evaluate each operation only over the elements
+                ufunc(a, b, out=res, where=(ops == code))                                       # that request it, writing in place into 'res'.
+        log.debug('Batch of %d mixed operations', res.size)
         return res
 
 
@@ -82,20 +196,16 @@ def main(args: argparse.Namespace) -> bool:
     Returns:
         A boolean indicating the success of the process.
     """
-    print(f'Listening port: {args.port}')                                                       # Print the port number.
-
-    with Ice.initialize(sys.argv) as communicator:                                              # Initialize the Ice run time and create a communicator.
-
-        adapter = communicator.createObjectAdapterWithEndpoints(                                # Create an object adapter with the name 'BasicCalculatorAdapter' and an    
-            'BasicCalculatorAdapter', f'default -p {args.port}'                                 # endpoint with the default protocol and the specified port number.
-        )
+    logger.setup_logging(args, 'BasicCalculator')                                               # Start the asynchronous logging.
+    metrics.setup_metrics(args)                                                                 # Start the dispatch metrics.
+    admission.setup_admission(args)                                                             # Set the limits of the admission control.
 
+    with bootstrap.serve(args, 'BasicCalculatorAdapter') as adapter:                            # Create the communicator and an object adapter with the name 'BasicCalculatorAdapter'
+                                                                                                # and the given endpoints, which is activated at the end of the block.
         servant = OperationsI()                                                                 # Create an instance of the 'OperationsI' class.
 
-        proxy = adapter.add(servant, communicator.stringToIdentity('BasicCalculator'))          # Add the 'servant' instance to the adapter with the identity 'BasicCalculator' and get the proxy.
-
-        adapter.activate()                                                                      # Activate the adapter to make the servant available for incoming requests.
-        communicator.waitForShutdown()                                                          # Wait for the communicator to be destroyed.
+        proxy = adapter.add(servant, Ice.stringToIdentity('BasicCalculator'))                   # Add the 'servant' instance to the adapter with the identity 'BasicCalculator' and get the proxy.
+                                                                                                # The server runs until it is shut down (e.g., Ctrl+C).
 
     return 0
 
@@ -5,8 +5,23 @@
 Client script that sends two numbers to two servers and displays
 the result received in the terminal. Any server can act as
 the add or mul server simply by interchanging the port numbers.
+Several replicas of each server can be given, and the calls are
+spread across them. With --cache-size, the results are cached, so
+repeated operations are answered without contacting the servers.
+With --deadline, each call waits for its reply at most that many
+milliseconds; with --retries, the failed calls are retried after
+a jittered backoff; and with --hedge, a call without reply after
+that many milliseconds is also sent to another replica, so a slow
+replica does not stall the sequence of operations.
+With --input, the operations are read from a file (or the standard
+input) instead, and sent with at most INFLIGHT pending (see
+common/replay.py for the formats).
 
 Usage: client.py [-h] [--host HOST [HOST ...]] [--port PORT [PORT ...]] [--number1 NUMBER1] [--number2 NUMBER2]
+                 [--async] [--requests REQUESTS] [--inflight INFLIGHT] [--add-sub ENDPOINT [ENDPOINT ...]]
+                 [--mul-div ENDPOINT [ENDPOINT ...]] [--balance {p2c,least}] [--cache-size CACHE_SIZE]
+                 [--deadline DEADLINE] [--retries RETRIES] [--backoff BACKOFF] [--hedge HEDGE]
+                 [--input INPUT] [--format {csv,jsonl,binary}] [--output OUTPUT]
 
 Pro calculator client script.
 
@@ -20,6 +35,31 @@ options:
                         First number to be sent to the server.
   --number2 NUMBER2, -n2 NUMBER2
                         Second number to be sent to the server.
+  --async, -a           Send the operations asynchronously (AMI), pipelining them over the connections.
+  --requests REQUESTS, -r REQUESTS
+                        Number of times the four operations are sent (default: 1).
+  --inflight INFLIGHT, -i INFLIGHT
+                        Maximum number of asynchronous requests in flight (default: 100).
+  --add-sub ENDPOINT [ENDPOINT ...], -as ENDPOINT [ENDPOINT ...]
+                        Replicas of the AddSub server as host:port (default: the first host and port).
+  --mul-div ENDPOINT [ENDPOINT ...], -md ENDPOINT [ENDPOINT ...]
+                        Replicas of the MulDiv server as host:port (default: the second host and port).
+  --balance {p2c,least}, -bl {p2c,least}
+                        Replica selection: power of two choices (default) or least outstanding requests.
+  --cache-size CACHE_SIZE, -cs CACHE_SIZE
+                        Number of results cached by the client. Use 0 (default) to disable the cache.
+  --deadline DEADLINE, -dl DEADLINE
+                        Milliseconds to wait for each reply. Use 0 (default) to wait forever.
+  --retries RETRIES, -rt RETRIES
+                        Number of times a failed call is retried, if safe (default: 0).
+  --backoff BACKOFF     Base delay in milliseconds before a retry, doubled on each retry and jittered (default: 10).
+  --hedge HEDGE         Milliseconds after which an idempotent call without reply is also sent to another replica, e.g., the p95 latency. Use 0 (default) to disable it.
+  --input INPUT, -in INPUT
+                        File of operations to send instead of asking for them. Use - for the standard input (disabled by default).
+  --format {csv,jsonl,binary}, -fmt {csv,jsonl,binary}
+                        Format of the operations (default: from the file extension, or csv).
+  --output OUTPUT, -out OUTPUT
+                        File where the result of each operation is written. Use - for the standard output (disabled by default).
 
 Author: Andres J. Sanchez-Fernandez
 Email: sfandres@unex.es
@@ -31,6 +71,13 @@ Version: v1
 import sys, Ice                                                                                 # Import the sys and Ice libraries (Ice runtime).
 import CalculatorPro                                                                            # Import the CalculatorPro module (proxies and skeletons).
 import argparse                                                                                 # Import the argparse library for cmd arguments.
+import os, time                                                                                 # Import the os and time libraries.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))         # Make the shared 'common' package (repository root) importable.
+from common import pipeline, replicas, caching, proxies, replay, resilience                     # Import the shared asynchronous invocation, replica pool, caching, proxy pool, replay and call policy modules.
+
+OPERATIONS = {'add': (float, float), 'subtract': (float, float),                                # Operations that can be replayed from a file (--input)
+              'multiply': (float, float), 'divide': (float, float)}                             # and the types of their arguments.
 
 
 def get_args() -> argparse.Namespace:
@@ -55,9 +102,69 @@ def get_args() -> argparse.Namespace:
     parser.add_argument('--number2', '-n2', type=float, default=None,
                         help='Second number to be sent to the server.')
 
+    parser.add_argument('--async', '-a', dest='use_async', action='store_true',
+                        help='Send the operations asynchronously (AMI), pipelining them over the connections.')
+
+    parser.add_argument('--requests', '-r', type=int, default=1,
+                        help='Number of times the four operations are sent (default: 1).')
+
+    parser.add_argument('--inflight', '-i', type=int, default=100,
+                        help='Maximum number of asynchronous requests in flight (default: 100).')
+
+    parser.add_argument('--add-sub', '-as', nargs='+', type=str, default=None, metavar='ENDPOINT',
+                        help='Replicas of the AddSub server as host:port (default: the first host and port).')
+
+    parser.add_argument('--mul-div', '-md', nargs='+', type=str, default=None, metavar='ENDPOINT',
+                        help='Replicas of the MulDiv server as host:port (default: the second host and port).')
+
+    parser.add_argument('--balance', '-bl', type=str, choices=replicas.STRATEGIES, default='p2c',
+                        help='Replica selection: power of two choices (default) or least outstanding requests.')
+
+    parser.add_argument('--cache-size', '-cs', type=int, default=0,
+                        help='Number of results cached by the client. Use 0 (default) to disable the cache.')
+
+    resilience.add_resilience_args(parser)
+    replay.add_replay_args(parser)
+
     return parser.parse_args(sys.argv[1:])                                                      # Parse and return the arguments.
 
 
+class CachedPool:
+    """
+    Class that answers the calls to a replica pool from a cache of results when possible.
+
+    Attributes:
+        pool (ReplicaPool): The replicas that compute the results.
+        cache (LRUCache): The results of the recent calls (errors are not cached).
+
+    Methods:
+        invoke (operation, *args): Returns the result of an operation.
+        begin (operation, *args): Returns an 'Ice.Future' with the result of an operation.
+    """
+    def __init__(self, pool: replicas.ReplicaPool, cache: caching.LRUCache):
+        self.pool = pool
+        self.cache = cache
+
+    def invoke(self, operation: str, *args):
+        """Returns the result of an operation, calling a replica only on a cache miss."""
+        return self.cache.call(caching.key(operation, *args), self.pool.invoke, operation, *args)
+
+    def begin(self, operation: str, *args) -> Ice.Future:
+        """Returns an 'Ice.Future' with the result of an operation, already completed on a cache hit."""
+        key = caching.key(operation, *args)
+        outcome = self.cache.get(key) if self.cache.capacity > 0 else None
+        if outcome is not None:
+            return Ice.Future.completed(outcome[0])
+
+        def completed(future):
+            if future.exception() is None:
+                self.cache.put(key, future.result())
+
+        future = self.pool.begin(operation, *args)
+        future.add_done_callback(completed)
+        return future
+
+
 def main(args: argparse.Namespace) -> bool:
     """
     Main function.
@@ -80,31 +187,70 @@ def main(args: argparse.Namespace) -> bool:
     elif isinstance(port, list) and len(port)==1:
         port = (port[0], port[0]+1)
 
+    add_sub_endpoints = args.add_sub or [(host[0], port[0])]                                    # Replicas of each server (by default, the one
+    mul_div_endpoints = args.mul_div or [(host[1], port[1])]                                    # given by the host and port arguments).
+    print(f'AddSub replicas: {add_sub_endpoints}')                                              # Print the replicas.
+    print(f'MulDiv replicas: {mul_div_endpoints}')
+
+    communicator = proxies.communicator()                                                       # Get the communicator shared by the whole process (created on first use).
+    policy = resilience.CallPolicy.from_args(                                                   # Deadline, retries and hedging of the calls. The four operations
+        args, idempotent=OPERATIONS, retry_on=(CalculatorPro.Overloaded,)                       # are idempotent, and a rejected call was not run.
+    )
+    add_sub_server = replicas.ReplicaPool(                                                      # Create a pool of 'Operations' proxies for each server,
+        communicator, 'AddSub', add_sub_endpoints,                                              # which can be communicated with via the hosts with the
+        CalculatorPro.OperationsPrx, args.balance, policy=policy                                # IP addresses or localhost using the specified port
+    )                                                                                           # numbers and the default communication protocol. The
+    mul_div_server = replicas.ReplicaPool(                                                      # connections are made lazily, on the first call to
+        communicator, 'MulDiv', mul_div_endpoints,                                              # each replica, and a replica that cannot be reached
+        CalculatorPro.OperationsPrx, args.balance, policy=policy                                # is skipped for a while.
+    )
+    pools = (add_sub_server, mul_div_server)
+    if args.cache_size:                                                                         # Answer the repeated operations from a cache.
+        add_sub_server = CachedPool(add_sub_server, caching.LRUCache(args.cache_size))
+        mul_div_server = CachedPool(mul_div_server, caching.LRUCache(args.cache_size))
+
+    if args.input:                                                                              # Send the operations of the file instead of asking for them,
+        servers = {'add': add_sub_server, 'subtract': add_sub_server,                           # each one to the replicas of its server.
+                   'multiply': mul_div_server, 'divide': mul_div_server}
+        return replay.replay(args, OPERATIONS, lambda op, a, b: servers[op].begin(op, a, b), args.inflight)
+
     if not args.number1 or not args.number2:                                                    # If the numbers are not given, ask for them.
         args.number1 = float(input('Enter the first number: '))
         args.number2 = float(input('Enter the second number: '))
-
     print(f'Numbers: {args.number1} and {args.number2}')                                        # Print the numbers to be sent to the server.
-    print(f'Hosts: {host} (connecting port/s: {port})')                                         # Print the host address and port number.
-
-    with Ice.initialize(sys.argv) as communicator:                                              # Initialize the Ice run time and create a communicator.
 
-        add_sub_proxy = communicator.stringToProxy(                                             # Create two proxies, which can be communicated with via
-            f'AddSub:default -h {host[0]} -p {port[0]}'                                         # the host with the IP address or localhost using the specified
-        )                                                                                       # port number and the default communication protocol.
-        mul_div_proxy = communicator.stringToProxy(
-            f'MulDiv:default -h {host[1]} -p {port[1]}'
-        )
+    a, b = args.number1, args.number2
+    start = time.perf_counter()
+    try:
+        if args.use_async:                                                                      # Start every call without waiting for the previous
+            calls = [method for _ in range(args.requests) for method in (                       # replies, with up to 'inflight' of them pending
+                lambda: add_sub_server.begin('add', a, b),                                      # across all the replicas.
+                lambda: add_sub_server.begin('subtract', a, b),
+                lambda: mul_div_server.begin('multiply', a, b),
+                lambda: mul_div_server.begin('divide', a, b),
+            )]
+            results = pipeline.run(calls, args.inflight)[:4]
+        else:
+            for _ in range(args.requests):                                                      # Call the functions on the server objects.
+                results = (add_sub_server.invoke('add', a, b), add_sub_server.invoke('subtract', a, b),
+                           mul_div_server.invoke('multiply', a, b), mul_div_server.invoke('divide', a, b))
+    except CalculatorPro.DivisionByZero:                                                        # The server rejects the divisions by zero.
+        print('Error: division by zero!')
+        return 1
+    elapsed = time.perf_counter() - start
 
-        add_sub_server = CalculatorPro.OperationsPrx.checkedCast(add_sub_proxy)                 # Cast the given 'proxy' to a 'Operations' proxy and assign the resulting object to the variables.
-        mul_div_server = CalculatorPro.OperationsPrx.checkedCast(mul_div_proxy)                 # This allows communication with the remote 'Operations' object via the server objects.
-        if not add_sub_server or not mul_div_server:
-            raise RuntimeError('Invalid proxy')
-    
-        print(f'Result of add.: {add_sub_server.add(args.number1, args.number2)}')              # Call the functions on the server objects.
-        print(f'Result of sub.: {add_sub_server.subtract(args.number1, args.number2)}')
-        print(f'Result of mul.: {mul_div_server.multiply(args.number1, args.number2)}')
-        print(f'Result of div.: {mul_div_server.divide(args.number1, args.number2)}')
+    print(f'Result of add.: {results[0]}')
+    print(f'Result of sub.: {results[1]}')
+    print(f'Result of mul.: {results[2]}')
+    print(f'Result of div.: {results[3]}')
+    if args.requests > 1:
+        print(f'{4*args.requests} requests in {elapsed:.3f} s ({4*args.requests/elapsed:.0f} requests/s)')
+    if args.cache_size:
+        print(f'AddSub cache: {add_sub_server.cache.stats()}')
+        print(f'MulDiv cache: {mul_div_server.cache.stats()}')
+    if policy.retries or policy.hedge:
+        for pool in pools:
+            print(f'{pool.identity} calls retried: {pool.retried}, hedged: {pool.hedged}')
 
     return 0
 
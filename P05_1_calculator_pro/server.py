@@ -5,13 +5,59 @@
 Server script that displays in the terminal the two numbers received,
 calculates the result and returns it to the client.
 
-Usage: server.py [-h] [--port PORT]
+Usage: server.py [-h] [--port PORT] [--cache-size CACHE_SIZE]
+                 [--endpoints ENDPOINTS [ENDPOINTS ...]] [--threads THREADS] [--max-threads MAX_THREADS] [--message-size-max MESSAGE_SIZE_MAX]
+                 [--tcp-buffer-size TCP_BUFFER_SIZE] [--compress] [--acm-timeout ACM_TIMEOUT] [--config CONFIG] [--ice-property KEY=VALUE]
+                 [--log-level {DEBUG,INFO,WARNING,ERROR,CRITICAL}] [--log-format {text,json}]
+                 [--log-sample LOG_SAMPLE] [--log-rate LOG_RATE] [--log-queue LOG_QUEUE] [--log-overflow {drop,block}]
+                 [--metrics-port METRICS_PORT] [--trace-slow TRACE_SLOW]
+                 [--max-inflight MAX_INFLIGHT] [--operation-limit OPERATION=N] [--rate-limit RATE_LIMIT] [--burst BURST]
 
 Pro calculator server script.
 
 options:
   -h, --help            show this help message and exit
   --port PORT, -p PORT  Port number. Use port 10000 (default) onwards.
+  --cache-size CACHE_SIZE, -cs CACHE_SIZE
+                        Number of results cached per server. Use 0 (default) to disable the cache.
+  --endpoints ENDPOINTS [ENDPOINTS ...], -e ENDPOINTS [ENDPOINTS ...]
+                        Endpoints of the adapter, where {port} is the port number, e.g., "tcp -p {port}" "udp -p {port}" (default: "default -p {port}").
+  --threads THREADS, -t THREADS
+                        Initial number of threads dispatching requests (default: 1).
+  --max-threads MAX_THREADS, -mt MAX_THREADS
+                        Maximum number of dispatch threads; the pool grows on demand up to it (default: --threads).
+  --message-size-max MESSAGE_SIZE_MAX
+                        Maximum size of a message in KiB. Use 0 for no limit (default: 1024).
+  --tcp-buffer-size TCP_BUFFER_SIZE
+                        Size in bytes of the TCP receive and send buffers (default: system).
+  --compress            Publish the endpoints with compression, so the proxies created by the server compress.
+  --acm-timeout ACM_TIMEOUT
+                        Seconds after which the idle connections are closed. Use 0 to keep them (default: 60).
+  --config CONFIG       Configuration file with Ice properties (disabled by default).
+  --ice-property KEY=VALUE
+                        Ice property, e.g., Ice.Trace.Network=1 (may be repeated).
+  --log-level {DEBUG,INFO,WARNING,ERROR,CRITICAL}, -l {DEBUG,INFO,WARNING,ERROR,CRITICAL}
+                        Logging level. Use DEBUG to trace every request (default: INFO).
+  --log-format {text,json}
+                        Format of the log records (default: text).
+  --log-sample LOG_SAMPLE
+                        Fraction of the records below WARNING that are kept (default: 1.0).
+  --log-rate LOG_RATE   Maximum records per second below WARNING. Use 0 (default) for no limit.
+  --log-queue LOG_QUEUE
+                        Maximum number of records waiting to be written (default: 10000).
+  --log-overflow {drop,block}
+                        What to do with a record when the queue is full: drop it (default) or wait for room.
+  --metrics-port METRICS_PORT
+                        Port of the local HTTP endpoint of the metrics. Use 0 (default) to disable it.
+  --trace-slow TRACE_SLOW
+                        Log the calls slower than the given milliseconds. Use 0 (default) to disable it.
+  --max-inflight MAX_INFLIGHT
+                        Maximum number of calls in progress at a time. Use 0 (default) for no limit.
+  --operation-limit OPERATION=N
+                        Maximum number of calls of an operation in progress at a time, e.g., applyBatch=4 (may be repeated).
+  --rate-limit RATE_LIMIT
+                        Maximum number of calls admitted per second. Use 0 (default) for no limit.
+  --burst BURST         Number of calls admitted at once above --rate-limit (default: one second of calls).
 
 Author: Andres J. Sanchez-Fernandez
 Email: sfandres@unex.es
@@ -23,6 +69,12 @@ Version: v1
 import sys, Ice                                                                                 # Import the sys and Ice libraries (Ice runtime).
 import CalculatorPro                                                                            # Import the CalculatorPro module (proxies and skeletons).
 import argparse                                                                                 # Import the argparse library for cmd arguments.
+import os, logging                                                                              # Import the os and logging libraries.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))         # Make the shared 'common' package (repository root) importable.
+from common import bootstrap, logger, metrics, caching, admission                               # Import the shared start-up, logging, metrics, caching and admission control modules.
+
+log = logging.getLogger('CalculatorPro')                                                        # Logger used by the servants (configured in main).
 
 
 def get_args() -> argparse.Namespace:
@@ -37,47 +89,76 @@ def get_args() -> argparse.Namespace:
     parser.add_argument('--port', '-p', type=int, default=10000,                                # Options.
                         help='Port number. Use port 10000 (default) onwards.')
 
+    parser.add_argument('--cache-size', '-cs', type=int, default=0,
+                        help='Number of results cached per server. Use 0 (default) to disable the cache.')
+
+    bootstrap.add_ice_args(parser)
+    logger.add_logging_args(parser)
+    metrics.add_metrics_args(parser)
+    admission.add_admission_args(parser)
+
     return parser.parse_args(sys.argv[1:])                                                      # Parse and return the arguments.
 
 
+@metrics.instrument
+@admission.limited(CalculatorPro.Overloaded)
 class AddSubServerI(CalculatorPro.Operations):                                                  # Define two classes that inherit from the 'Operations' class in the 'CalculatorPro' module.
     """
     Class that implements the 'Operations' interface.
     This class inherits from the 'Operations' class in the 'CalculatorPro' module.
 
+    Attributes:
+        cache (LRUCache): The results of the recent operations.
+
     Methods:
         add(a, b, current=None): Method that adds two numbers.
         subtract(a, b, current=None): Method that subtracts two numbers.
     """
+    def __init__(self, cache: caching.LRUCache):
+        self.cache = cache
+
+    @caching.cached
     def add(self, a, b, current=None):
         res = a + b
-        print(f'{a} + {b} = {res}')
+        log.debug('%s + %s = %s', a, b, res)
         return res
+    @caching.cached
     def subtract(self, a, b, current=None):
         res = a - b
-        print(f'{a} - {b} = {res}')
+        log.debug('%s - %s = %s', a, b, res)
         return res
 
 
+@metrics.instrument
+@admission.limited(CalculatorPro.Overloaded)
 class MulDivServerI(CalculatorPro.Operations):
     """
     Class that implements the 'Operations' interface.
     This class inherits from the 'Operations' class in the 'CalculatorPro' module.
 
+    Attributes:
+        cache (LRUCache): The results of the recent operations.
+
     Methods:
         multiply(a, b, current=None): Method that multiplies two numbers.
         divide(a, b, current=None): Method that divides two numbers.
     """
+    def __init__(self, cache: caching.LRUCache):
+        self.cache = cache
+
+    @caching.cached
     def multiply(self, a, b, current=None):
         res = a * b
-        print(f'{a} · {b} = {res}')
+        log.debug('%s · %s = %s', a, b, res)
         return res
+    @caching.cached
     def divide(self, a, b, current=None):
         try:
             res = a / b
         except ZeroDivisionError:
-            print("Error: Division by zero!")
-        print(f'{a} / {b} = {res}')
+            log.warning('Division by zero!')
+            raise CalculatorPro.DivisionByZero(a)
+        log.debug('%s / %s = %s', a, b, res)
         return res
 
 
@@ -91,26 +172,30 @@ def main(args: argparse.Namespace) -> bool:
     Returns:
         A boolean indicating the success of the process.
     """
-    port = args.port                                                                            # Get the port number from the command line arguments.
-    if isinstance(port, list):                                                                  # Preventing errors: If it is a list, take the item.
-        port = port[0]
-
-    print(f'Listening port: {port}')
-
-    with Ice.initialize(sys.argv) as communicator:                                              # Initialize the Ice run time and create a communicator.
-
-        adapter = communicator.createObjectAdapterWithEndpoints(                                # Create an object adapter with the name 'CalculatorProAdapter' and an
-            'CalculatorProAdapter', f'default -p {port}'                                        # endpoint with the default protocol and the specified port number.
-        )
-
-        add_sub_servant = AddSubServerI()                                                       # Create the instances of the classes.
-        mul_div_servant = MulDivServerI()
-
-        add_sub_proxy = adapter.add(add_sub_servant,communicator.stringToIdentity('AddSub'))    # Add the servant instances to the adapter with each of the identities.
-        mul_div_proxy = adapter.add(mul_div_servant, communicator.stringToIdentity('MulDiv'))
-
-        adapter.activate()                                                                      # Activate the adapter to make the servant available for incoming requests.
-        communicator.waitForShutdown()                                                          # Wait for the communicator to be destroyed.
+    if isinstance(args.port, list):                                                             # Preventing errors: If it is a list, take the item.
+        args.port = args.port[0]
+
+    logger.setup_logging(args, 'CalculatorPro')                                                 # Start the asynchronous logging.
+    metrics.setup_metrics(args)                                                                 # Start the dispatch metrics.
+    admission.setup_admission(args)                                                             # Set the limits of the admission control.
+
+    with bootstrap.serve(args, 'CalculatorProAdapter') as adapter:                              # Create the communicator and an object adapter with the name 'CalculatorProAdapter'
+                                                                                                # and the given endpoints, which is activated at the end of the block.
+        add_sub_servant = AddSubServerI(caching.LRUCache(args.cache_size))                      # Create the instances of the classes, each one
+        mul_div_servant = MulDivServerI(caching.LRUCache(                                       # with its own cache of results (the divisions by zero
+            args.cache_size, errors=(CalculatorPro.DivisionByZero,)                             # are a result too, so they are cached as well).
+        ))
+        for name, servant in (('add_sub', add_sub_servant), ('mul_div', mul_div_servant)):      # Expose the counters of the caches as metrics.
+            for counter in ('hits', 'misses', 'evictions'):
+                metrics.REGISTRY.expose(f'calculator_{name}_cache_{counter}_total',
+                                        lambda cache=servant.cache, counter=counter: getattr(cache, counter), 'counter')
+
+        add_sub_proxy = adapter.add(add_sub_servant, Ice.stringToIdentity('AddSub'))            # Add the servant instances to the adapter with each of the identities.
+        mul_div_proxy = adapter.add(mul_div_servant, Ice.stringToIdentity('MulDiv'))
+
+    if args.cache_size:                                                                         # The server has been shut down.
+        log.info('AddSub cache: %s', add_sub_servant.cache.stats())
+        log.info('MulDiv cache: %s', mul_div_servant.cache.stats())
 
     return 0
 
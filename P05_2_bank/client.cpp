@@ -2,6 +2,19 @@
  * Author: A.J. Sanchez-Fernandez
  * Date: 17/03/2024
  * Description: Client script that simulates a bank operator.
+ * Usage: ./client [account id] [--input FILE] [--inflight INFLIGHT]
+ *
+ * With --input, the operations are read from a file (use - for the standard
+ * input) instead of being asked for, one per line (lines starting with '#'
+ * are skipped), and sent with at most INFLIGHT (default: 100) pending:
+ *
+ *     balance,<account>
+ *     deposit,<account>,<amount>
+ *     withdraw,<account>,<amount>
+ *     transfer,<account>,<to>,<amount>
+ *
+ * The result of each operation is written to the standard output in order
+ * (the balance, 'ok' or 'error: <exception>').
  */
 
 
@@ -9,11 +22,130 @@
 #include <Ice/Ice.h>
 #include <Bank.h>
 #include <stdexcept>
+#include <algorithm>
+#include <chrono>
+#include <deque>
+#include <fstream>
+#include <functional>
+#include <sstream>
+#include <vector>
 
 // Using the Bank namespace.
 using namespace Bank;
 
 
+// Waits for an operation sent by 'replay' and returns its result as a text.
+using Pending = std::function<std::string()>;
+
+
+// Sends the operations read from a stream with at most 'inflight' of them
+// pending, writes their results in order and returns the number of errors.
+int replay(std::istream& input, const std::shared_ptr<AccountPrx>& account,
+           const std::shared_ptr<TellerPrx>& teller, std::size_t inflight)
+{
+    std::deque<Pending> pending;
+    std::size_t count = 0;
+    int errors = 0;
+    auto start = std::chrono::steady_clock::now();
+
+    // Waits for the oldest operation and writes its result.
+    auto complete = [&]()
+    {
+        std::string result;
+        try
+        {
+            result = pending.front()();
+        }
+        catch(const Ice::Exception& e)
+        {
+            result = std::string("error: ") + e.ice_id();
+            errors++;
+        }
+        pending.pop_front();
+        std::cout << result << '\n';
+        count++;
+    };
+
+    std::string line;
+    std::size_t number = 0;
+    while(std::getline(input, line))
+    {
+        number++;
+        if(!line.empty() && line.back() == '\r')
+        {
+            line.pop_back();
+        }
+        if(line.empty() || line[0] == '#')
+        {
+            continue;
+        }
+
+        // Splitting the line into the operation and its arguments.
+        std::vector<std::string> fields;
+        std::stringstream stream(line);
+        std::string field;
+        while(std::getline(stream, field, ','))
+        {
+            fields.push_back(field);
+        }
+
+        // Each account is reached through its identity 'Account/<id>',
+        // with no round trip to create its proxy.
+        auto target = Ice::uncheckedCast<AccountPrx>(
+            account->ice_identity(Ice::Identity{fields.size() > 1 ? fields[1] : "", "Account"})
+        );
+        const std::string& op = fields[0];
+        try
+        {
+            if(op == "balance" && fields.size() == 2)
+            {
+                auto future = std::make_shared<std::future<double>>(target->getBalanceAsync());
+                pending.push_back([future]() { return std::to_string(future->get()); });
+            }
+            else if((op == "deposit" || op == "withdraw") && fields.size() == 3)
+            {
+                double amount = std::stod(fields[2]);
+                auto future = std::make_shared<std::future<void>>(
+                    op == "deposit" ? target->depositAsync(amount) : target->withdrawAsync(amount)
+                );
+                pending.push_back([future]() { future->get(); return std::string("ok"); });
+            }
+            else if(op == "transfer" && fields.size() == 4)
+            {
+                auto future = std::make_shared<std::future<void>>(
+                    teller->transferAsync(fields[1], fields[2], std::stod(fields[3]))
+                );
+                pending.push_back([future]() { future->get(); return std::string("ok"); });
+            }
+            else
+            {
+                throw std::invalid_argument("unknown operation");
+            }
+        }
+        catch(const std::logic_error&)
+        {
+            throw std::runtime_error("Line " + std::to_string(number) + ": invalid operation " + line);
+        }
+
+        // Keeping at most 'inflight' operations pending.
+        if(pending.size() >= inflight)
+        {
+            complete();
+        }
+    }
+    while(!pending.empty())
+    {
+        complete();
+    }
+
+    std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+    std::cerr << count << " operations in " << elapsed.count() << " s ("
+    << (elapsed.count() > 0 ? count / elapsed.count() : 0) << " operations/s), "
+    << errors << " errors" << std::endl;
+    return errors;
+}
+
+
 // Main function.
 int main(int argc, char* argv[])
 {
@@ -25,27 +157,72 @@ int main(int argc, char* argv[])
         std::cout << "Host: " << host << " (connecting port: "
         << port << ")" << std::endl;
 
-        // Initializing a communicator and creating a proxy.
+        // Initializing a communicator (which removes the Ice
+        // options from the arguments) and creating a proxy.
+        // The account 'Account/<id>' is used if an id is given.
+        // The operations are read from a file if --input is given.
         Ice::CommunicatorHolder ich(argc, argv);
+        std::string name = "Account";
+        std::string identity = "Account";
+        std::string input;
+        std::size_t inflight = 100;
+        for(int i = 1; i < argc; i++)
+        {
+            std::string arg = argv[i];
+            if(arg == "--input" && i + 1 < argc)
+            {
+                input = argv[++i];
+            }
+            else if(arg == "--inflight" && i + 1 < argc)
+            {
+                inflight = std::max(std::stoul(argv[++i]), 1UL);
+            }
+            else
+            {
+                name = arg;
+                identity += "/" + name;
+            }
+        }
+        std::cout << "Account: " << identity << std::endl;
         auto base = ich->stringToProxy(
-            "Account:default -h "+ host + " -p " + std::to_string(port)
+            identity + ":default -h " + host + " -p " + std::to_string(port)
         );
         auto account = Ice::checkedCast<AccountPrx>(base);
+        auto teller = Ice::checkedCast<TellerPrx>(ich->stringToProxy(
+            "Teller:default -h " + host + " -p " + std::to_string(port)
+        ));
 
-        // Checking if the proxy is valid.
-        if(!account)
+        // Checking if the proxies are valid.
+        if(!account || !teller)
         {
             throw std::runtime_error("Invalid proxy");
         }
 
+        // Replaying the operations of the file, if given.
+        if(!input.empty())
+        {
+            if(input == "-")
+            {
+                return replay(std::cin, account, teller, inflight) ? 1 : 0;
+            }
+            std::ifstream file(input);
+            if(!file)
+            {
+                throw std::runtime_error("Cannot open " + input);
+            }
+            return replay(file, account, teller, inflight) ? 1 : 0;
+        }
+
         // User interaction loop.
         while (true)
         {
             int option;
             double amount;
+            std::string to;
             std::cout << std::endl;
             std::cout << "Enter operation (1: Get current balance, "
-            "2: Deposit, 3: Withdraw, 4: Shutdown server and exit): ";
+            "2: Deposit, 3: Withdraw, 4: Shutdown server and exit, "
+            "5: Transfer): ";
             std::cin >> option;
 
             switch (option)
@@ -83,6 +260,17 @@ int main(int argc, char* argv[])
                     account->shutdown();      
                     return 0;
 
+                case 5:
+                    // Prompting the user to enter the destination
+                    // account and the amount, and transferring it.
+                    std::cout << "Enter destination account: ";
+                    std::cin >> to;
+                    std::cout << "Enter amount to transfer: ";
+                    std::cin >> amount;
+                    teller->transfer(name, to, amount);
+                    std::cout << "Transfer successful" << std::endl;
+                    break;
+
                 default:
                     // Displaying an error message for invalid
                     // user input.
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+
+"""
+Durability of the bank balances: write-ahead log, snapshots and recovery.
+
+Every deposit and withdrawal is appended to a write-ahead log (WAL) before its
+request is answered. The records of a batch (e.g., the two sides of a transfer)
+are preceded by a batch record with their count and only replayed if all of
+them made it to disk. A single writer thread writes and fsyncs everything that
+has been appended since its previous fsync (group commit), so concurrent
+requests share the cost of one fsync. Instead of blocking until its update is
+durable, a request can register a callback that the writer thread calls after
+the fsync (asynchronous dispatch), so no thread waits for the disk.
+Periodically, the whole account store is written to a compact snapshot file
+through a memory map and the log starts a new segment; the segments covered by
+the snapshot are then deleted. At startup the snapshot is loaded and only the
+log records after it are replayed.
+
+Files in the data directory:
+    snapshot.bin            The latest snapshot (replaced atomically).
+    wal-<first lsn>.log     The log segments written since that snapshot.
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+# Import the 'os', 'glob', 'mmap', 'struct', 'zlib', 'array' and 'heapq' libraries.
+import os, glob, mmap, struct, zlib, array, heapq
+
+# Import the 'threading' and 'logging' libraries.
+import threading, logging
+
+
+# Operations recorded in the log (the amount of a batch record is the number of records that follow).
+DEPOSIT = 0
+WITHDRAW = 1
+BATCH = 255
+
+# Log record: crc32, lsn, operation, amount and length of the account id (followed by the id).
+RECORD = struct.Struct('<IQBdH')
+
+# Longest account id, in UTF-8 bytes, that fits in a log record.
+MAX_ID = 0xFFFF
+
+# Snapshot header: magic, lsn of the last record included, number of accounts and size of the ids.
+SNAPSHOT = struct.Struct('<8sQQQ')
+MAGIC = b'BANKSNP1'
+
+log = logging.getLogger('SimpleBank')
+
+
+def encode_record(lsn: int, op: int, account_id: str, amount: float) -> bytes:
+    """Returns the binary form of a log record."""
+    key = account_id.encode('utf-8')
+    body = RECORD.pack(0, lsn, op, amount, len(key))[4:] + key
+    return struct.pack('<I', zlib.crc32(body)) + body
+
+
+def read_records(path: str):
+    """
+    Yields the records (lsn, op, account_id, amount) of a log segment. It stops
+    at the first truncated or corrupted record (e.g., a write torn by a crash).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        crc, lsn, op, amount, size = RECORD.unpack_from(data, offset)
+        end = offset + RECORD.size + size
+        if end > len(data) or zlib.crc32(data[offset + 4:end]) != crc:
+            log.warning('Log segment %s truncated at byte %d', path, offset)
+            return
+        yield lsn, op, data[offset + RECORD.size:end].decode('utf-8'), amount
+        offset = end
+
+
+class WriteAheadLog:
+    """
+    Class that appends the updates to the log segments with group commit.
+
+    Attributes:
+        directory (str): Directory of the log segments.
+        lsn (int): Log sequence number of the last appended record.
+        durable (int): Log sequence number of the last record written to disk.
+
+    Methods:
+        append (op, account_id, amount): Appends a record and returns its lsn.
+        append_batch (records): Appends records that must be replayed all or none.
+        wait (lsn): Blocks until the record with the given lsn is on disk.
+        on_durable (lsn, callback): Calls a function once the record with the given lsn is on disk.
+        rotate: Starts a new segment and returns the segments before it.
+        close: Writes the pending records and stops the writer thread.
+    """
+    def __init__(self, directory: str, lsn: int = 0):
+        """Constructor of the class, which opens a new segment after the given lsn."""
+        self.directory = directory
+        self.lsn = lsn
+        self.durable = lsn
+        self._buffer = bytearray()
+        self._closed = False
+
+        # Callbacks waiting for their records, as a heap of (lsn, order, callback).
+        self._waiters = []
+        self._order = 0
+
+        # The lock protects the buffer and the counters (appenders hold it
+        # briefly), while the I/O lock is held during each write and fsync.
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._pending = threading.Condition(self._lock)
+        self._flushed = threading.Condition(self._lock)
+
+        self._first = lsn + 1
+        self._file = self._open_segment(self._first)
+        self._writer = threading.Thread(target=self._run, name='WalWriter', daemon=True)
+        self._writer.start()
+
+    def _open_segment(self, first_lsn: int):
+        # A previous segment with this name cannot hold any valid record
+        # (they would have moved the lsn past it), so it is truncated.
+        return open(os.path.join(self.directory, f'wal-{first_lsn:020d}.log'), 'wb', buffering=0)
+
+    def append(self, op: int, account_id: str, amount: float) -> int:
+        """Appends a record to the buffer and returns its lsn."""
+        with self._lock:
+            # Encode the record first: if it fails, the lsn is not used up.
+            record = encode_record(self.lsn + 1, op, account_id, amount)
+            self.lsn += 1
+            self._buffer += record
+            self._pending.notify()
+            return self.lsn
+
+    def append_batch(self, records: list) -> int:
+        """Appends a list of (op, account_id, amount) records as a batch and returns the lsn of the last one."""
+        if len(records) == 1:
+            return self.append(*records[0])
+        with self._lock:
+            lsn = self.lsn + 1
+            chunk = [encode_record(lsn, BATCH, '', len(records))]
+            for op, account_id, amount in records:
+                lsn += 1
+                chunk.append(encode_record(lsn, op, account_id, amount))
+            self.lsn = lsn
+            self._buffer += b''.join(chunk)
+            self._pending.notify()
+            return self.lsn
+
+    def wait(self, lsn: int) -> None:
+        """Blocks until the record with the given lsn has been written and fsynced."""
+        with self._lock:
+            while self.durable < lsn:
+                self._flushed.wait()
+
+    def on_durable(self, lsn: int, callback) -> None:
+        """Calls 'callback()' once the record with the given lsn has been written and fsynced."""
+        with self._lock:
+            if self.durable < lsn:
+                self._order += 1
+                heapq.heappush(self._waiters, (lsn, self._order, callback))
+                return
+        callback()
+
+    def _flush(self) -> None:
+        """Writes and fsyncs the buffered records (the I/O lock must be held)."""
+        with self._lock:
+            data, self._buffer = self._buffer, bytearray()
+            lsn = self.lsn
+        if data:
+            self._file.write(data)
+            os.fsync(self._file.fileno())
+        ready = []
+        with self._lock:
+            self.durable = lsn
+            self._flushed.notify_all()
+            while self._waiters and self._waiters[0][0] <= lsn:
+                ready.append(heapq.heappop(self._waiters)[2])
+
+        # The callbacks (e.g., sending the replies) run without the lock.
+        for callback in ready:
+            try:
+                callback()
+            except Exception:
+                log.exception('Durability callback failed')
+
+    def _run(self) -> None:
+        """Writer thread: each fsync covers every record appended while the previous one ran."""
+        while True:
+            with self._lock:
+                while not self._buffer and not self._closed:
+                    self._pending.wait()
+                if self._closed and not self._buffer:
+                    return
+            with self._io_lock:
+                self._flush()
+
+    def segments(self) -> list:
+        """Returns the paths of the segments, oldest first."""
+        return sorted(glob.glob(os.path.join(self.directory, 'wal-*.log')))
+
+    def rotate(self) -> list:
+        """
+        Writes the pending records, starts a new segment after the current lsn
+        and returns the previous segments. No record can be appended meanwhile
+        if the caller holds the locks of the store.
+        """
+        with self._io_lock:
+            self._flush()
+            if self._first <= self.lsn:
+                self._file.close()
+                self._first = self.lsn + 1
+                self._file = self._open_segment(self._first)
+            return [path for path in self.segments() if path != self._file.name]
+
+    def close(self) -> None:
+        """Writes the pending records and stops the writer thread."""
+        with self._lock:
+            self._closed = True
+            self._pending.notify()
+        self._writer.join()
+        with self._io_lock:
+            self._flush()
+            self._file.close()
+
+
+def write_snapshot(directory: str, lsn: int, balances: array.array, ids: list) -> None:
+    """
+    Writes the balances and account ids (in slot order) to the snapshot file
+    through a memory map, and replaces the previous snapshot atomically.
+    """
+    keys = [account_id.encode('utf-8') for account_id in ids]
+    sizes = array.array('H', map(len, keys))
+    blob = b''.join(keys)
+
+    data = balances.tobytes()
+    size = SNAPSHOT.size + len(data) + len(sizes) * sizes.itemsize + len(blob)
+    path = os.path.join(directory, 'snapshot.bin')
+    tmp = path + '.tmp'
+
+    with open(tmp, 'w+b') as f:
+        f.truncate(size)
+        with mmap.mmap(f.fileno(), size) as m:
+            SNAPSHOT.pack_into(m, 0, MAGIC, lsn, len(ids), len(blob))
+            offset = SNAPSHOT.size
+            for chunk in (data, sizes.tobytes(), blob):
+                m[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+            m.flush()
+    os.replace(tmp, path)
+
+    # Make the rename itself durable.
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_snapshot(directory: str):
+    """Returns the lsn, balances and account ids of the snapshot (None if there is none)."""
+    path = os.path.join(directory, 'snapshot.bin')
+    if not os.path.exists(path) or os.path.getsize(path) < SNAPSHOT.size:
+        return None
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        magic, lsn, count, blob_size = SNAPSHOT.unpack_from(m, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a bank snapshot')
+
+        offset = SNAPSHOT.size
+        balances = array.array('d')
+        balances.frombytes(m[offset:offset + count * balances.itemsize])
+        offset += count * balances.itemsize
+
+        sizes = array.array('H')
+        sizes.frombytes(m[offset:offset + count * sizes.itemsize])
+        offset += count * sizes.itemsize
+
+        blob = m[offset:offset + blob_size]
+        ids, start = [], 0
+        for size in sizes:
+            ids.append(blob[start:start + size].decode('utf-8'))
+            start += size
+
+    return lsn, balances, ids
+
+
+class Durability:
+    """
+    Class that recovers the store and keeps it durable.
+
+    Attributes:
+        directory (str): The data directory.
+        store (AccountStore): The account store made durable.
+        wal (WriteAheadLog): The log that the store appends its updates to.
+
+    Methods:
+        snapshot: Writes a snapshot and deletes the log segments it covers.
+        close: Stops the periodic snapshots, writes a last one and closes the log.
+    """
+    def __init__(self, directory: str, store, interval: float = 60.0):
+        """Constructor of the class, which recovers the store and attaches the log to it."""
+        self.directory = directory
+        self.store = store
+        os.makedirs(directory, exist_ok=True)
+
+        lsn = self._recover()
+        self.wal = WriteAheadLog(directory, lsn)
+        store.journal = self.wal
+
+        # Periodic snapshots, so the log to replay at startup stays short.
+        self._stop = threading.Event()
+        self._interval = interval
+        self._snapshotter = threading.Thread(target=self._run, name='Snapshotter', daemon=True)
+        self._snapshotter.start()
+
+    def _recover(self) -> int:
+        """Loads the snapshot and replays the log records after it. Returns the last lsn."""
+        lsn = 0
+        snapshot = read_snapshot(self.directory)
+        if snapshot:
+            lsn, balances, ids = snapshot
+            self.store.restore(balances, ids)
+
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.directory, 'wal-*.log'))):
+            # A batch never spans two segments: an incomplete one is discarded.
+            batch, remaining = [], 0
+            for record_lsn, op, account_id, amount in read_records(path):
+                if record_lsn <= lsn:
+                    continue
+                if op == BATCH:
+                    batch, remaining = [], int(amount)
+                    continue
+                batch.append((op, account_id, amount))
+                remaining = max(remaining - 1, 0)
+                if remaining:
+                    continue
+                for record in batch:
+                    self.store.apply(*record)
+                lsn = record_lsn
+                replayed += len(batch)
+                batch = []
+
+        log.info('Recovered %d accounts (snapshot and %d log records, last lsn %d)',
+                 len(self.store), replayed, lsn)
+        return lsn
+
+    def snapshot(self) -> None:
+        """Writes a snapshot and deletes the log segments it covers."""
+        with self.store.frozen():
+            old = self.wal.rotate()
+            lsn = self.wal.lsn
+            balances, ids = self.store.copy()
+        write_snapshot(self.directory, lsn, balances, ids)
+        for path in old:
+            os.remove(path)
+        log.info('Snapshot of %d accounts written (lsn %d)', len(ids), lsn)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                self.snapshot()
+            except OSError:
+                log.exception('Snapshot failed')
+
+    def close(self) -> None:
+        """Stops the periodic snapshots, writes a last one and closes the log."""
+        self._stop.set()
+        self._snapshotter.join()
+        self.snapshot()
+        self.wal.close()
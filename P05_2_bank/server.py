@@ -4,7 +4,76 @@
 """
 Server script that simulates a bank operator.
 
-Usage: python3 server.py
+Every account is reached through the identity 'Account/<id>' and served by a
+single default servant backed by an in-memory account store. The identity
+'Account' is kept for the original single-account client. The 'Teller' object
+moves money between accounts: transfers and atomic batches of operations. The
+balances are made durable with a write-ahead log and periodic snapshots in the
+data directory.
+
+The operations that change balances are dispatched asynchronously (["amd"] in
+Bank.ice): each one applies its update, returns a future and frees its
+dispatch thread at once, and the future is completed by the log writer when
+the update is durable (group commit). This way, a couple of dispatch threads
+keep thousands of requests waiting for the disk.
+
+Usage: python3 server.py [-h] [--port PORT] [--max-accounts MAX_ACCOUNTS] [--data-dir DATA_DIR] [--snapshot-interval SNAPSHOT_INTERVAL]
+                         [--endpoints ENDPOINTS [ENDPOINTS ...]] [--threads THREADS] [--max-threads MAX_THREADS] [--message-size-max MESSAGE_SIZE_MAX]
+                         [--tcp-buffer-size TCP_BUFFER_SIZE] [--compress] [--acm-timeout ACM_TIMEOUT] [--config CONFIG] [--ice-property KEY=VALUE]
+                         [--log-level {DEBUG,INFO,WARNING,ERROR,CRITICAL}] [--log-format {text,json}]
+                         [--log-sample LOG_SAMPLE] [--log-rate LOG_RATE] [--log-queue LOG_QUEUE] [--log-overflow {drop,block}]
+                         [--metrics-port METRICS_PORT] [--trace-slow TRACE_SLOW]
+                         [--max-inflight MAX_INFLIGHT] [--operation-limit OPERATION=N] [--rate-limit RATE_LIMIT] [--burst BURST]
+
+Bank server script.
+
+options:
+  -h, --help            show this help message and exit
+  --port PORT, -p PORT  Port number. Use port 10000 (default) onwards.
+  --max-accounts MAX_ACCOUNTS, -ma MAX_ACCOUNTS
+                        Maximum number of accounts kept in memory (default: 1000000).
+  --data-dir DATA_DIR, -d DATA_DIR
+                        Directory of the write-ahead log and the snapshots (default: bank_data). Use '' to keep the balances only in memory.
+  --snapshot-interval SNAPSHOT_INTERVAL, -si SNAPSHOT_INTERVAL
+                        Seconds between snapshots (default: 60).
+  --endpoints ENDPOINTS [ENDPOINTS ...], -e ENDPOINTS [ENDPOINTS ...]
+                        Endpoints of the adapter, where {port} is the port number, e.g., "tcp -p {port}" "udp -p {port}" (default: "default -p {port}").
+  --threads THREADS, -t THREADS
+                        Initial number of threads dispatching requests (default: 1).
+  --max-threads MAX_THREADS, -mt MAX_THREADS
+                        Maximum number of dispatch threads; the pool grows on demand up to it (default: --threads).
+  --message-size-max MESSAGE_SIZE_MAX
+                        Maximum size of a message in KiB. Use 0 for no limit (default: 1024).
+  --tcp-buffer-size TCP_BUFFER_SIZE
+                        Size in bytes of the TCP receive and send buffers (default: system).
+  --compress            Publish the endpoints with compression, so the proxies created by the server compress.
+  --acm-timeout ACM_TIMEOUT
+                        Seconds after which the idle connections are closed. Use 0 to keep them (default: 60).
+  --config CONFIG       Configuration file with Ice properties (disabled by default).
+  --ice-property KEY=VALUE
+                        Ice property, e.g., Ice.Trace.Network=1 (may be repeated).
+  --log-level {DEBUG,INFO,WARNING,ERROR,CRITICAL}, -l {DEBUG,INFO,WARNING,ERROR,CRITICAL}
+                        Logging level. Use DEBUG to trace every request (default: INFO).
+  --log-format {text,json}
+                        Format of the log records (default: text).
+  --log-sample LOG_SAMPLE
+                        Fraction of the records below WARNING that are kept (default: 1.0).
+  --log-rate LOG_RATE   Maximum records per second below WARNING. Use 0 (default) for no limit.
+  --log-queue LOG_QUEUE
+                        Maximum number of records waiting to be written (default: 10000).
+  --log-overflow {drop,block}
+                        What to do with a record when the queue is full: drop it (default) or wait for room.
+  --metrics-port METRICS_PORT
+                        Port of the local HTTP endpoint of the metrics. Use 0 (default) to disable it.
+  --trace-slow TRACE_SLOW
+                        Log the calls slower than the given milliseconds. Use 0 (default) to disable it.
+  --max-inflight MAX_INFLIGHT
+                        Maximum number of calls in progress at a time. Use 0 (default) for no limit.
+  --operation-limit OPERATION=N
+                        Maximum number of calls of an operation in progress at a time, e.g., applyBatch=4 (may be repeated).
+  --rate-limit RATE_LIMIT
+                        Maximum number of calls admitted per second. Use 0 (default) for no limit.
+  --burst BURST         Number of calls admitted at once above --rate-limit (default: one second of calls).
 
 Author: Andres J. Sanchez-Fernandez
 Email: sfandres@unex.es
@@ -16,16 +85,66 @@ Version: v1
 # Import the 'sys' and 'Ice' libraries.
 import sys, Ice
 
-# Import the 'Bank' module.
+# Import the 'Bank' module, the account store and its durability.
 import Bank
+from store import AccountStore, InvalidAmountError, InsufficientFundsError, AccountUnavailableError
+from durability import Durability
+
+# Import the 'argparse', 'os' and 'logging' libraries.
+import argparse, os, logging
+
+# Make the shared 'common' package (repository root) importable
+# and import the shared start-up, logging, metrics and admission control modules.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common import bootstrap, logger, metrics, admission
+
+# Logger used by the servant (configured in main).
+log = logging.getLogger('SimpleBank')
+
+
+def get_args() -> argparse.Namespace:
+    """
+    Parse and retrieve command-line arguments.
+
+    Returns:
+        An 'argparse.Namespace' object containing the parsed arguments.
+    """
+    # Parser creation and description.
+    parser = argparse.ArgumentParser(description='Bank server script.')
+
+    # Options.
+    parser.add_argument('--port', '-p', type=int, default=10000,
+                        help='Port number. Use port 10000 (default) onwards.')
+
+    parser.add_argument('--max-accounts', '-ma', type=int, default=1_000_000,
+                        help='Maximum number of accounts kept in memory (default: 1000000).')
+
+    parser.add_argument('--data-dir', '-d', type=str, default='bank_data',
+                        help=('Directory of the write-ahead log and the snapshots (default: bank_data). '
+                              "Use '' to keep the balances only in memory."))
 
+    parser.add_argument('--snapshot-interval', '-si', type=float, default=60.0,
+                        help='Seconds between snapshots (default: 60).')
 
+    bootstrap.add_ice_args(parser)
+    logger.add_logging_args(parser)
+    metrics.add_metrics_args(parser)
+    admission.add_admission_args(parser)
+
+    # Parse and return the arguments.
+    return parser.parse_args(sys.argv[1:])
+
+
+@metrics.instrument
+@admission.limited(Bank.Overloaded, exempt=('shutdown',))
 class AccountI(Bank.Account):
     """
     Class that inherits from the 'Account' class in the 'Bank' module.
+    It is the default servant of every account: the account is taken
+    from the name of the identity that each request is sent to.
     
     Attributes:
-        balance (float): The current account balance.
+        store (AccountStore): The balances of all the accounts.
     
     Methods:
         getBalance: Returns the account balance.
@@ -33,71 +152,148 @@ class AccountI(Bank.Account):
         withdraw (amount): Decreases the account balance.
         shutdown (current): Shuts down the server.
     """
-    def __init__(self):
-        """Constructor of the class, which sets up the account."""
-        self.balance = 0.0
-        print('\nBank account successfully opened!')
+    def __init__(self, store: AccountStore):
+        """Constructor of the class, which sets up the bank."""
+        self.store = store
+        log.info('Bank successfully opened!')
 
     def getBalance(self, current=None):
         """Gets the account balance."""
-        print('\nCurrent balance retrieved')
-        return self.balance
+        log.debug('Current balance of %s retrieved', current.id.name)
+        return self.store.balance(current.id.name)
 
     def deposit(self, amount, current=None):
-        """Increases the account balance."""
-        print('\nInitiating deposit...')
-        self.balance += amount
-        print('Deposit successfully completed!')
+        """Increases the account balance (answered once the update is durable)."""
+        future = Ice.Future()
+        try:
+            self.store.deposit(current.id.name, amount, lambda: future.set_result(None))
+        except InvalidAmountError:
+            log.warning('Deposit of %s in %s rejected: invalid amount', amount, current.id.name)
+            raise Bank.InvalidAmount(amount)
+        except AccountUnavailableError as ex:
+            log.warning('Deposit of %s in %.64s rejected: %s', amount, current.id.name, ex.args[1])
+            raise Bank.AccountUnavailable(*ex.args)
+        log.debug('Deposit of %s in %s successfully completed!', amount, current.id.name)
+        return future
 
     def withdraw(self, amount, current=None):
-        """Decreases the account balance."""
-        print('\nInitiating withdrawal...')
-        if amount > self.balance:
-            raise ValueError('Insufficient funds')
-        self.balance -= amount
-        print('Withdrawal successfully completed!')
+        """Decreases the account balance (answered once the update is durable)."""
+        future = Ice.Future()
+        try:
+            self.store.withdraw(current.id.name, amount, lambda: future.set_result(None))
+        except InvalidAmountError:
+            log.warning('Withdrawal of %s from %s rejected: invalid amount', amount, current.id.name)
+            raise Bank.InvalidAmount(amount)
+        except InsufficientFundsError:
+            log.warning('Withdrawal of %s from %s rejected: insufficient funds', amount, current.id.name)
+            raise Bank.InsufficientFunds(current.id.name, self.store.balance(current.id.name))
+        log.debug('Withdrawal of %s from %s successfully completed!', amount, current.id.name)
+        return future
 
     def shutdown(self, current):
         """Shuts down the server."""
-        print('\nShutting down...')
+        log.info('Shutting down...')
         current.adapter.getCommunicator().shutdown()
 
 
-def main():
+@metrics.instrument
+@admission.limited(Bank.Overloaded)
+class TellerI(Bank.Teller):
+    """
+    Class that inherits from the 'Teller' class in the 'Bank' module.
+    It applies several operations over the accounts in a single request.
+
+    Attributes:
+        store (AccountStore): The balances of all the accounts.
+
+    Methods:
+        transfer (account, to, amount): Moves money from an account to another.
+        applyBatch (txs): Applies deposits, withdrawals and transfers all or none.
+    """
+    def __init__(self, store: AccountStore):
+        """Constructor of the class, which sets up the teller."""
+        self.store = store
+
+    def transfer(self, account, to, amount, current=None):
+        """Moves money from an account to another atomically (answered once it is durable)."""
+        future = Ice.Future()
+        item = (Bank.TxKind.Transfer.value, account, to, amount)
+        try:
+            committed, [(status, balance)] = self.store.apply_batch([item], lambda: future.set_result(None))
+        except AccountUnavailableError as ex:
+            log.warning('Transfer of %s from %.64s to %.64s rejected: %s', amount, account, to, ex.args[1])
+            raise Bank.AccountUnavailable(*ex.args)
+        if not committed:
+            log.warning('Transfer of %s from %s to %s rejected', amount, account, to)
+            if status == Bank.TxStatus.AmountRejected.value:
+                raise Bank.InvalidAmount(amount)
+            raise Bank.InsufficientFunds(account, balance)
+        log.debug('Transfer of %s from %s to %s successfully completed!', amount, account, to)
+        return future
+
+    def applyBatch(self, txs, current=None):
+        """Applies deposits, withdrawals and transfers all or none, and returns the result of each one (once durable)."""
+        # The batch may become durable before its results are built.
+        durable, future = Ice.Future(), Ice.Future()
+        try:
+            committed, results = self.store.apply_batch([(tx.kind.value, tx.account, tx.to, tx.amount) for tx in txs],
+                                                        lambda: durable.set_result(None))
+        except AccountUnavailableError as ex:
+            log.warning('Batch of %d operations rejected: %s (%.64s)', len(txs), ex.args[1], ex.args[0])
+            raise Bank.AccountUnavailable(*ex.args)
+        log.debug('Batch of %d operations %s', len(txs), 'applied' if committed else 'rejected')
+        results = [Bank.TxResult(Bank.TxStatus.valueOf(status), balance) for status, balance in results]
+        durable.add_done_callback(lambda _: future.set_result(results))
+        return future
+
+
+def main(args: argparse.Namespace) -> bool:
     """
     Main function.
 
+    Args:
+        args: An 'argparse.Namespace' object containing the parsed arguments.
+
     Returns:
         A boolean indicating the success of the process.
     """
-    # Configure the listening port.
-    port = 10000
-    print(f'Listening port: {port}')
+    # Start the asynchronous logging.
+    logger.setup_logging(args, 'SimpleBank')
+
+    # Start the dispatch metrics (and their HTTP endpoint, if enabled).
+    metrics.setup_metrics(args)
 
-    # Initialize the Ice communicator.
-    with Ice.initialize(sys.argv) as communicator:
+    # Set the limits of the admission control (rejecting the calls beyond them).
+    admission.setup_admission(args)
 
-        # Create a new object adapter with the name
-        # 'SimpleBank' and the specified listening port.
-        adapter = communicator.createObjectAdapterWithEndpoints(
-            'SimpleBank', f'default -p {port}'
-        )
+    # Create the account store and recover it from the data directory (if any).
+    store = AccountStore(capacity=args.max_accounts)
+    durability = Durability(args.data_dir, store, args.snapshot_interval) if args.data_dir else None
 
-        # Create a new instance of the 'AccountI' class.
-        servant = AccountI()
+    # Create the communicator and a new object adapter with the name 'SimpleBank'
+    # and the given endpoints (dispatching the requests with the thread pool
+    # of --threads and --max-threads), activated at the end of the block.
+    with bootstrap.serve(args, 'SimpleBank') as adapter:
 
-        # Add the 'servant' to the 'adapter' with the identity 'Account'.
-        adapter.add(servant, communicator.stringToIdentity('Account'))
+        # Create the 'AccountI' default servant.
+        servant = AccountI(store)
+        teller = TellerI(store)
 
-        # Activate the adapter.
-        adapter.activate()
+        # Serve every 'Account/<id>' identity with the 'servant', and
+        # keep the identity 'Account' for the single-account client.
+        adapter.addDefaultServant(servant, 'Account')
+        adapter.add(servant, Ice.stringToIdentity('Account'))
+        adapter.add(teller, Ice.stringToIdentity('Teller'))
 
-        # Wait for the server to be shut down.
-        communicator.waitForShutdown()
+    # The server has been shut down and all the requests have
+    # been dispatched: write a last snapshot and close the log.
+    if durability:
+        durability.close()
 
     return 0
 
 
 # Call the main function and exit with the returned status code.
 if __name__ == '__main__':
-    sys.exit(main())
+    args = get_args()
+    sys.exit(main(args))
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+"""
+In-memory store that keeps the balances of all the bank accounts.
+
+The balances are packed in a single array of doubles and a dictionary maps
+each account id to its slot in the array, so an account costs one dictionary
+entry and eight bytes instead of one Python servant object. The updates are
+serialized with a fixed set of striped locks (one per group of slots), so
+operations on different accounts rarely wait for each other.
+
+If a journal is attached (see durability.py), each update is appended to it
+while its lock is held and before the balance changes (so an update that
+cannot be journaled is not applied), and the caller waits until the journal has made it
+durable once the lock has been released. Callers that cannot block (e.g., an
+asynchronous dispatch) pass a 'durable' function instead, which is called
+once the update is durable, and the update returns at once.
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+# Import the 'array', 'threading' and 'contextlib' libraries.
+import array, threading, contextlib
+
+# Import the operations recorded in the journal and the longest account id it accepts.
+from durability import DEPOSIT, WITHDRAW, MAX_ID
+
+# Kinds of the batch items (DEPOSIT and WITHDRAW too) and their
+# statuses, in the same order as the 'TxKind' and 'TxStatus' Slice enums.
+TRANSFER = 2
+APPLIED, NOT_APPLIED, AMOUNT_REJECTED, FUNDS_REJECTED = range(4)
+
+
+class InvalidAmountError(ValueError):
+    """Raised when an amount is negative or not a number."""
+
+
+class InsufficientFundsError(ValueError):
+    """Raised when a withdrawal exceeds the balance of the account."""
+
+
+class AccountUnavailableError(ValueError):
+    """Raised with the account id and the reason when an account cannot be opened (store full or id too long)."""
+
+
+class AccountStore:
+    """
+    Class that stores the account balances in an array indexed by a hash table.
+
+    Attributes:
+        capacity (int): Maximum number of accounts that can be opened.
+        balances (array.array): The balances of the accounts, one slot per account.
+        index (dict): Maps each account id to its slot in 'balances'.
+        journal (WriteAheadLog): Log that the updates are appended to (None if not durable).
+
+    Methods:
+        slot (account_id, create): Returns the slot of an account.
+        balance (account_id): Returns the balance of an account.
+        deposit (account_id, amount, durable): Increases the balance of an account.
+        withdraw (account_id, amount, durable): Decreases the balance of an account.
+        apply_batch (items, durable): Applies deposits, withdrawals and transfers all or none.
+        apply (op, account_id, amount): Replays a journaled update.
+        restore (balances, ids): Replaces the content of the store.
+        frozen: Context manager that blocks every update.
+        copy: Returns a copy of the balances and the account ids.
+    """
+    def __init__(self, capacity: int = 1_000_000, stripes: int = 64):
+        """Constructor of the class, which sets up an empty store."""
+        self.capacity = capacity
+        self.balances = array.array('d')
+        self.index = {}
+        self.journal = None
+
+        # The index lock protects the creation of accounts, while
+        # the striped locks protect the balances of the existing ones.
+        self._index_lock = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def __len__(self):
+        return len(self.index)
+
+    def lock(self, slot: int) -> threading.Lock:
+        """Returns the lock that protects the given slot."""
+        return self._locks[slot % len(self._locks)]
+
+    def slot(self, account_id: str, create: bool = False) -> int:
+        """Returns the slot of an account (None if it does not exist and 'create' is not set)."""
+        slot = self.index.get(account_id)
+        if slot is not None or not create:
+            return slot
+
+        with self._index_lock:
+            # Check again: another thread may have opened it meanwhile.
+            slot = self.index.get(account_id)
+            if slot is None:
+                if len(self.balances) >= self.capacity:
+                    raise AccountUnavailableError(account_id, 'Maximum number of accounts reached')
+                if len(account_id.encode('utf-8')) > MAX_ID:
+                    raise AccountUnavailableError(account_id, f'Account id longer than {MAX_ID} bytes')
+                slot = len(self.balances)
+                self.balances.append(0.0)
+                self.index[account_id] = slot
+            return slot
+
+    def balance(self, account_id: str) -> float:
+        """Returns the balance of an account (0.0 if it has not been opened)."""
+        slot = self.slot(account_id)
+        return 0.0 if slot is None else self.balances[slot]
+
+    def _durable(self, lsn: int, durable) -> None:
+        """Waits until the update with the given lsn is durable or, if given, calls 'durable()' once it is."""
+        if durable is None:
+            if lsn:
+                self.journal.wait(lsn)
+        elif lsn:
+            self.journal.on_durable(lsn, durable)
+        else:
+            durable()
+
+    def deposit(self, account_id: str, amount: float, durable=None) -> float:
+        """Increases the balance of an account, opening it if needed, and returns the new balance."""
+        if not amount >= 0.0:
+            raise InvalidAmountError(amount)
+        slot = self.slot(account_id, create=True)
+        with self.lock(slot):
+            lsn = self.journal.append(DEPOSIT, account_id, amount) if self.journal else 0
+            self.balances[slot] += amount
+            balance = self.balances[slot]
+        self._durable(lsn, durable)
+        return balance
+
+    def withdraw(self, account_id: str, amount: float, durable=None) -> float:
+        """Decreases the balance of an account and returns the new balance."""
+        if not amount >= 0.0:
+            raise InvalidAmountError(amount)
+        slot = self.slot(account_id)
+        if slot is None:
+            raise InsufficientFundsError(account_id)
+        with self.lock(slot):
+            if amount > self.balances[slot]:
+                raise InsufficientFundsError(account_id)
+            lsn = self.journal.append(WITHDRAW, account_id, amount) if self.journal else 0
+            self.balances[slot] -= amount
+            balance = self.balances[slot]
+        self._durable(lsn, durable)
+        return balance
+
+    def apply_batch(self, items: list, durable=None):
+        """
+        Applies a list of (kind, account_id, to, amount) items all or none: if
+        any of them is rejected, no balance changes. The accounts that receive
+        money are opened even if the batch is rejected. If one of them cannot be
+        opened, the whole batch is rejected with an 'AccountUnavailableError'.
+
+        Returns:
+            A boolean indicating if the batch was applied, and the (status, balance)
+            of each item, where the balance is the one of 'account_id' after it.
+        """
+        # Look up (or open) the accounts before locking, since opening one takes
+        # the index lock, which must never be requested while holding a stripe.
+        slots = [(self.slot(account_id, create=(kind == DEPOSIT)),
+                  self.slot(to, create=True) if kind == TRANSFER else None)
+                 for kind, account_id, to, amount in items]
+        stripes = sorted({slot % len(self._locks) for pair in slots for slot in pair if slot is not None})
+
+        lsn = 0
+        with contextlib.ExitStack() as stack:
+            # Taking the stripes in ascending order prevents deadlocks between batches.
+            for stripe in stripes:
+                stack.enter_context(self._locks[stripe])
+
+            # Work on a copy of the balances involved, written back only if all the items succeed.
+            pending = {slot: self.balances[slot] for pair in slots for slot in pair if slot is not None}
+            results, records = [], []
+            for (kind, account_id, to, amount), (source, target) in zip(items, slots):
+                if not amount >= 0.0:
+                    results.append([AMOUNT_REJECTED, pending.get(source, 0.0)])
+                    continue
+                if kind != DEPOSIT and (source is None or amount > pending[source]):
+                    results.append([FUNDS_REJECTED, pending.get(source, 0.0)])
+                    continue
+                if kind == DEPOSIT:
+                    pending[source] += amount
+                    records.append((DEPOSIT, account_id, amount))
+                else:
+                    pending[source] -= amount
+                    records.append((WITHDRAW, account_id, amount))
+                    if kind == TRANSFER:
+                        pending[target] += amount
+                        records.append((DEPOSIT, to, amount))
+                results.append([APPLIED, pending[source]])
+
+            committed = all(status == APPLIED for status, _ in results)
+            if committed:
+                if self.journal and records:
+                    lsn = self.journal.append_batch(records)
+                for slot, balance in pending.items():
+                    self.balances[slot] = balance
+            else:
+                for result, (source, _) in zip(results, slots):
+                    if result[0] == APPLIED:
+                        result[0] = NOT_APPLIED
+                    result[1] = 0.0 if source is None else self.balances[source]
+
+        self._durable(lsn, durable)
+        return committed, results
+
+    def apply(self, op: int, account_id: str, amount: float) -> None:
+        """Replays a journaled update (no checks are made and nothing is journaled)."""
+        slot = self.slot(account_id, create=True)
+        self.balances[slot] += amount if op == DEPOSIT else -amount
+
+    def restore(self, balances: array.array, ids: list) -> None:
+        """Replaces the content of the store with the given balances and account ids (in slot order)."""
+        self.balances = balances
+        self.index = {account_id: slot for slot, account_id in enumerate(ids)}
+
+    @contextlib.contextmanager
+    def frozen(self):
+        """Context manager that blocks every update (and the opening of accounts) while it is active."""
+        with self._index_lock, contextlib.ExitStack() as stack:
+            for lock in self._locks:
+                stack.enter_context(lock)
+            yield
+
+    def copy(self):
+        """Returns a copy of the balances and the account ids in slot order (call it while frozen)."""
+        return self.balances[:], list(self.index)
@@ -4,7 +4,58 @@
 """
 Client script that sends a guess to the server.
 
-Usage: client.py
+The client asks the 'GameFactory' object for a game of its own, so several
+clients can play at the same time, each one guessing its own number.
+
+The guesses need a reply, so they are always sent over TCP. With --transport
+udp, the notifications that need none (quitting the game) are sent as a
+datagram instead, which spares the server a reply.
+
+The target number is drawn from --range (1 to 100 by default, up to the
+64-bit limits). With --solve, the client plays by itself: a binary search that
+asks the server for the compact result of each guess (evaluate), so it finds
+the number in at most log2(HIGH - LOW + 1) + 1 guesses (7 from 1 to 100).
+
+With --tournament GAMES, the client starts a tournament of that many games at
+once and solves all of them with the same binary search, vectorized: each
+round sends one guess per game, in blocks of CHUNK guesses, and gets back the
+packed results.
+
+With --input, the guesses are read from a file (or the standard input)
+instead, and sent with at most INFLIGHT pending (see common/replay.py for the
+formats). Each line names its game, and every game is played in a game of
+our own, started on its first line:
+
+    guess,alice,50
+    guess,bob,75
+    guess,alice,25
+    quit,alice
+
+Usage: client.py [-h] [--host HOST] [--port PORT] [--transport {tcp,udp}] [--range LOW HIGH] [--solve] [--tournament GAMES]
+                 [--inflight INFLIGHT] [--input INPUT] [--format {csv,jsonl,binary}] [--output OUTPUT]
+
+Guessing game client script.
+
+options:
+  -h, --help            show this help message and exit
+  --host HOST, -ht HOST
+                        Communication via the host. Use localhost (default) or give an IP address (e.g., 192.168.1.140).
+  --port PORT, -p PORT  Port number. Use port 10000 (default) onwards.
+  --transport {tcp,udp}, -tr {tcp,udp}
+                        Transport of the requests without reply (default: tcp).
+  --range LOW HIGH, -r LOW HIGH
+                        Range of the target number, 64-bit (default: 1 100).
+  --solve, -s           Play automatically with a binary search instead of asking for the guesses.
+  --tournament GAMES, -tn GAMES
+                        Solve a tournament of the given number of games. Use 0 (default) to play a single game.
+  --inflight INFLIGHT, -i INFLIGHT
+                        Maximum number of replayed requests in flight (default: 100).
+  --input INPUT, -in INPUT
+                        File of operations to send instead of asking for them. Use - for the standard input (disabled by default).
+  --format {csv,jsonl,binary}, -fmt {csv,jsonl,binary}
+                        Format of the operations (default: from the file extension, or csv).
+  --output OUTPUT, -out OUTPUT
+                        File where the result of each operation is written. Use - for the standard output (disabled by default).
 
 Author: Andres J. Sanchez-Fernandez
 Email: sfandres@unex.es
@@ -16,46 +67,207 @@ Version: v1
 import sys, Ice                                                                                 # Import the sys and Ice libraries (Ice runtime).
 import NumberGuessingGame                                                                       # Import the NumberGuessingGame module (proxies and skeletons).
 import argparse                                                                                 # Import the argparse library for cmd arguments.
+import os, time                                                                                 # Import the os and time libraries.
+import numpy as np                                                                              # Import the NumPy library for the tournaments.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))         # Make the shared 'common' package (repository root) importable.
+from common import proxies, replay                                                              # Import the shared proxy pool and replay modules.
+
+CHUNK = 100_000                                                                                 # Guesses of a tournament per request (800 KB, under Ice.MessageSizeMax).
+
+OPERATIONS = {'guess': (str, int), 'quit': (str,)}                                              # Operations that can be replayed from a file (--input): a guess
+                                                                                                # in a game and the end of a game, named by the first argument.
+
+
+def get_args() -> argparse.Namespace:
+    """
+    Parse and retrieve command-line arguments.
+
+    Returns:
+        An 'argparse.Namespace' object containing the parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description='Guessing game client script.')                # Parser creation and description.
+
+    parser.add_argument('--host', '-ht', type=str, default='localhost',                         # Options.
+                        help=('Communication via the host. Use localhost (default) '
+                             'or give an IP address (e.g., 192.168.1.140).'))
+
+    parser.add_argument('--port', '-p', type=int, default=10000,
+                        help='Port number. Use port 10000 (default) onwards.')
+
+    parser.add_argument('--transport', '-tr', type=str, choices=('tcp', 'udp'), default='tcp',
+                        help='Transport of the requests without reply (default: tcp).')
+
+    parser.add_argument('--range', '-r', type=int, nargs=2, default=[1, 100], metavar=('LOW', 'HIGH'),
+                        help='Range of the target number, 64-bit (default: 1 100).')
+
+    parser.add_argument('--solve', '-s', action='store_true',
+                        help='Play automatically with a binary search instead of asking for the guesses.')
+
+    parser.add_argument('--tournament', '-tn', type=int, default=0, metavar='GAMES',
+                        help='Solve a tournament of the given number of games. Use 0 (default) to play a single game.')
+
+    parser.add_argument('--inflight', '-i', type=int, default=100,
+                        help='Maximum number of replayed requests in flight (default: 100).')
+
+    replay.add_replay_args(parser)
 
+    return parser.parse_args(sys.argv[1:])                                                      # Parse and return the arguments.
 
-def main() -> bool:
+
+class GameTable:
+    """
+    Class that plays the games of a replayed file, each one in a game of our own.
+
+    Attributes:
+        factory: The 'SessionFactory' proxy that starts the games.
+        transport (str): Transport of the requests without reply ('tcp' or 'udp').
+        low (int): Lowest target number of the games.
+        high (int): Highest target number of the games.
+        games (dict): The 'Game' proxy of each game in progress, by name.
+
+    Methods:
+        begin (operation, game, *args): Starts an operation in a game and returns its 'Ice.Future'.
+    """
+    def __init__(self, factory, transport: str, low: int = 1, high: int = 100):
+        self.factory = factory
+        self.transport = transport
+        self.low = low
+        self.high = high
+        self.games = {}
+
+    def begin(self, operation: str, game: str, *args):
+        """Starts an operation in a game (starting the game on its first operation) and returns its 'Ice.Future'."""
+        server = self.games.get(game)
+        if server is None:
+            server = self.games[game] = self.factory.newGameInRange(self.low, self.high)
+        if operation == 'quit':
+            del self.games[game]
+            notify = server.ice_datagram() if self.transport == 'udp' else server.ice_oneway()
+            return notify.quitAsync()                                                           # Completed once sent.
+        return server.checkGuessAsync(*args)
+
+
+def solve(server, low: int = 1, high: int = 100) -> int:
+    """
+    Play a game with a binary search over the range of the target number.
+
+    Args:
+        server: The 'Game' proxy.
+        low: Lowest possible target number.
+        high: Highest possible target number.
+
+    Returns:
+        The exit status: 0 if the number was found, 1 otherwise.
+    """
+    attempts = 0
+    while low <= high:
+        guess = (low + high) // 2                                                               # Halve the range left with each guess.
+        result = server.evaluate(guess)
+        attempts += 1
+        if result == NumberGuessingGame.GuessResult.Correct:
+            print(f'Correct: the number was {guess} ({attempts} guesses).')
+            return 0
+        if result == NumberGuessingGame.GuessResult.Higher:
+            high = guess - 1
+        else:
+            low = guess + 1
+    print('The number is not in the range.')
+    return 1
+
+
+def solve_tournament(factory, games: int, low: int, high: int) -> int:
+    """
+    Start a tournament and solve all its games with a vectorized binary search.
+
+    Args:
+        factory: The 'SessionFactory' proxy.
+        games: Number of games of the tournament.
+        low: Lowest possible target number.
+        high: Highest possible target number.
+
+    Returns:
+        The exit status: 0 if every number was found, 1 otherwise.
+    """
+    start = time.perf_counter()
+    tournament = factory.newTournament(games, low, high)
+    created = time.perf_counter() - start
+
+    lows = np.full(games, low, dtype=np.int64)                                                  # Range left of each game.
+    highs = np.full(games, high, dtype=np.int64)
+    higher, lower = NumberGuessingGame.GuessResult.Higher.value, NumberGuessingGame.GuessResult.Lower.value
+    rounds, solved = 0, False
+    while not solved and rounds < 65:                                                           # 65 guesses find any 64-bit number.
+        guesses = lows // 2 + highs // 2 + (lows % 2 + highs % 2) // 2                          # The middle of each range, without overflowing.
+        futures = [tournament.checkGuessesAsync(first, guesses[first:first + CHUNK]) for first in range(0, games, CHUNK)]
+        results = np.concatenate([future.result() for future in futures])
+        rounds += 1
+        solved = not ((results == higher) | (results == lower)).any()
+        highs = np.where(results == higher, guesses - 1, highs)
+        lows = np.where(results == lower, guesses + 1, lows)
+    elapsed = time.perf_counter() - start - created
+    tournament.quit()
+
+    print(f'Tournament of {games} games created in {created:.3f} s and solved in {rounds} rounds '
+          f'({elapsed:.3f} s, {games * rounds / elapsed:.0f} guesses/s).')
+    return 0 if solved else 1
+
+
+def main(args: argparse.Namespace) -> bool:
     """
     Main function.
+
+    Args:
+        args: An 'argparse.Namespace' object containing the parsed arguments.
     
     Returns:
         A boolean indicating the success of the process.
     """
-    host = 'localhost'                                                                          # Set the default host.
-    port = 10000                                                                                # Set the default port number.
+    host = args.host                                                                            # Get the host.
+    port = args.port                                                                            # Get the port number.
     result = None                                                                               # Initialize the 'result' variable to None.
     print(f'Host: {host} (connecting port: {port})\n')                                          # Print the host and port number.
 
-    with Ice.initialize(sys.argv) as communicator:                                              # Initialize the Ice run time and create a communicator.
+    # Connect to the server.
+    factory = proxies.get(                                                                      # Get the 'SessionFactory' proxy of the 'GameFactory' object, which can be communicated
+        f'GameFactory:default -h {host} -p {port}',                                             # with via the host with the IP address or localhost using the specified
+        NumberGuessingGame.SessionFactoryPrx                                                    # port number and the default communication protocol. The proxy is checked
+    )                                                                                           # (checkedCast) only the first time and then reused with its connection.
 
-        # Connect to the server.
-        proxy = communicator.stringToProxy(                                                     # Create a proxy for the 'NumberGuessingGame' object, which can be communicated
-            f'NumberGuessingGame:default -h {host} -p {port}'                                   # with via the host with the IP address or localhost using the specified
-        )                                                                                       # port number and the default communication protocol.
+    low, high = args.range                                                                      # Range of the target numbers.
+    if args.input:                                                                              # Play the games of the file instead of asking for the guesses.
+        return replay.replay(args, OPERATIONS, GameTable(factory, args.transport, low, high).begin, args.inflight)
+    if args.tournament:
+        return solve_tournament(factory, args.tournament, low, high)
 
-        server = NumberGuessingGame.GamePrx.checkedCast(proxy)                                  # Cast the given 'proxy' to a 'Game' proxy and assign the resulting
-        if not server:                                                                          # object to the variable 'server'. This allows communication with the
-            raise RuntimeError('Invalid proxy')                                                 # remote 'Game' object via the 'server' object.
+    server = factory.newGameInRange(low, high)                                                  # Start a game of our own. This allows communication with the
+                                                                                                # remote 'Game' object via the 'server' object.
+    notify = server.ice_datagram() if args.transport == 'udp' else server.ice_oneway()          # Proxy of the requests without reply (the game publishes
+                                                                                                # both TCP and UDP endpoints).
+    if args.solve:
+        return solve(server, low, high)
 
-        # Start the game.
-        while result != 'Correct':                                                              # Loop until the guess is correct.
+    # Start the game.
+    while result != 'Correct':                                                                  # Loop until the guess is correct.
 
-            guess = int(input('Enter your guess from 1 to 100 (or 0 to quit): '))               # Ask the user for a guess.
-            if guess == 0:                                                                      # Check if the guess is 0.
-                print('\nQuitting the game.')
-                return 0
+        guess = input(f'Enter your guess from {low} to {high} (or q to quit): ')                # Ask the user for a guess.
+        if guess.strip().lower() == 'q':                                                        # Check if the user quits.
+            notify.quit()                                                                       # End the game on the server (no need to wait).
+            print('\nQuitting the game.')
+            return 0
 
-            result = server.checkGuess(guess)                                                   # Call the functions on the 'server' object.
-            print(result)                                                                       # Print the result of the guess.
+        try:
+            result = server.checkGuess(int(guess))                                              # Call the functions on the 'server' object.
+        except Ice.ObjectNotExistException:                                                     # The server ended the game after a long inactivity.
+            print('\nThe game has expired.')
+            return 1
+        print(result)                                                                           # Print the result of the guess.
 
-        print('\nQuitting the game.')
+    print('\nQuitting the game.')
 
     return 0
 
 
 if __name__ == '__main__':
-    sys.exit(main())                                                                            # Call the main function and exit with the returned status code.
+    args = get_args()                                                                           # Parse and retrieve command-line arguments.
+    sys.exit(main(args))                                                                        # Call the main function and exit with the returned status code.
@@ -4,7 +4,89 @@
 """
 Server script that compares the received number with the correct one.
 
-Usage: server.py
+Each client gets its own game from the 'GameFactory' object: a session with
+its own target number, served by a single default servant from a compact
+session store (see sessions.py). The sessions idle for longer than a timeout
+are evicted. The original 'NumberGuessingGame' object remains as a game
+shared by all its clients, which starts a new round after each win.
+
+The server also listens on UDP, so the requests without reply (quit) can be
+sent as datagrams.
+
+Besides the sentences of checkGuess, meant for people, the automated players
+can use evaluate, which returns a compact GuessResult (one byte on the wire),
+and checkGuesses, which evaluates a sequence of guesses in a single request.
+
+The target numbers are 64-bit: newGame draws them from --range and
+newGameInRange from the range chosen by the client. newTournament creates
+thousands (or millions) of games at once, drawn in a single vectorized call to
+a seeded generator (--seed) and kept in arrays indexed by the number of the
+game, so each guess is checked in constant time and a whole block of guesses
+in a single vectorized comparison. The tournaments idle for longer than the
+timeout are ended by the same thread that evicts the sessions, and the games
+of all of them are limited (--max-tournament-games).
+
+Usage: server.py [-h] [--port PORT] [--max-sessions MAX_SESSIONS] [--idle-timeout IDLE_TIMEOUT] [--range LOW HIGH] [--seed SEED]
+                 [--max-tournament-games MAX_TOURNAMENT_GAMES]
+                 [--endpoints ENDPOINTS [ENDPOINTS ...]] [--threads THREADS] [--max-threads MAX_THREADS] [--message-size-max MESSAGE_SIZE_MAX]
+                 [--tcp-buffer-size TCP_BUFFER_SIZE] [--compress] [--acm-timeout ACM_TIMEOUT] [--config CONFIG] [--ice-property KEY=VALUE]
+                 [--log-level {DEBUG,INFO,WARNING,ERROR,CRITICAL}] [--log-format {text,json}]
+                 [--log-sample LOG_SAMPLE] [--log-rate LOG_RATE] [--log-queue LOG_QUEUE] [--log-overflow {drop,block}]
+                 [--metrics-port METRICS_PORT] [--trace-slow TRACE_SLOW]
+                 [--max-inflight MAX_INFLIGHT] [--operation-limit OPERATION=N] [--rate-limit RATE_LIMIT] [--burst BURST]
+
+Guessing game server script.
+
+options:
+  -h, --help            show this help message and exit
+  --port PORT, -p PORT  Port number. Use port 10000 (default) onwards.
+  --max-sessions MAX_SESSIONS, -ms MAX_SESSIONS
+                        Maximum number of games at the same time (default: 100000).
+  --idle-timeout IDLE_TIMEOUT, -it IDLE_TIMEOUT
+                        Seconds without guesses after which a game or a tournament is ended (default: 300).
+  --range LOW HIGH, -r LOW HIGH
+                        Range of the target numbers of newGame and the shared game, 64-bit (default: 1 100).
+  --seed SEED           Seed of the generator of the target numbers (default: random).
+  --max-tournament-games MAX_TOURNAMENT_GAMES, -mtg MAX_TOURNAMENT_GAMES
+                        Maximum number of tournament games at the same time (default: 1000000).
+  --endpoints ENDPOINTS [ENDPOINTS ...], -e ENDPOINTS [ENDPOINTS ...]
+                        Endpoints of the adapter, where {port} is the port number, e.g., "tcp -p {port}" "udp -p {port}" (default: "default -p {port}" "udp -p {port}").
+  --threads THREADS, -t THREADS
+                        Initial number of threads dispatching requests (default: 1).
+  --max-threads MAX_THREADS, -mt MAX_THREADS
+                        Maximum number of dispatch threads; the pool grows on demand up to it (default: --threads).
+  --message-size-max MESSAGE_SIZE_MAX
+                        Maximum size of a message in KiB. Use 0 for no limit (default: 1024).
+  --tcp-buffer-size TCP_BUFFER_SIZE
+                        Size in bytes of the TCP receive and send buffers (default: system).
+  --compress            Publish the endpoints with compression, so the proxies created by the server compress.
+  --acm-timeout ACM_TIMEOUT
+                        Seconds after which the idle connections are closed. Use 0 to keep them (default: 60).
+  --config CONFIG       Configuration file with Ice properties (disabled by default).
+  --ice-property KEY=VALUE
+                        Ice property, e.g., Ice.Trace.Network=1 (may be repeated).
+  --log-level {DEBUG,INFO,WARNING,ERROR,CRITICAL}, -l {DEBUG,INFO,WARNING,ERROR,CRITICAL}
+                        Logging level. Use DEBUG to trace every request (default: INFO).
+  --log-format {text,json}
+                        Format of the log records (default: text).
+  --log-sample LOG_SAMPLE
+                        Fraction of the records below WARNING that are kept (default: 1.0).
+  --log-rate LOG_RATE   Maximum records per second below WARNING. Use 0 (default) for no limit.
+  --log-queue LOG_QUEUE
+                        Maximum number of records waiting to be written (default: 10000).
+  --log-overflow {drop,block}
+                        What to do with a record when the queue is full: drop it (default) or wait for room.
+  --metrics-port METRICS_PORT
+                        Port of the local HTTP endpoint of the metrics. Use 0 (default) to disable it.
+  --trace-slow TRACE_SLOW
+                        Log the calls slower than the given milliseconds. Use 0 (default) to disable it.
+  --max-inflight MAX_INFLIGHT
+                        Maximum number of calls in progress at a time. Use 0 (default) for no limit.
+  --operation-limit OPERATION=N
+                        Maximum number of calls of an operation in progress at a time, e.g., applyBatch=4 (may be repeated).
+  --rate-limit RATE_LIMIT
+                        Maximum number of calls admitted per second. Use 0 (default) for no limit.
+  --burst BURST         Number of calls admitted at once above --rate-limit (default: one second of calls).
 
 Author: Andres J. Sanchez-Fernandez
 Email: sfandres@unex.es
@@ -16,57 +98,369 @@ Version: v1
 import sys, Ice                                                                                 # Import the sys and Ice libraries (Ice runtime).
 import NumberGuessingGame                                                                       # Import the NumberGuessingGame module (proxies and skeletons).
 import argparse                                                                                 # Import the argparse library for cmd arguments.
-import random                                                                                   # Import the random library for random number generation.
+import numpy as np                                                                              # Import the NumPy library for the generation and the tournaments.
+import os, logging, threading, time, uuid                                                       # Import the os, logging, threading, time and uuid libraries.
+from sessions import SessionStore                                                               # Import the store of the game sessions.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))         # Make the shared 'common' package (repository root) importable.
+from common import bootstrap, logger, metrics, admission                                        # Import the shared start-up, logging, metrics and admission control modules.
+
+log = logging.getLogger('NumberGuessingGame')                                                   # Logger used by the servant (configured in main).
+
+MESSAGES = {                                                                                    # Sentence of each result of a guess (checkGuess).
+    NumberGuessingGame.GuessResult.Higher: 'Your guess is HIGHER than the target number!',
+    NumberGuessingGame.GuessResult.Lower: 'Your guess is LOWER than the target number!',
+    NumberGuessingGame.GuessResult.Correct: 'Correct',
+}
+
+HIGHER, LOWER, CORRECT = (result.value for result in MESSAGES)                                  # Values of the packed results (checkGuesses of the tournaments).
+INT64 = (-2**63, 2**63 - 1)                                                                     # Limits of the target numbers.
+
+
+class TargetGenerator:
+    """
+    Class that draws the target numbers of the games from a seeded generator.
+
+    Attributes:
+        seed (int): Seed of the generator (None for a random one).
+
+    Methods:
+        draw (low, high, size): Returns a target number, or an array of them, from low to high (both included).
+    """
+    def __init__(self, seed: int = None):
+        self.seed = seed
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()                                                           # The generators are not thread-safe.
+
+    def draw(self, low: int, high: int, size: int = None):
+        """Returns a target number from low to high (both included), or an array of 'size' of them."""
+        if not INT64[0] <= low <= high <= INT64[1]:
+            raise ValueError(f'Invalid range of target numbers: {low} to {high}')
+        with self._lock:
+            targets = self._rng.integers(low, high, size=size, dtype=np.int64, endpoint=True)
+        return targets if size is not None else int(targets)
 
 
+def get_args() -> argparse.Namespace:
+    """
+    Parse and retrieve command-line arguments.
+
+    Returns:
+        An 'argparse.Namespace' object containing the parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description='Guessing game server script.')                # Parser creation and description.
+
+    parser.add_argument('--port', '-p', type=int, default=10000,                                # Options.
+                        help='Port number. Use port 10000 (default) onwards.')
+
+    parser.add_argument('--max-sessions', '-ms', type=int, default=100_000,
+                        help='Maximum number of games at the same time (default: 100000).')
+
+    parser.add_argument('--idle-timeout', '-it', type=float, default=300.0,
+                        help='Seconds without guesses after which a game or a tournament is ended (default: 300).')
+
+    parser.add_argument('--range', '-r', type=int, nargs=2, default=[1, 100], metavar=('LOW', 'HIGH'),
+                        help='Range of the target numbers of newGame and the shared game, 64-bit (default: 1 100).')
+
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the generator of the target numbers (default: random).')
+
+    parser.add_argument('--max-tournament-games', '-mtg', type=int, default=1_000_000,
+                        help='Maximum number of tournament games at the same time (default: 1000000).')
+
+    bootstrap.add_ice_args(parser, endpoints=('default -p {port}', 'udp -p {port}'))            # Listen on TCP and UDP (datagrams).
+    logger.add_logging_args(parser)
+    metrics.add_metrics_args(parser)
+    admission.add_admission_args(parser)
+
+    return parser.parse_args(sys.argv[1:])                                                      # Parse and return the arguments.
+
+
+@metrics.instrument
+@admission.limited(NumberGuessingGame.Overloaded, exempt=('quit',))
 class GameI(NumberGuessingGame.Game):
     """
     Class that implements the 'Game' interface.
     This class inherits from the 'Game' class in the 'NumberGuessingGame' module.
+    It is the default servant of every game: the session is taken from the
+    name of the identity that each request is sent to.
+
+    Attributes:
+        sessions (SessionStore): The sessions of the games.
+        generator (TargetGenerator): Generator of the target numbers.
+        low (int): Lowest target number of the shared game.
+        high (int): Highest target number of the shared game.
+        shared (str): Session of the shared 'NumberGuessingGame' object.
 
     Methods:
         checkGuess: Method that compares the received number with the correct one.
+        evaluate: Method that compares the received number with the correct one and returns a 'GuessResult'.
+        checkGuesses: Method that compares several numbers in order with the correct one.
+        quit: Method that ends the game.
     """
-    def __init__(self):
-        self.target_number = random.randint(1, 100)
-        # print(self.target_number)
+    def __init__(self, sessions: SessionStore, generator: TargetGenerator, low: int = 1, high: int = 100):
+        self.sessions = sessions
+        self.generator = generator
+        self.low = low
+        self.high = high
+        self.shared = sessions.open(generator.draw(low, high), pinned=True)
+
+    def _session(self, current) -> str:
+        """Returns the session of the game that the request is sent to."""
+        return current.id.name if current.id.category else self.shared
+
+    def _evaluate(self, session: str, guess: int):
+        """Compares a guess with the target number of a session and returns its 'GuessResult'."""
+        log.debug('Guess received: %s', guess)
+        state = self.sessions.guess(session)
+        if state is None:                                                                       # The game has ended or has been evicted.
+            raise Ice.ObjectNotExistException()
+        target_number, attempts = state
+
+        if guess > target_number:                                                               # Check if the guess is higher than the target number.
+            return NumberGuessingGame.GuessResult.Higher
+        elif guess < target_number:                                                             # Check if the guess is lower than the target number.   
+            return NumberGuessingGame.GuessResult.Lower
+        else:                                                                                   # The guess is correct.
+            log.info('You won! The correct number was %s indeed (%d attempts).', target_number, attempts)
+            if session == self.shared:                                                          # The shared game starts a new round,
+                self.sessions.restart(session, self.generator.draw(self.low, self.high))
+            else:                                                                               # while a client's own game ends.
+                self.sessions.close(session)
+            return NumberGuessingGame.GuessResult.Correct
 
     def checkGuess(self, guess, current=None):
         """Method that compares the received number with the correct one."""
-        if guess > self.target_number:                                                          # Check if the guess is higher than the target number.
-            return 'Your guess is HIGHER than the target number!'
-        elif guess < self.target_number:                                                        # Check if the guess is lower than the target number.   
-            return 'Your guess is LOWER than the target number!'
-        else:                                                                                   # The guess is correct.
-            print(f'You won! The correct number was {self.target_number} indeed.')
-            return 'Correct'
+        return MESSAGES[self._evaluate(self._session(current), guess)]
+
+    def evaluate(self, guess, current=None):
+        """Method that compares the received number with the correct one and returns a 'GuessResult'."""
+        return self._evaluate(self._session(current), guess)
+
+    def checkGuesses(self, guesses, current=None):
+        """Method that compares several numbers in order with the correct one, up to the first correct one."""
+        session = self._session(current)
+        results = []
+        for guess in guesses:
+            results.append(self._evaluate(session, guess))
+            if results[-1] == NumberGuessingGame.GuessResult.Correct:                           # The game has ended (or a new round has started).
+                break
+        return results
+
+    def quit(self, current=None):
+        """Method that ends the game."""
+        session = self._session(current)
+        if session != self.shared:
+            self.sessions.close(session)
+
+
+@metrics.instrument
+@admission.limited(NumberGuessingGame.Overloaded, exempt=('quit',))
+class TournamentI(NumberGuessingGame.Tournament):
+    """
+    Class that implements the 'Tournament' interface: a block of games played at once.
+
+    The games are numbered from 0 and their state is kept in arrays indexed by
+    that number, so a block of guesses for consecutive games is checked with a
+    single vectorized comparison. A solved game keeps its target number, so
+    guessing it again is still correct. The tournament lasts until it is quit
+    or stays idle for longer than the timeout (see SessionFactoryI.evict).
+
+    Attributes:
+        targets (np.ndarray): Target number of each game.
+        attempts (np.ndarray): Number of guesses made in each game.
+        solved (np.ndarray): Whether each game has been solved.
+        remaining (int): Number of games not solved yet.
+        adapter (Ice.ObjectAdapter): Adapter of the tournament.
+        identity (Ice.Identity): Identity of the tournament in the adapter.
+        release: Function called with the number of games and the identity when the tournament ends.
+        seen (float): Time (monotonic) of the last call to the tournament.
+
+    Methods:
+        size: Method that returns the number of games.
+        checkGuesses (first, guesses): Method that checks a guess for each game from the first one.
+        quit: Method that ends the tournament.
+        end: Removes the tournament from the adapter and frees its games.
+    """
+    def __init__(self, targets: np.ndarray, adapter: Ice.ObjectAdapter, identity: Ice.Identity, release):
+        self.targets = targets
+        self.attempts = np.zeros(len(targets), dtype=np.uint32)
+        self.solved = np.zeros(len(targets), dtype=bool)
+        self.remaining = len(targets)
+        self.adapter = adapter
+        self.identity = identity
+        self.release = release
+        self.seen = time.monotonic()
+        self._lock = threading.Lock()
+
+    def size(self, current=None):
+        """Method that returns the number of games."""
+        self.seen = time.monotonic()
+        return len(self.targets)
+
+    def checkGuesses(self, first, guesses, current=None):
+        """Method that checks the guesses for the games first, first + 1, ..., and returns the packed results."""
+        self.seen = time.monotonic()
+        targets = self.targets                                                                  # Read once: end() may drop the arrays meanwhile.
+        if not len(targets):                                                                    # Ended (a tournament has at least one game).
+            raise Ice.ObjectNotExistException()
+        last = first + len(guesses)
+        if first < 0 or last > len(targets):
+            raise NumberGuessingGame.GameUnavailable(f'Games {first} to {last - 1} out of range')
+
+        guesses = np.asarray(guesses, dtype=np.int64)
+        targets = targets[first:last]
+        results = np.full(len(guesses), CORRECT, dtype=np.uint8)                                # Packed: the value of the 'GuessResult' of each guess.
+        results[guesses > targets] = HIGHER
+        results[guesses < targets] = LOWER
 
+        with self._lock:
+            if last > len(self.solved):                                                         # Ended meanwhile (its arrays were dropped).
+                raise Ice.ObjectNotExistException()
+            self.attempts[first:last] += 1
+            won = (guesses == targets) & ~self.solved[first:last]
+            self.solved[first:last] |= won
+            self.remaining -= int(np.count_nonzero(won))
+            if won.any() and not self.remaining:
+                log.info('Tournament of %d games solved (%d attempts)', len(self.targets), int(self.attempts.sum()))
+        return results
 
-def main() -> bool:
+    def quit(self, current=None):
+        """Method that ends the tournament."""
+        self.end()
+
+    def end(self) -> bool:
+        """Removes the tournament from the adapter and frees its games. Returns whether it was in progress."""
+        try:
+            self.adapter.remove(self.identity)
+        except (Ice.NotRegisteredException, Ice.ObjectAdapterDeactivatedException):             # Already ended, or the server is shutting down.
+            return False
+        games = len(self.targets)
+        with self._lock:                                                                        # Drop the arrays: the calls still in progress see
+            self.targets = np.empty(0, dtype=np.int64)                                          # an empty tournament.
+            self.attempts = np.empty(0, dtype=np.uint32)
+            self.solved = np.empty(0, dtype=bool)
+        self.release(games, self.identity)
+        return True
+
+
+@metrics.instrument
+@admission.limited(NumberGuessingGame.Overloaded)
+class SessionFactoryI(NumberGuessingGame.SessionFactory):
+    """
+    Class that implements the 'SessionFactory' interface.
+    This class inherits from the 'SessionFactory' class in the 'NumberGuessingGame' module.
+
+    Attributes:
+        sessions (SessionStore): The sessions of the games.
+        generator (TargetGenerator): Generator of the target numbers.
+        low (int): Lowest target number of newGame.
+        high (int): Highest target number of newGame.
+        max_tournament_games (int): Maximum number of tournament games at the same time.
+        tournament_games (int): Number of tournament games in progress.
+        tournaments (dict): Tournaments in progress, by the name of their identity.
+
+    Methods:
+        newGame: Method that starts a game for the client and returns its proxy.
+        newGameInRange (low, high): Method that starts a game with a target number from low to high.
+        newTournament (games, low, high): Method that starts a block of games and returns its proxy.
+        evict: Ends the tournaments idle for longer than the timeout of the sessions.
+    """
+    def __init__(self, sessions: SessionStore, generator: TargetGenerator, low: int = 1, high: int = 100,
+                 max_tournament_games: int = 1_000_000):
+        self.sessions = sessions
+        self.generator = generator
+        self.low = low
+        self.high = high
+        self.max_tournament_games = max_tournament_games
+        self.tournament_games = 0
+        self.tournaments = {}
+        self._lock = threading.Lock()
+
+    def newGame(self, current=None):
+        """Method that starts a game for the client and returns its proxy."""
+        return self.newGameInRange(self.low, self.high, current)
+
+    def newGameInRange(self, low, high, current=None):
+        """Method that starts a game with a target number from low to high (both included) and returns its proxy."""
+        try:
+            session = self.sessions.open(self.generator.draw(low, high))
+        except ValueError as ex:
+            raise NumberGuessingGame.GameUnavailable(str(ex))
+        log.debug('Game %s started (%d games in progress)', session, len(self.sessions))
+        return NumberGuessingGame.GamePrx.uncheckedCast(current.adapter.createProxy(Ice.Identity(session, 'game')))
+
+    def newTournament(self, games, low, high, current=None):
+        """Method that starts a block of games with target numbers from low to high and returns its proxy."""
+        with self._lock:
+            if games <= 0 or self.tournament_games + games > self.max_tournament_games:
+                raise NumberGuessingGame.GameUnavailable('Maximum number of tournament games reached')
+            self.tournament_games += games
+        try:
+            targets = self.generator.draw(low, high, size=games)                                # A single vectorized draw.
+        except ValueError as ex:
+            self._release(games)
+            raise NumberGuessingGame.GameUnavailable(str(ex))
+        identity = Ice.Identity(str(uuid.uuid4()), 'tournament')
+        tournament = TournamentI(targets, current.adapter, identity, self._release)
+        with self._lock:
+            self.tournaments[identity.name] = tournament
+        log.info('Tournament of %d games started (%d tournament games in progress)', games, self.tournament_games)
+        proxy = current.adapter.add(tournament, identity)
+        return NumberGuessingGame.TournamentPrx.uncheckedCast(proxy)
+
+    def _release(self, games: int, identity: Ice.Identity = None) -> None:
+        """Frees the room of the games of a tournament (and forgets it, once ended)."""
+        with self._lock:
+            self.tournament_games -= games
+            if identity is not None:
+                self.tournaments.pop(identity.name, None)
+
+    def evict(self) -> int:
+        """Ends the tournaments idle for longer than the timeout of the sessions and returns how many were ended."""
+        cutoff = time.monotonic() - self.sessions.idle_timeout
+        with self._lock:
+            idle = [tournament for tournament in self.tournaments.values() if tournament.seen < cutoff]
+        evicted = sum(tournament.end() for tournament in idle)
+        if evicted:
+            log.info('%d idle tournaments ended (%d tournament games in progress)', evicted, self.tournament_games)
+        return evicted
+
+
+def main(args: argparse.Namespace) -> bool:
     """
     Main function.
+
+    Args:
+        args: An 'argparse.Namespace' object containing the parsed arguments.
     
     Returns:
         A boolean indicating the success of the process.
     """
-    port = 10000                                                                                # Set the default port number.
-    print(f'Listening port: {port}')                                                            # Print the port number.
-
-    with Ice.initialize(sys.argv) as communicator:                                              # Initialize the Ice run time and create a communicator.
+    logger.setup_logging(args, 'NumberGuessingGame')                                            # Start the asynchronous logging.
+    metrics.setup_metrics(args)                                                                 # Start the dispatch metrics.
+    admission.setup_admission(args)                                                             # Set the limits of the admission control.
 
-        adapter = communicator.createObjectAdapterWithEndpoints(                                # Create an object adapter with the name 'NumberGuessingGame' and an
-            'NumberGuessingGameAdapter', f'default -p {port}'                                   # endpoint with the default protocol and the specified port number.
-        )
+    sessions = SessionStore(args.max_sessions, args.idle_timeout)                               # Create the store of the sessions and start
+    sessions.start()                                                                            # evicting the idle ones.
 
-        servant = GameI()                                                                       # Create an instance of the 'GameI' class.
+    with bootstrap.serve(args, 'NumberGuessingGameAdapter') as adapter:                         # Create the communicator and an object adapter with the name 'NumberGuessingGameAdapter'
+                                                                                                # and the given endpoints, which is activated at the end of the block.
+        low, high = args.range
+        generator = TargetGenerator(args.seed)                                                  # Seeded generator of the target numbers.
+        servant = GameI(sessions, generator, low, high)                                         # Create an instance of the 'GameI' class.
+        factory = SessionFactoryI(sessions, generator, low, high, args.max_tournament_games)
 
-        proxy = adapter.add(servant, communicator.stringToIdentity('NumberGuessingGame'))       # Add the 'servant' instance to the adapter with the identity 'NumberGuessingGame'.
+        adapter.addDefaultServant(servant, 'game')                                              # Serve every 'game/<session>' identity with the 'servant'.
+        proxy = adapter.add(servant, Ice.stringToIdentity('NumberGuessingGame'))                # Add the 'servant' instance to the adapter with the identity 'NumberGuessingGame'.
+        adapter.add(factory, Ice.stringToIdentity('GameFactory'))
+        sessions.add_reaper(factory.evict)                                                      # End the idle tournaments along with the idle sessions.
 
-        adapter.activate()                                                                      # Activate the adapter to make the servant available for incoming requests.
-        communicator.waitForShutdown()                                                          # Wait for the communicator to be destroyed.
+    sessions.stop()                                                                             # The server has been shut down.
 
     return 0
 
 
 if __name__ == '__main__':
-    sys.exit(main())                                                                            # Call the main function and exit with the returned status code.
+    args = get_args()                                                                           # Parse and retrieve command-line arguments.
+    sys.exit(main(args))                                                                        # Call the main function and exit with the returned status code.
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compact store of the guessing game sessions.
+
+Each session takes a slot of a few preallocated arrays (its token, target
+number, attempts and last activity), so the memory used is fixed when the
+server starts, whatever the number of sessions: about 26 bytes per slot. The
+session id, '<slot>-<token>' in hexadecimal, locates the slot without any
+lookup table, and the random token keeps a stale or forged id from reaching
+a session that now uses the same slot. The sessions that stay idle longer
+than a timeout are evicted by a background thread, which can also run other
+reapers of idle objects (e.g., the tournaments).
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import array, random, threading, time                                                           # Import the array, random, threading and time libraries.
+
+
+class SessionStore:
+    """
+    Class that stores the sessions of the game in arrays indexed by slot.
+
+    Attributes:
+        capacity (int): Maximum number of sessions at the same time.
+        idle_timeout (float): Seconds of inactivity after which a session is evicted.
+        tokens (array.array): Random token of the session of each slot (0 if the slot is free).
+        targets (array.array): Target number of each session (64-bit).
+        attempts (array.array): Number of guesses made in each session.
+        seen (array.array): Time (monotonic) of the last activity of each session.
+
+    Methods:
+        open (target, pinned): Starts a session and returns its id.
+        guess (session_id): Counts a guess and returns the target number and the attempts.
+        restart (session_id, target): Starts a new round of a session.
+        close (session_id): Ends a session.
+        evict: Ends the sessions that have been idle for too long.
+        add_reaper (function): Adds a function run by the eviction thread after each scan.
+        start / stop: Start and stop the eviction thread.
+    """
+    def __init__(self, capacity: int = 100_000, idle_timeout: float = 300.0):
+        """Constructor of the class, which allocates every slot."""
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.tokens = array.array('I', bytes(4 * capacity))
+        self.targets = array.array('q', bytes(8 * capacity))
+        self.attempts = array.array('H', bytes(2 * capacity))
+        self.seen = array.array('d', bytes(8 * capacity))
+        self._free = array.array('I', range(capacity - 1, -1, -1))                              # Stack of free slots (the lowest ones on top).
+        self._pinned = set()                                                                    # Slots that are never evicted.
+        self._reapers = []                                                                      # Functions run after each scan.
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._evictor = threading.Thread(target=self._run, name='SessionEvictor', daemon=True)
+
+    def __len__(self):
+        return self.capacity - len(self._free)
+
+    def _slot(self, session_id: str) -> int:
+        """Returns the slot of a session (None if the id is not valid or the session has ended)."""
+        slot, _, token = session_id.partition('-')
+        try:
+            slot, token = int(slot, 16), int(token, 16)
+        except ValueError:
+            return None
+        if 0 <= slot < self.capacity and token and self.tokens[slot] == token:
+            return slot
+        return None
+
+    def open(self, target: int, pinned: bool = False) -> str:
+        """Starts a session with the given target number and returns its id."""
+        with self._lock:
+            if not self._free:
+                raise ValueError('Maximum number of sessions reached')
+            slot = self._free.pop()
+            token = random.randint(1, 0xFFFFFFFF)
+            self.tokens[slot] = token
+            self.targets[slot] = target
+            self.attempts[slot] = 0
+            self.seen[slot] = time.monotonic()
+            if pinned:
+                self._pinned.add(slot)
+        return f'{slot:x}-{token:08x}'
+
+    def guess(self, session_id: str):
+        """Counts a guess of a session and returns its target number and attempts (None if it has ended)."""
+        with self._lock:
+            slot = self._slot(session_id)
+            if slot is None:
+                return None
+            self.attempts[slot] = min(self.attempts[slot] + 1, 0xFFFF)
+            self.seen[slot] = time.monotonic()
+            return self.targets[slot], self.attempts[slot]
+
+    def restart(self, session_id: str, target: int) -> None:
+        """Starts a new round of a session with a new target number."""
+        with self._lock:
+            slot = self._slot(session_id)
+            if slot is not None:
+                self.targets[slot] = target
+                self.attempts[slot] = 0
+
+    def close(self, session_id: str) -> bool:
+        """Ends a session and frees its slot. Returns whether the session existed."""
+        with self._lock:
+            slot = self._slot(session_id)
+            if slot is None:
+                return False
+            self._release(slot)
+            return True
+
+    def _release(self, slot: int) -> None:
+        """Frees a slot (with the lock held)."""
+        self.tokens[slot] = 0
+        self._pinned.discard(slot)
+        self._free.append(slot)
+
+    def evict(self, step: int = 4096) -> int:
+        """Ends the sessions idle for longer than the timeout and returns how many were evicted."""
+        evicted = 0
+        for first in range(0, self.capacity, step):                                             # Scan the slots in steps, releasing the lock
+            with self._lock:                                                                    # in between so that the guesses are not delayed.
+                cutoff = time.monotonic() - self.idle_timeout
+                for slot in range(first, min(first + step, self.capacity)):
+                    if self.tokens[slot] and self.seen[slot] < cutoff and slot not in self._pinned:
+                        self._release(slot)
+                        evicted += 1
+        return evicted
+
+    def add_reaper(self, function) -> None:
+        """Adds a function run by the eviction thread after each scan, e.g., to end other idle objects."""
+        self._reapers.append(function)
+
+    def start(self) -> None:
+        """Starts the eviction thread."""
+        self._evictor.start()
+
+    def stop(self) -> None:
+        """Stops the eviction thread."""
+        self._stop.set()
+
+    def _run(self) -> None:
+        """Evicts the idle sessions periodically (four times per timeout)."""
+        while not self._stop.wait(max(self.idle_timeout / 4, 1.0)):
+            self.evict()
+            for reaper in self._reapers:
+                reaper()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark script that starts the servers on the loopback interface and
+measures their throughput and latency under a configurable load.
+
+For each service, the server script is started in its folder (its Slice
+definition is compiled with slice2py first, if needed) and driven by
+CONCURRENCY closed-loop callers, which send asynchronous invocations (AMI)
+from an asyncio loop: each caller sends a request, waits for its reply and
+sends the next one. The operations are picked at random following the
+request mix, and PAYLOAD sets the size of the data sent (characters printed,
+operands per batch or operations per bank batch). The requests sent during
+the warm-up are not measured.
+
+The results are printed (or written to a file) as JSON, with the requests per
+second and the 50th, 99th and 99.9th percentiles of the latency in
+microseconds. Given the results of a previous run, the script exits with an
+error if the throughput drops, or the 99th percentile grows, by more than the
+tolerance, so that it can catch regressions between versions of the servers.
+
+Usage: benchmark.py [-h] [--duration DURATION] [--warmup WARMUP] [--concurrency CONCURRENCY] [--payload PAYLOAD]
+                    [--mix MIX] [--port PORT] [--no-server] [--output OUTPUT] [--baseline BASELINE]
+                    [--tolerance TOLERANCE]
+                    [{printer,calculator,calculator-pro,bank,guessing-game} ...] [-- SERVER ARGS ...]
+
+Benchmark script.
+
+positional arguments:
+  {printer,calculator,calculator-pro,bank,guessing-game}
+                        Services to measure (default: all of them).
+
+options:
+  -h, --help            show this help message and exit
+  --duration DURATION, -d DURATION
+                        Seconds measured per service (default: 10).
+  --warmup WARMUP, -w WARMUP
+                        Seconds of warm-up per service, not measured (default: 2).
+  --concurrency CONCURRENCY, -c CONCURRENCY
+                        Number of requests in flight (default: 16).
+  --payload PAYLOAD, -pl PAYLOAD
+                        Size of the data of each request (default: 1).
+  --mix MIX, -m MIX     Request mix as 'operation=weight' pairs separated by commas (e.g., 'add=3,divide=1').
+                        Operations that a service does not offer are ignored (default: the basic ones, evenly).
+  --port PORT, -p PORT  Port of the servers (default: 10000).
+  --no-server           Measure the servers already running on the port instead of starting them.
+  --output OUTPUT, -o OUTPUT
+                        JSON file where the results are written (default: standard output).
+  --baseline BASELINE, -b BASELINE
+                        JSON file with previous results to compare with (disabled by default).
+  --tolerance TOLERANCE, -t TOLERANCE
+                        Relative loss of performance that is reported as a regression (default: 0.1).
+
+Example:
+  python3 benchmark.py calculator --payload 1000 --mix addBatch=1,computeBatch=1 -o after.json -b before.json
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import sys, os, time, json, random                                                              # Import the sys, os, time, json and random libraries.
+import subprocess, tempfile, importlib                                                          # Import the subprocess, tempfile and importlib libraries.
+import asyncio                                                                                  # Import the asyncio library for the event loop.
+import argparse                                                                                 # Import the argparse library for cmd arguments.
+import numpy as np                                                                              # Import the NumPy library for the percentiles and operands.
+import Ice                                                                                      # Import the Ice library (Ice runtime).
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))                                               # Repository root, where the service folders are.
+
+SERVICES = {                                                                                    # Folder and Slice definition (module) of each service.
+    'printer': ('P04_1_printer', 'Printer'),
+    'calculator': ('P04_2_basic_calculator', 'Calculator'),
+    'calculator-pro': ('P05_1_calculator_pro', 'CalculatorPro'),
+    'bank': ('P05_2_bank', 'Bank'),
+    'guessing-game': ('PE_1_guessing_game', 'NumberGuessingGame'),
+}
+
+ACCOUNTS = 1000                                                                                 # Number of bank accounts used by the benchmark.
+
+
+def get_args() -> argparse.Namespace:
+    """
+    Parse and retrieve command-line arguments.
+
+    Returns:
+        An 'argparse.Namespace' object containing the parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark script.')                           # Parser creation and description.
+
+    parser.add_argument('services', type=str, nargs='*', metavar=f"{{{','.join(SERVICES)}}}",   # Options.
+                        help='Services to measure (default: all of them).')
+
+    parser.add_argument('--duration', '-d', type=float, default=10.0,
+                        help='Seconds measured per service (default: 10).')
+
+    parser.add_argument('--warmup', '-w', type=float, default=2.0,
+                        help='Seconds of warm-up per service, not measured (default: 2).')
+
+    parser.add_argument('--concurrency', '-c', type=int, default=16,
+                        help='Number of requests in flight (default: 16).')
+
+    parser.add_argument('--payload', '-pl', type=int, default=1,
+                        help='Size of the data of each request (default: 1).')
+
+    parser.add_argument('--mix', '-m', type=str, default=None,
+                        help=("Request mix as 'operation=weight' pairs separated by commas (e.g., 'add=3,divide=1'). "
+                              'Operations that a service does not offer are ignored (default: the basic ones, evenly).'))
+
+    parser.add_argument('--port', '-p', type=int, default=10000,
+                        help='Port of the servers (default: 10000).')
+
+    parser.add_argument('--no-server', action='store_true',
+                        help='Measure the servers already running on the port instead of starting them.')
+
+    parser.add_argument('--output', '-o', type=str, default=None,
+                        help='JSON file where the results are written (default: standard output).')
+
+    parser.add_argument('--baseline', '-b', type=str, default=None,
+                        help='JSON file with previous results to compare with (disabled by default).')
+
+    parser.add_argument('--tolerance', '-t', type=float, default=0.1,
+                        help='Relative loss of performance that is reported as a regression (default: 0.1).')
+
+    argv = sys.argv[1:]                                                                         # The arguments after '--' are for the servers.
+    server_args = []
+    if '--' in argv:
+        server_args = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+
+    args = parser.parse_args(argv)                                                              # Parse and return the arguments.
+    for service in args.services:
+        if service not in SERVICES:
+            parser.error(f'invalid service: {service!r} (choose from {", ".join(SERVICES)})')
+    args.services = args.services or list(SERVICES)
+    args.server_args = server_args
+    return args
+
+
+def parse_mix(mix: str) -> dict:
+    """Converts a request mix such as 'add=3,divide=1' into a dictionary of weights."""
+    weights = {}
+    for item in filter(None, (mix or '').split(',')):
+        operation, _, weight = item.partition('=')
+        weights[operation.strip()] = float(weight or 1)
+    return weights
+
+
+def printer_operations(module, communicator, endpoint: str, payload: int):
+    """Returns the operations of the printer service and the ones measured by default."""
+    printer = module.OperationPrx.uncheckedCast(communicator.stringToProxy(f'SimplePrinter:{endpoint}'))
+    text = 'x' * payload
+    return {'printString': lambda: printer.printStringAsync(text)}, ['printString']
+
+
+def calculator_operations(module, communicator, endpoint: str, payload: int):
+    """Returns the operations of the basic calculator service and the ones measured by default."""
+    calculator = module.OperationsPrx.uncheckedCast(communicator.stringToProxy(f'BasicCalculator:{endpoint}'))
+    rng = np.random.default_rng()
+    a = rng.random(payload, dtype=np.float32)                                                   # Operands of the batch operations (b is never zero).
+    b = rng.random(payload, dtype=np.float32) + 1
+    ops = rng.integers(0, 4, payload, dtype=np.int8)
+    operations = {
+        'add': lambda: calculator.addAsync(2.5, 1.5),
+        'subtract': lambda: calculator.subtractAsync(2.5, 1.5),
+        'multiply': lambda: calculator.multiplyAsync(2.5, 1.5),
+        'divide': lambda: calculator.divideAsync(2.5, 1.5),
+        'addBatch': lambda: calculator.addBatchAsync(a, b),
+        'subtractBatch': lambda: calculator.subtractBatchAsync(a, b),
+        'multiplyBatch': lambda: calculator.multiplyBatchAsync(a, b),
+        'divideBatch': lambda: calculator.divideBatchAsync(a, b),
+        'computeBatch': lambda: calculator.computeBatchAsync(ops, a, b),
+    }
+    basic = ['add', 'subtract', 'multiply', 'divide']
+    return operations, basic if payload <= 1 else [f'{name}Batch' for name in basic]
+
+
+def calculator_pro_operations(module, communicator, endpoint: str, payload: int):
+    """Returns the operations of the pro calculator service and the ones measured by default."""
+    add_sub = module.OperationsPrx.uncheckedCast(communicator.stringToProxy(f'AddSub:{endpoint}'))
+    mul_div = module.OperationsPrx.uncheckedCast(communicator.stringToProxy(f'MulDiv:{endpoint}'))
+    operations = {
+        'add': lambda: add_sub.addAsync(2.5, 1.5),
+        'subtract': lambda: add_sub.subtractAsync(2.5, 1.5),
+        'multiply': lambda: mul_div.multiplyAsync(2.5, 1.5),
+        'divide': lambda: mul_div.divideAsync(2.5, 1.5),
+    }
+    return operations, list(operations)
+
+
+def bank_operations(module, communicator, endpoint: str, payload: int):
+    """Returns the operations of the bank service and the ones measured by default."""
+    ids = [f'bench-{i}' for i in range(ACCOUNTS)]
+    accounts = [module.AccountPrx.uncheckedCast(communicator.stringToProxy(f'Account/{i}:{endpoint}')) for i in ids]
+    teller = module.TellerPrx.uncheckedCast(communicator.stringToProxy(f'Teller:{endpoint}'))
+    teller.applyBatch([module.Tx(module.TxKind.Deposit, i, '', 1e9) for i in ids])             # Fund the accounts, so that no withdrawal is rejected.
+
+    def batch():
+        kinds = (module.TxKind.Deposit, module.TxKind.Withdraw, module.TxKind.Transfer)
+        return teller.applyBatchAsync([module.Tx(random.choice(kinds), random.choice(ids), random.choice(ids), 1.0)
+                                       for _ in range(payload)])
+
+    operations = {
+        'getBalance': lambda: random.choice(accounts).getBalanceAsync(),
+        'deposit': lambda: random.choice(accounts).depositAsync(1.0),
+        'withdraw': lambda: random.choice(accounts).withdrawAsync(1.0),
+        'transfer': lambda: teller.transferAsync(random.choice(ids), random.choice(ids), 1.0),
+        'applyBatch': batch,
+    }
+    basic = ['getBalance', 'deposit', 'withdraw', 'transfer']
+    return operations, basic if payload <= 1 else basic + ['applyBatch']
+
+
+def guessing_game_operations(module, communicator, endpoint: str, payload: int):
+    """Returns the operations of the guessing game service and the ones measured by default."""
+    game = module.GamePrx.uncheckedCast(communicator.stringToProxy(f'NumberGuessingGame:{endpoint}'))
+    return {'checkGuess': lambda: game.checkGuessAsync(random.randint(1, 100))}, ['checkGuess']
+
+
+OPERATIONS = {                                                                                  # Function that sets up the operations of each service.
+    'printer': printer_operations,
+    'calculator': calculator_operations,
+    'calculator-pro': calculator_pro_operations,
+    'bank': bank_operations,
+    'guessing-game': guessing_game_operations,
+}
+
+
+def load_module(service: str):
+    """Imports the Slice module of a service, compiling its definition with slice2py if needed."""
+    folder, module = SERVICES[service]
+    path = os.path.join(ROOT, folder)
+    if not os.path.isdir(os.path.join(path, module)):
+        subprocess.run(['slice2py', f'{module}.ice'], cwd=path, check=True)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(module)
+
+
+def start_server(service: str, port: int, server_args: list, data_dir: str) -> subprocess.Popen:
+    """Starts the server script of a service in its folder, without its terminal output."""
+    folder, _ = SERVICES[service]
+    args = ['--port', str(port), '--log-level', 'WARNING', *server_args]
+    if service == 'bank':
+        args += ['--data-dir', data_dir]                                                        # Every run starts with an empty bank.
+    return subprocess.Popen([sys.executable, 'server.py', *args], cwd=os.path.join(ROOT, folder),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(communicator, endpoint: str, server: subprocess.Popen, timeout: float = 10.0) -> None:
+    """Waits until the server accepts connections."""
+    proxy = communicator.stringToProxy(f'ready:{endpoint}').ice_timeout(500)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            proxy.ice_ping()
+        except Ice.ObjectNotExistException:                                                     # The server answered: it is ready.
+            return
+        except Ice.LocalException:
+            if (server and server.poll() is not None) or time.monotonic() > deadline:
+                raise RuntimeError(f'The server on {endpoint} did not start')
+            time.sleep(0.1)
+        else:
+            return
+
+
+async def drive(operations: dict, weights: dict, concurrency: int, warmup: float, duration: float):
+    """
+    Sends the requests from 'concurrency' closed-loop callers and measures them.
+
+    Returns:
+        The latencies (in seconds) of the measured requests, and the number of failed ones.
+    """
+    names, cum_weights = list(weights), np.cumsum(list(weights.values())).tolist()
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    measure_from, end = start + warmup, start + warmup + duration
+
+    async def caller():
+        nonlocal errors
+        while True:
+            operation = operations[random.choices(names, cum_weights=cum_weights)[0]]
+            sent = time.perf_counter()
+            if sent >= end:
+                return
+            try:
+                await Ice.wrap_future(operation())
+            except Ice.Exception:
+                if sent >= measure_from:
+                    errors += 1
+                continue
+            if sent >= measure_from:
+                latencies.append(time.perf_counter() - sent)
+
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def benchmark(service: str, communicator, args: argparse.Namespace) -> dict:
+    """Measures a service and returns its results."""
+    module = load_module(service)
+    endpoint = f'tcp -h 127.0.0.1 -p {args.port}'
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        server = None if args.no_server else start_server(service, args.port, args.server_args, data_dir)
+        try:
+            wait_ready(communicator, endpoint, server)
+            operations, basic = OPERATIONS[service](module, communicator, endpoint, args.payload)
+            weights = {name: weight for name, weight in parse_mix(args.mix).items() if name in operations}
+            weights = weights or {name: 1.0 for name in basic}
+            latencies, errors = asyncio.run(drive(operations, weights, args.concurrency,
+                                                  args.warmup, args.duration))
+        finally:
+            if server:
+                server.terminate()
+                try:
+                    server.wait(5)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+
+    latencies = np.array(latencies) * 1e6 if latencies else np.zeros(1)
+    p50, p99, p999 = np.percentile(latencies, [50, 99, 99.9])
+    return {
+        'service': service,
+        'mix': weights,
+        'payload': args.payload,
+        'concurrency': args.concurrency,
+        'duration_s': args.duration,
+        'requests': int(latencies.size),
+        'errors': errors,
+        'ops_per_s': round(latencies.size / args.duration, 1),
+        'latency_us': {
+            'mean': round(float(latencies.mean()), 1),
+            'p50': round(float(p50), 1),
+            'p99': round(float(p99), 1),
+            'p999': round(float(p999), 1),
+            'max': round(float(latencies.max()), 1),
+        },
+    }
+
+
+def regressions(results: list, baseline: list, tolerance: float) -> list:
+    """Returns the descriptions of the results that are worse than the baseline beyond the tolerance."""
+    previous = {result['service']: result for result in baseline}
+    found = []
+    for result in results:
+        before = previous.get(result['service'])
+        if before is None:
+            continue
+        if result['ops_per_s'] < before['ops_per_s'] * (1 - tolerance):
+            found.append(f"{result['service']}: {before['ops_per_s']} -> {result['ops_per_s']} requests/s")
+        if result['latency_us']['p99'] > before['latency_us']['p99'] * (1 + tolerance):
+            found.append(f"{result['service']}: p99 {before['latency_us']['p99']} -> {result['latency_us']['p99']} us")
+    return found
+
+
+def main(args: argparse.Namespace) -> bool:
+    """
+    Main function.
+
+    Args:
+        args: An 'argparse.Namespace' object containing the parsed arguments.
+
+    Returns:
+        A boolean indicating the success of the process.
+    """
+    init_data = Ice.InitializationData()                                                        # Let the replies of the batches be as large as the requests.
+    init_data.properties = Ice.createProperties()
+    init_data.properties.setProperty('Ice.MessageSizeMax', '0')
+
+    with Ice.initialize(init_data) as communicator:                                             # Initialize the Ice run time and create a communicator.
+        results = []
+        for service in args.services:
+            print(f'Measuring {service}...', file=sys.stderr)
+            results.append(benchmark(service, communicator, args))
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+    if args.baseline:                                                                           # Compare the results with the baseline, if given.
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for regression in found:
+            print(f'Regression: {regression}', file=sys.stderr)
+        if found:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    args = get_args()                                                                           # Parse and retrieve command-line arguments.
+    sys.exit(main(args))                                                                        # Call the main function and exit with the returned status code.
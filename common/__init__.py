@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared modules used by the client and server scripts of the examples.
+
+The scripts make the repository root importable before importing this package,
+so each example folder can still be run on its own (e.g., python3 server.py).
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+"""
+Admission control of the servant dispatch, shared by all the servers.
+
+A server that accepts every request keeps piling work up when it is
+overloaded: the asynchronous operations hold no dispatch thread while they
+wait (e.g., for the disk), so nothing stops the clients from sending more,
+and every request ends up waiting longer. With admission control, the
+requests beyond the limits are rejected at once with the 'Overloaded'
+exception of the Slice module, before any work is done, so the clients can
+back off or retry on another replica. The limits are:
+  * --max-inflight: calls in progress at a time in the whole server.
+  * --operation-limit OP=N: calls in progress at a time of an operation
+    (e.g., applyBatch=4), on top of the previous one.
+  * --rate-limit and --burst: calls admitted per second (token bucket).
+A call ends when its result is returned, or when the future or coroutine
+returned (asynchronous dispatch) completes. Without limits (the default), the
+check costs a single attribute lookup.
+
+Each module declares the exception, with the name of the operation and the
+number of calls of it rejected so far, and raises it from its operations
+(except those exempted, e.g., the ones that end a session and free its
+resources). The operations that may be called oneway or as datagrams cannot
+declare exceptions (Ice only sends those twoway), so their rejected calls are
+dropped instead, with no reply (e.g., printString):
+
+    exception Overloaded
+    {
+        string operation;
+        long rejected;
+    };
+
+The rejections are counted per operation, exposed as metrics and logged at
+most every REPORT_INTERVAL seconds.
+
+Usage (in a server script):
+    @metrics.instrument
+    @admission.limited(Calculator.Overloaded)
+    class OperationsI(Calculator.Operations): ...
+
+    @admission.limited(Bank.Overloaded, exempt=('shutdown',))
+    class AccountI(Bank.Account): ...
+
+    @admission.limited(Printer.Overloaded, drop=('printString',))
+    class OperationI(Printer.Operation): ...
+
+    admission.add_admission_args(parser)
+    admission.setup_admission(args)
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import time, functools, inspect, threading                                                      # Import the time, functools, inspect and threading libraries.
+import collections                                                                              # Import the collections library for the counters.
+import logging                                                                                  # Import the logging library to report the rejections.
+import argparse                                                                                 # Import the argparse library for cmd arguments.
+
+from . import metrics                                                                           # Import the shared metrics module.
+
+
+REPORT_INTERVAL = 10.0                                                                          # Minimum seconds between two reports of the rejections.
+
+log = logging.getLogger('admission')                                                            # Logger of the rejections.
+
+
+def add_admission_args(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the admission control options to a parser.
+
+    Args:
+        parser: The 'argparse.ArgumentParser' of the script.
+    """
+    parser.add_argument('--max-inflight', type=int, default=0,
+                        help='Maximum number of calls in progress at a time. Use 0 (default) for no limit.')
+
+    parser.add_argument('--operation-limit', type=str, action='append', default=[], metavar='OPERATION=N',
+                        help='Maximum number of calls of an operation in progress at a time, e.g., applyBatch=4 (may be repeated).')
+
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='Maximum number of calls admitted per second. Use 0 (default) for no limit.')
+
+    parser.add_argument('--burst', type=int, default=None,
+                        help='Number of calls admitted at once above --rate-limit (default: one second of calls).')
+
+
+class TokenBucket:
+    """
+    Class that admits calls at a given rate, with bursts.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        burst (int): Maximum number of tokens.
+        tokens (float): Tokens available.
+
+    Methods:
+        take: Takes a token if there is one.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._stamp = time.monotonic()
+
+    def take(self) -> bool:
+        """Takes a token, refilling the bucket first; returns False if it is empty (not thread-safe)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Controller:
+    """
+    Class that admits or rejects the calls of the process.
+
+    Attributes:
+        enabled (bool): Whether any limit is set.
+        max_inflight (int): Maximum number of calls in progress (0 for no limit).
+        limits (dict): Maximum number of calls in progress of each limited operation.
+        bucket: The 'TokenBucket' of the rate limit, or None.
+        inflight (int): Number of calls in progress.
+        rejected (collections.Counter): Number of rejected calls of each operation.
+
+    Methods:
+        configure (max_inflight, limits, rate, burst): Sets the limits.
+        admit (operation): Admits a call if it is within the limits.
+        release (operation): Ends an admitted call.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.max_inflight = 0
+        self.limits = {}
+        self.bucket = None
+        self.inflight = 0
+        self.rejected = collections.Counter()
+        self._operations = collections.Counter()                                                # Calls in progress of each limited operation.
+        self._reported = 0                                                                      # Rejections at the last report, and its time.
+        self._report_time = 0.0
+        self._lock = threading.Lock()
+
+    def configure(self, max_inflight: int = 0, limits: dict = None, rate: float = 0.0, burst: int = None) -> None:
+        """Sets the limits (0 or None for no limit)."""
+        self.max_inflight = max_inflight
+        self.limits = dict(limits or {})
+        self.bucket = TokenBucket(rate, burst or max(1, int(rate))) if rate > 0 else None
+        self.enabled = bool(max_inflight or self.limits or self.bucket)
+
+    def admit(self, operation: str) -> bool:
+        """Admits a call of an operation (which must be released) or counts it as rejected."""
+        with self._lock:
+            limit = self.limits.get(operation)
+            if ((not self.max_inflight or self.inflight < self.max_inflight)
+                    and (limit is None or self._operations[operation] < limit)
+                    and (self.bucket is None or self.bucket.take())):                           # The token is only taken if the call is admitted.
+                self.inflight += 1
+                if limit is not None:
+                    self._operations[operation] += 1
+                return True
+            self.rejected[operation] += 1
+        self._report()
+        return False
+
+    def release(self, operation: str) -> None:
+        """Ends an admitted call of an operation."""
+        with self._lock:
+            self.inflight -= 1
+            if operation in self.limits:
+                self._operations[operation] -= 1
+
+    def _report(self) -> None:
+        """Logs the rejections, at most every REPORT_INTERVAL seconds."""
+        now = time.monotonic()
+        if now - self._report_time < REPORT_INTERVAL:
+            return
+        with self._lock:
+            total = sum(self.rejected.values())
+            new, self._reported, self._report_time = total - self._reported, total, now
+            summary = ', '.join(f'{operation}: {count}' for operation, count in self.rejected.most_common())
+        log.warning('Overloaded: %d calls rejected since the last report (total %s)', new, summary)
+
+
+CONTROLLER = Controller()                                                                       # Admission control of the process.
+
+
+def _reject(operation: str, exception) -> None:
+    """Raises the 'Overloaded' exception of a rejected call (if None, the call is dropped)."""
+    if exception is not None:
+        raise exception(operation, CONTROLLER.rejected[operation])
+
+
+def _wrap(method, operation: str, exception):
+    """Returns the version of a servant method that is only called if admitted (rejected calls raise 'exception', or return None without it)."""
+    admit, release = CONTROLLER.admit, CONTROLLER.release
+
+    if inspect.iscoroutinefunction(method):                                                     # Asynchronous dispatch with a coroutine: the call
+        @functools.wraps(method)                                                                # ends when the coroutine returns.
+        async def wrapper(self, *args, **kwargs):
+            if not CONTROLLER.enabled:
+                return await method(self, *args, **kwargs)
+            if not admit(operation):
+                return _reject(operation, exception)
+            try:
+                return await method(self, *args, **kwargs)
+            finally:
+                release(operation)
+
+        return wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not CONTROLLER.enabled:
+            return method(self, *args, **kwargs)
+        if not admit(operation):
+            return _reject(operation, exception)
+        try:
+            result = method(self, *args, **kwargs)
+        except BaseException:
+            release(operation)
+            raise
+
+        if metrics._is_future(type(result)):                                                    # Asynchronous dispatch with a future: the call
+            result.add_done_callback(lambda future: release(operation))                         # ends when the future completes.
+        else:
+            release(operation)
+        return result
+
+    return wrapper
+
+
+def limited(exception, exempt: tuple = (), drop: tuple = ()):
+    """
+    Class decorator that applies the admission control to every Slice operation of a servant class.
+
+    Args:
+        exception: The 'Overloaded' exception of the Slice module, raised with the name of
+                   the operation and its number of rejected calls.
+        exempt: Operations that are never rejected (e.g., those that end a session and free its resources).
+        drop: Operations whose rejected calls are dropped instead of raising the exception
+              (those without exceptions, so that they can be called oneway or as datagrams).
+
+    Returns:
+        The decorator of the servant class.
+    """
+    def decorator(cls):
+        for name, method in list(vars(cls).items()):
+            if callable(method) and hasattr(cls, f'_op_{name}') and name not in exempt:         # The generated classes define '_op_<name>' for each operation.
+                setattr(cls, name, _wrap(method, name, None if name in drop else exception))
+        return cls
+
+    return decorator
+
+
+def setup_admission(args: argparse.Namespace) -> None:
+    """
+    Set the limits of the admission control and expose its metrics.
+
+    Args:
+        args: An 'argparse.Namespace' object containing the admission control options.
+    """
+    limits = {}
+    for limit in args.operation_limit:
+        operation, sep, value = limit.partition('=')
+        if not sep or not value.strip().isdigit():
+            raise ValueError(f'Invalid operation limit (expected OPERATION=N): {limit}')
+        limits[operation.strip()] = int(value)
+
+    CONTROLLER.configure(args.max_inflight, limits, args.rate_limit, args.burst)
+    metrics.REGISTRY.expose('ice_admission_inflight', lambda: CONTROLLER.inflight)
+    metrics.REGISTRY.expose('ice_admission_rejected_total', lambda: sum(CONTROLLER.rejected.values()), 'counter')
+    if CONTROLLER.enabled:
+        print(f'Admission control: max in flight {args.max_inflight or "unlimited"}, '
+              f'rate {args.rate_limit or "unlimited"}/s, operation limits {limits or "none"}')
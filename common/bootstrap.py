@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""
+Start-up of the Ice servers, shared by all the servers.
+
+Every server creates its communicator and object adapter in the same way, so
+all of them can be tuned with the same options: the endpoints of the adapter
+(e.g., TCP and UDP at the same time, so that oneway requests can be sent as
+datagrams), the size of the dispatch thread pool, the maximum message size,
+the TCP buffer sizes, compression and the timeout of the idle connections
+(ACM). Any other Ice property can be given with
+--ice-property or in a configuration file (--config), e.g.:
+
+    Ice.ThreadPool.Server.Size=4
+    Ice.TCP.RcvSize=1048576
+
+The options of the command line take precedence over the configuration file.
+SIGINT and SIGTERM shut the server down gracefully, so the code after the
+shutdown (e.g., writing a snapshot) always runs.
+
+Usage (in a server script):
+    bootstrap.add_ice_args(parser)
+
+    with bootstrap.serve(args, 'SimplePrinterAdapter') as adapter:
+        adapter.add(servant, Ice.stringToIdentity('SimplePrinter'))
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import contextlib, signal                                                                       # Import the contextlib and signal libraries.
+import argparse                                                                                 # Import the argparse library for cmd arguments.
+import Ice                                                                                      # Import the Ice library (Ice runtime).
+
+
+def add_ice_args(parser: argparse.ArgumentParser, endpoints: tuple = ('default -p {port}',)) -> None:
+    """
+    Add the Ice transport options to a parser.
+
+    Args:
+        parser: The 'argparse.ArgumentParser' of the script.
+        endpoints: Default endpoints of the adapter.
+    """
+    parser.add_argument('--endpoints', '-e', type=str, nargs='+', default=list(endpoints),
+                        help=('Endpoints of the adapter, where {port} is the port number, e.g., '
+                              '"tcp -p {port}" "udp -p {port}" (default: %s).' % ' '.join(f'"{e}"' for e in endpoints)))
+
+    parser.add_argument('--threads', '-t', type=int, default=None,
+                        help='Initial number of threads dispatching requests (default: 1).')
+
+    parser.add_argument('--max-threads', '-mt', type=int, default=None,
+                        help=('Maximum number of dispatch threads; the pool grows '
+                              'on demand up to it (default: --threads).'))
+
+    parser.add_argument('--message-size-max', type=int, default=None,
+                        help='Maximum size of a message in KiB. Use 0 for no limit (default: 1024).')
+
+    parser.add_argument('--tcp-buffer-size', type=int, default=None,
+                        help='Size in bytes of the TCP receive and send buffers (default: system).')
+
+    parser.add_argument('--compress', action='store_true',
+                        help='Publish the endpoints with compression, so the proxies created by the server compress.')
+
+    parser.add_argument('--acm-timeout', type=int, default=None,
+                        help='Seconds after which the idle connections are closed. Use 0 to keep them (default: 60).')
+
+    parser.add_argument('--config', type=str, default=None,
+                        help='Configuration file with Ice properties (disabled by default).')
+
+    parser.add_argument('--ice-property', type=str, action='append', default=[], metavar='KEY=VALUE',
+                        help='Ice property, e.g., Ice.Trace.Network=1 (may be repeated).')
+
+
+def properties(args: argparse.Namespace) -> Ice.Properties:
+    """
+    Build the Ice properties from the configuration file and the options.
+
+    Args:
+        args: An 'argparse.Namespace' object containing the parsed arguments.
+
+    Returns:
+        The 'Ice.Properties' of the communicator.
+    """
+    props = Ice.createProperties()
+    if args.config:
+        props.load(args.config)
+
+    if args.threads is not None:                                                                # Ice uses a single dispatch thread by default.
+        props.setProperty('Ice.ThreadPool.Server.Size', str(args.threads))
+    if args.threads is not None or args.max_threads is not None:
+        threads = props.getPropertyAsIntWithDefault('Ice.ThreadPool.Server.Size', 1)
+        props.setProperty('Ice.ThreadPool.Server.SizeMax', str(max(args.max_threads or threads, threads)))
+    if args.message_size_max is not None:
+        props.setProperty('Ice.MessageSizeMax', str(args.message_size_max))
+    if args.tcp_buffer_size is not None:
+        props.setProperty('Ice.TCP.RcvSize', str(args.tcp_buffer_size))
+        props.setProperty('Ice.TCP.SndSize', str(args.tcp_buffer_size))
+    if args.acm_timeout is not None:
+        props.setProperty('Ice.ACM.Server.Timeout', str(args.acm_timeout))
+
+    for prop in args.ice_property:
+        key, sep, value = prop.partition('=')
+        if not sep:
+            raise ValueError(f'Invalid Ice property (expected KEY=VALUE): {prop}')
+        props.setProperty(key.strip(), value.strip())
+    return props
+
+
+def endpoints(args: argparse.Namespace) -> str:
+    """Returns the endpoints of the adapter, separated by ':'."""
+    options = ' -z' if args.compress else ''
+    return ':'.join(endpoint.format(port=args.port) + options for endpoint in args.endpoints)
+
+
+@contextlib.contextmanager
+def serve(args: argparse.Namespace, name: str):
+    """
+    Run a server: the servants are added to the adapter in the body of the
+    with statement, then the adapter is activated and the statement ends
+    when the server is shut down (the communicator is destroyed).
+
+    Args:
+        args: An 'argparse.Namespace' object containing the parsed arguments.
+        name: Name of the object adapter.
+
+    Yields:
+        The 'Ice.ObjectAdapter' of the server.
+    """
+    init_data = Ice.InitializationData()
+    init_data.properties = properties(args)
+
+    with Ice.initialize(init_data) as communicator:                                             # Initialize the Ice run time and create a communicator.
+
+        for signum in (signal.SIGINT, signal.SIGTERM):                                          # Shut down gracefully on Ctrl+C and on termination.
+            signal.signal(signum, lambda signum, frame: communicator.shutdown())
+
+        adapter = communicator.createObjectAdapterWithEndpoints(name, endpoints(args))          # Create the object adapter with the given endpoints.
+        yield adapter                                                                           # Add the servants.
+
+        props = communicator.getProperties()
+        threads = props.getPropertyAsIntWithDefault('Ice.ThreadPool.Server.Size', 1)
+        print(f'Listening on: {endpoints(args)}')
+        print(f'Dispatch threads: {threads} '
+              f'(max: {props.getPropertyAsIntWithDefault("Ice.ThreadPool.Server.SizeMax", threads)})')
+
+        adapter.activate()                                                                      # Activate the adapter to make the servants available for incoming requests.
+        communicator.waitForShutdown()                                                          # Wait for the communicator to be shut down.
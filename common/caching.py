@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bounded cache of operation results, shared by the servers and the clients.
+
+The cache keeps the results of the most recently used keys (least recently
+used eviction) and counts its hits, misses and evictions. Operations that
+raise an exception of the given types are cached too, and a copy of the
+exception is raised again on every hit. Only cache the errors that are part
+of the result of an operation (the user exceptions declared in Slice, e.g.,
+a division by zero), never the unexpected ones. A cache with no capacity
+does not cache anything.
+
+The keys are built with 'key', which replaces the float arguments with their
+bit patterns: 0.0 and -0.0 are equal as floats (and have the same hash), but
+their results may differ (e.g., multiply(-0.0, 5) is -0.0), and a NaN is not
+even equal to itself, so it would never be found.
+
+Usage (in a server script):
+    servant = MulDivServerI(caching.LRUCache(10000, errors=(CalculatorPro.DivisionByZero,)))
+
+    class MulDivServerI(CalculatorPro.Operations):
+        def __init__(self, cache):
+            self.cache = cache
+
+        @caching.cached
+        def divide(self, a, b, current=None): ...
+
+Usage (in a client script):
+    results = caching.LRUCache(10000)
+    res = results.call(caching.key('add', a, b), server.add, a, b)
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import copy, functools, struct, threading                                                       # Import the copy, functools, struct and threading libraries.
+from collections import OrderedDict                                                             # Import the ordered dictionary that keeps the recency order.
+
+
+def key(operation: str, *args) -> tuple:
+    """Returns the cache key of a call: the operation and its arguments, with the floats as their bit patterns."""
+    return (operation, *(struct.pack('<d', arg) if isinstance(arg, float) else arg for arg in args))
+
+
+class LRUCache:
+    """
+    Class that caches the results of the most recently used keys.
+
+    Attributes:
+        capacity (int): Maximum number of results kept (0 disables the cache).
+        errors (tuple): Types of the exceptions that are cached (none by default; the others are just raised).
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that had to compute the result.
+        evictions (int): Number of results discarded to make room for new ones.
+
+    Methods:
+        get (key): Returns the cached outcome of a key (or None).
+        put (key, value, error): Caches the outcome of a key.
+        call (key, function, *args): Returns the cached outcome of a key, computing it on a miss.
+        stats: Returns the counters of the cache as a text.
+    """
+    def __init__(self, capacity: int = 10000, errors: tuple = ()):
+        self.capacity = capacity
+        self.errors = errors
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()                                                           # Maps each key to its (value, error) outcome.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cached (value, error) outcome of a key, or None if it is not cached."""
+        with self._lock:
+            outcome = self._entries.get(key)
+            if outcome is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)                                                      # Mark it as the most recently used.
+            self.hits += 1
+            return outcome
+
+    def put(self, key, value, error: BaseException = None) -> None:
+        """Caches the outcome of a key: its value, or the exception it raised."""
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, error)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)                                               # Discard the least recently used.
+                self.evictions += 1
+
+    def call(self, key, function, *args):
+        """Returns the cached outcome of a key, calling 'function(*args)' to compute it on a miss."""
+        if self.capacity <= 0:
+            return function(*args)
+
+        outcome = self.get(key)
+        if outcome is None:
+            try:
+                value = function(*args)
+            except self.errors as ex:
+                self.put(key, None, ex)
+                raise
+            self.put(key, value)
+            return value
+
+        value, error = outcome
+        if error is not None:
+            raise copy.copy(error).with_traceback(None)                                         # A new exception per hit: the cached one may be raised by other threads.
+        return value
+
+    def stats(self) -> str:
+        """Returns the counters of the cache as a text."""
+        lookups = self.hits + self.misses
+        ratio = self.hits / lookups if lookups else 0.0
+        return (f'{len(self)}/{self.capacity} results, {self.hits} hits, {self.misses} misses '
+                f'({ratio:.1%} hit ratio), {self.evictions} evictions')
+
+
+def cached(method):
+    """
+    Decorator that caches the results of a servant method in the 'cache' attribute of the servant.
+    The key is the name of the method and its arguments (except 'current'), built with 'key'.
+
+    Args:
+        method: The servant method, called as method(self, *args, current) by Ice.
+
+    Returns:
+        The method, looking up its results in the cache first.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        *params, current = args                                                                 # Ice passes the current object as the last argument.
+        return self.cache.call(key(name, *params), method, self, *args)
+
+    return wrapper
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+"""
+Asynchronous logging shared by all the servers.
+
+Servant methods only build a log record and put it on a bounded queue; a
+background thread formats the records and writes them to stdout. Records below
+WARNING can be sampled and rate limited, and they are dropped (and counted)
+instead of blocking when the queue is full, so the dispatch threads never wait
+for the terminal or the pipe. With --log-overflow block, the dispatch threads
+wait for room in the queue instead, so no record is lost and a flood of
+requests is slowed down to the pace of the writer (backpressure).
+
+Usage (in a server script):
+    logger.add_logging_args(parser)
+    log = logger.setup_logging(args, 'BasicCalculator')
+    log.debug('%s + %s = %s', a, b, res)
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import sys, time, json                                                                          # Import the sys, time and json libraries.
+import atexit, queue, random, threading                                                         # Import the libraries for the background writer.
+import logging, logging.handlers                                                                # Import the logging library and its queue handlers.
+import argparse                                                                                 # Import the argparse library for cmd arguments.
+
+
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')                                      # Accepted values of the --log-level option.
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'                                 # Format of the records written in text mode.
+RESERVED = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message'}         # Attributes that are not structured fields.
+
+
+def add_logging_args(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the logging options to a parser.
+
+    Args:
+        parser: The 'argparse.ArgumentParser' of the script.
+    """
+    parser.add_argument('--log-level', '-l', type=str.upper, choices=LEVELS, default='INFO',
+                        help='Logging level. Use DEBUG to trace every request (default: INFO).')
+
+    parser.add_argument('--log-format', type=str, choices=('text', 'json'), default='text',
+                        help='Format of the log records (default: text).')
+
+    parser.add_argument('--log-sample', type=float, default=1.0,
+                        help='Fraction of the records below WARNING that are kept (default: 1.0).')
+
+    parser.add_argument('--log-rate', type=int, default=0,
+                        help='Maximum records per second below WARNING. Use 0 (default) for no limit.')
+
+    parser.add_argument('--log-queue', type=int, default=10000,
+                        help='Maximum number of records waiting to be written (default: 10000).')
+
+    parser.add_argument('--log-overflow', type=str, choices=('drop', 'block'), default='drop',
+                        help='What to do with a record when the queue is full: drop it (default) or wait for room.')
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Filter that keeps a random fraction of the records below WARNING.
+
+    Attributes:
+        rate (float): Fraction of the records that are kept.
+        dropped (int): Number of records discarded so far.
+    """
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or random.random() < self.rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Filter that limits the records below WARNING with a token bucket.
+
+    Attributes:
+        rate (int): Records allowed per second (also the bucket capacity).
+        dropped (int): Number of records discarded so far.
+    """
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = rate
+        self.dropped = 0
+        self._tokens = float(rate)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            now = time.monotonic()                                                              # Refill the bucket with the tokens earned since
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)        # the last record, up to its capacity.
+            self._last = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            self.dropped += 1
+            return False
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks the calling (dispatch) thread,
+    unless it is asked to wait for room in a full queue.
+
+    Attributes:
+        block (bool): Whether to wait for room in a full queue instead of dropping the record.
+        dropped (int): Number of records discarded because the queue was full.
+    """
+    def __init__(self, records: queue.Queue, block: bool = False):
+        super().__init__(records)
+        self.block = block
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Hand the record over as is: it is formatted by the writer thread."""
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put(record, block=self.block)
+        except queue.Full:
+            self.dropped += 1
+
+
+class CoalescingStreamHandler(logging.StreamHandler):
+    """
+    Stream handler that only flushes once the queue has been drained,
+    so bursts of records are coalesced into a few large writes.
+    """
+    def __init__(self, stream, records: queue.Queue):
+        super().__init__(stream)
+        self.records = records
+
+    def flush(self):
+        if self.records.empty():
+            super().flush()
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """Queue listener that waits for room in a full queue to stop, so no pending record is lost."""
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatter that writes each record as a JSON line, including the 'extra' fields."""
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in RESERVED)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(args: argparse.Namespace, name: str) -> logging.Logger:
+    """
+    Configure the asynchronous logging from the parsed options and start the writer thread.
+    The writer is stopped (and the pending records flushed) when the interpreter exits.
+
+    Args:
+        args: An 'argparse.Namespace' object containing the logging options.
+        name: Name of the logger returned.
+
+    Returns:
+        The 'logging.Logger' with the given name.
+    """
+    records = queue.Queue(maxsize=args.log_queue)                                               # Bounded queue between the dispatch threads and the writer.
+
+    writer = CoalescingStreamHandler(sys.stdout, records)                                       # Handler run by the background writer thread.
+    writer.setFormatter(JsonFormatter() if args.log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    handler = AsyncQueueHandler(records, args.log_overflow == 'block')                          # Handler run by the calling threads: filters are applied
+    filters = []                                                                                # here so that discarded records never reach the queue.
+    if args.log_sample < 1.0:
+        filters.append(SamplingFilter(args.log_sample))
+    if args.log_rate > 0:
+        filters.append(RateLimitFilter(args.log_rate))
+    for log_filter in filters:
+        handler.addFilter(log_filter)
+
+    root = logging.getLogger()                                                                  # Route every logger of the process through the queue.
+    root.handlers[:] = [handler]
+    root.setLevel(args.log_level)
+
+    listener = DrainingQueueListener(records, writer)
+    listener.start()
+
+    def stop():
+        """Stop the writer thread and report the discarded records."""
+        listener.stop()
+        writer.flush()
+        dropped = handler.dropped + sum(log_filter.dropped for log_filter in filters)
+        if dropped:
+            print(f'Logging: {dropped} records discarded (sampling, rate limit or full queue)', file=sys.stderr)
+
+    atexit.register(stop)
+
+    return logging.getLogger(name)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+Large payloads: compression above a size threshold and zero-copy sequences, shared by the scripts.
+
+Compression. Ice compresses a request (and its reply) with bzip2 when it is
+sent through a compressed proxy (ice_compress) and is larger than 100 bytes.
+bzip2 costs far more CPU than sending the bytes over a fast network (a few
+MiB/s), so it only pays off for large and redundant payloads (e.g., texts) on
+slow links. The 'Compression' class sends the requests whose payload reaches
+--compress-threshold through the compressed proxy and the others through the
+plain one.
+
+Zero copy. By default, IcePy copies every received sequence of bytes into a
+new 'bytes' object. With the python:memoryview metadata and the 'view'
+factory below, a servant gets a view of the request instead, without any copy:
+
+    ["python:memoryview:common.payloads.view"] sequence<byte> ByteSeq;
+
+The view points into the received message, so it is only valid during the
+call: the servant must copy what it keeps (e.g., bytes(chunk)). For the same
+reason, it must not be used for sequences returned to a client. The sequences
+are sent without any copy either: IcePy marshals bytes, bytearray,
+array.array and NumPy arrays directly from their memory (but a memoryview
+element by element, so do not send one).
+
+Usage (in a client script):
+    payloads.add_compression_args(parser)
+    compression = payloads.Compression(server, args.compress_threshold)
+    compression.proxy(len(chunk)).append(offset, chunk)
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import argparse                                                                                 # Import the argparse library for cmd arguments.
+
+
+def add_compression_args(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the compression options to a parser.
+
+    Args:
+        parser: The 'argparse.ArgumentParser' of the script.
+    """
+    parser.add_argument('--compress-threshold', '-ct', type=int, default=0,
+                        help=('Compress the requests with a payload of at least the given bytes, e.g., 65536 '
+                              'for texts over a slow network. Use 0 (default) to never compress.'))
+
+
+class Compression:
+    """
+    Class that sends the large requests of a proxy compressed.
+
+    Attributes:
+        plain: The proxy without compression.
+        compressed: The same proxy with compression.
+        threshold (int): Payload size, in bytes, from which the requests are compressed (0 to never compress).
+
+    Methods:
+        proxy (size): Returns the proxy for a request with a payload of the given size.
+    """
+    def __init__(self, proxy, threshold: int = 0):
+        self.plain = proxy.ice_compress(False)
+        self.compressed = proxy.ice_compress(True)
+        self.threshold = threshold
+
+    def proxy(self, size: int):
+        """Returns the compressed proxy if the payload reaches the threshold, or the plain one otherwise."""
+        return self.compressed if 0 < self.threshold <= size else self.plain
+
+
+def view(memory: memoryview, kind: int, copy: bool) -> memoryview:
+    """Sequence factory that returns the received bytes as a memoryview, without copying them (valid during the call)."""
+    return memory
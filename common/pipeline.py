@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pipelined asynchronous invocations (AMI) driven by asyncio.
+
+Each call is started with the '<operation>Async' method of a proxy, which
+returns an 'Ice.Future' right away, and the future is wrapped into an asyncio
+one. Up to 'inflight' calls are pending at the same time, so the requests are
+pipelined over the connection instead of waiting for each reply in turn.
+
+'imap' does the same without asyncio for a stream of calls of any length:
+the calls are taken from an iterable only as the window has room for them,
+and their results are yielded in order, so the memory used is bounded.
+
+Usage (in a client script):
+    calls = [lambda: server.addAsync(a, b), lambda: server.subtractAsync(a, b)]
+    results = pipeline.run(calls, inflight=100)
+    for result in pipeline.imap(calls, inflight=100): ...
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import asyncio                                                                                  # Import the asyncio library for the event loop.
+import collections                                                                              # Import the collections library for the window of calls.
+import Ice                                                                                      # Import the Ice library (Ice runtime).
+
+
+async def invoke_all(calls: list, inflight: int = 100) -> list:
+    """
+    Start the given calls with at most 'inflight' of them pending at a time.
+
+    Args:
+        calls: Callables without arguments that start an invocation and return its 'Ice.Future'.
+        inflight: Maximum number of pending invocations.
+
+    Returns:
+        The results of the calls, in the same order. The first exception raised is propagated.
+    """
+    window = asyncio.Semaphore(max(inflight, 1))                                                # Limits the invocations in flight.
+
+    async def invoke(call):
+        async with window:
+            return await Ice.wrap_future(call())                                                # The reply completes the future from an Ice thread.
+
+    return await asyncio.gather(*(invoke(call) for call in calls))
+
+
+def run(calls: list, inflight: int = 100) -> list:
+    """
+    Run 'invoke_all' on a new event loop and return the results of the calls.
+
+    Args:
+        calls: Callables without arguments that start an invocation and return its 'Ice.Future'.
+        inflight: Maximum number of pending invocations.
+
+    Returns:
+        The results of the calls, in the same order.
+    """
+    return asyncio.run(invoke_all(calls, inflight))
+
+
+def _start(call) -> Ice.Future:
+    """Starts a call and returns its 'Ice.Future' (failed, if the call could not even be started)."""
+    try:
+        return call()
+    except Exception as ex:
+        future = Ice.Future()
+        future.set_exception(ex)
+        return future
+
+
+def _result(future: Ice.Future, return_exceptions: bool):
+    """Waits for a call and returns its result (or its exception, if 'return_exceptions')."""
+    if not return_exceptions:
+        return future.result()
+    try:
+        return future.result()
+    except Exception as ex:
+        return ex
+
+
+def imap(calls, inflight: int = 100, return_exceptions: bool = False):
+    """
+    Start the calls taken from an iterable (consumed lazily) with at most 'inflight'
+    of them pending at a time, and yield their results in the same order.
+
+    Args:
+        calls: Iterable of callables without arguments that start an invocation and return its 'Ice.Future'.
+        inflight: Maximum number of pending invocations.
+        return_exceptions: Yield the exception of a failed call as its result instead of raising it.
+
+    Yields:
+        The result of each call.
+    """
+    inflight = max(inflight, 1)
+    pending = collections.deque()                                                               # Calls started and not yet yielded, oldest first.
+    for call in calls:
+        if len(pending) >= inflight:
+            yield _result(pending.popleft(), return_exceptions)
+        pending.append(_start(call))
+    while pending:
+        yield _result(pending.popleft(), return_exceptions)
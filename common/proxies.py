@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+Long-lived communicator and pool of typed proxies, shared by the client scripts.
+
+Creating a communicator, connecting to the server and checking the type of
+the object (checkedCast, an extra ice_isA round trip) cost more than a call.
+The pool does it once per process: the communicator is created on first use
+and destroyed when the process exits, and each proxy is validated with
+checkedCast (which also establishes its connection) the first time it is
+requested. Later requests of the same proxy return it at once, as with an
+uncheckedCast, and its calls reuse the open connection. This way, a script
+that calls a client's main function in a loop pays the set-up costs only once.
+
+Usage (in a client script):
+    server = proxies.get(f'BasicCalculator:default -h {host} -p {port}', Calculator.OperationsPrx)
+    printer = proxies.get(f'SimplePrinter:udp -h {host} -p {port}', Printer.OperationPrx, validate=False)
+    communicator = proxies.communicator()
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import sys, atexit, threading                                                                   # Import the sys, atexit and threading libraries.
+import Ice                                                                                      # Import the Ice library (Ice runtime).
+
+
+class ProxyPool:
+    """
+    Class that keeps a communicator and the typed proxies created with it.
+
+    Attributes:
+        args (list): Command-line arguments given to the communicator (Ice properties).
+        validated (int): Number of proxies validated with a round trip.
+        reused (int): Number of proxies returned from the pool.
+
+    Methods:
+        communicator: Returns the communicator, creating it on first use.
+        get (proxy, cast, validate): Returns the typed proxy of an object.
+        discard (proxy): Removes the proxies of an object from the pool.
+        destroy: Destroys the communicator and empties the pool.
+    """
+    def __init__(self, args: list = None):
+        self.args = args
+        self.validated = 0
+        self.reused = 0
+        self._communicator = None
+        self._proxies = {}                                                                      # Maps each (proxy, cast) to the typed proxy.
+        self._lock = threading.Lock()
+
+    def communicator(self) -> Ice.Communicator:
+        """Returns the communicator of the pool, creating it on first use."""
+        with self._lock:
+            if self._communicator is None:
+                self._communicator = Ice.initialize(sys.argv if self.args is None else self.args)
+            return self._communicator
+
+    def get(self, proxy: str, cast, validate: bool = True):
+        """
+        Return the typed proxy of an object.
+
+        Args:
+            proxy: The stringified proxy (e.g., 'SimplePrinter:default -h localhost -p 10000').
+            cast: Proxy class of the object (e.g., Printer.OperationPrx).
+            validate: Check the type of the object (and connect) the first time with checkedCast.
+                      Otherwise the proxy is cast unchecked and connects on its first call
+                      (required for oneway and datagram proxies, which get no reply).
+
+        Returns:
+            The typed proxy.
+        """
+        key = (proxy, cast)
+        typed = self._proxies.get(key)                                                          # Fast path: no lock, no round trip.
+        if typed is not None:
+            self.reused += 1
+            return typed
+
+        base = self.communicator().stringToProxy(proxy)
+        if validate:
+            typed = cast.checkedCast(base)
+            if not typed:
+                raise RuntimeError('Invalid proxy')
+            self.validated += 1
+        else:
+            typed = cast.uncheckedCast(base)
+        with self._lock:
+            return self._proxies.setdefault(key, typed)
+
+    def discard(self, proxy: str) -> None:
+        """Removes the proxies of an object from the pool, so they are validated again."""
+        with self._lock:
+            for key in [key for key in self._proxies if key[0] == proxy]:
+                del self._proxies[key]
+
+    def destroy(self) -> None:
+        """Destroys the communicator (closing its connections) and empties the pool."""
+        with self._lock:
+            self._proxies.clear()
+            if self._communicator is not None:
+                self._communicator.destroy()
+                self._communicator = None
+
+
+POOL = ProxyPool()                                                                              # Pool shared by the whole process.
+atexit.register(POOL.destroy)
+
+
+def communicator() -> Ice.Communicator:
+    """Returns the communicator shared by the whole process."""
+    return POOL.communicator()
+
+
+def get(proxy: str, cast, validate: bool = True):
+    """Returns the typed proxy of an object from the pool shared by the whole process."""
+    return POOL.get(proxy, cast, validate)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+Replay of a stream of operations (e.g., a production trace), shared by the client scripts.
+
+Instead of asking for each value, a client can read its operations from a
+file or the standard input (--input). The operations are parsed one at a
+time as they are read and sent with at most --inflight of them pending (see
+'pipeline.imap'), so traces of millions of operations use little memory.
+Each client declares its operations and the types of their arguments:
+
+    OPERATIONS = {'add': (float, float), 'subtract': (float, float), ...}
+
+Three formats are accepted (--format, guessed from the file extension):
+  * csv: one operation per line, its name followed by its arguments
+    ('add,1.5,2'). Empty lines and lines starting with '#' are skipped.
+  * jsonl: one JSON value per line, either a list with the name and the
+    arguments (["add", 1.5, 2]) or an object ({"op": "add", "args": [1.5, 2]}).
+  * binary: one record per operation, its code (uint8, the position of the
+    operation in OPERATIONS) followed by its arguments, little endian: float
+    as float64, int as int64 and str as a uint16 length and the UTF-8 bytes.
+    Use 'write_binary' to convert a trace.
+
+The result of each operation (or 'error: <exception>') can be written to a
+file, one per line and in order (--output).
+
+Usage (in a client script):
+    replay.add_replay_args(parser)
+    if args.input:
+        return replay.replay(args, OPERATIONS, lambda op, *params: getattr(server, op + 'Async')(*params))
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import sys, os, io, csv, json, struct, time                                                     # Import the sys, os, io, csv, json, struct and time libraries.
+import argparse                                                                                 # Import the argparse library for cmd arguments.
+
+from . import pipeline                                                                          # Import the shared asynchronous invocation module.
+
+
+FORMATS = ('csv', 'jsonl', 'binary')
+
+EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl', '.bin': 'binary'}             # Format of each file extension (csv by default).
+
+FIELDS = {float: struct.Struct('<d'), int: struct.Struct('<q')}                                 # Binary encoding of the numeric arguments.
+LENGTH = struct.Struct('<H')                                                                    # Length prefix of the string arguments.
+
+
+def add_replay_args(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the replay options to a parser.
+
+    Args:
+        parser: The 'argparse.ArgumentParser' of the script.
+    """
+    parser.add_argument('--input', '-in', type=str, default=None,
+                        help='File of operations to send instead of asking for them. Use - for the standard input (disabled by default).')
+
+    parser.add_argument('--format', '-fmt', type=str, choices=FORMATS, default=None,
+                        help='Format of the operations (default: from the file extension, or csv).')
+
+    parser.add_argument('--output', '-out', type=str, default=None,
+                        help='File where the result of each operation is written. Use - for the standard output (disabled by default).')
+
+
+def read(stream, fmt: str, operations: dict):
+    """
+    Parse the operations of a stream one by one.
+
+    Args:
+        stream: Binary stream of the operations.
+        fmt: Format of the operations ('csv', 'jsonl' or 'binary').
+        operations: Types of the arguments of each operation, by name.
+
+    Yields:
+        A (name, arguments) tuple per operation.
+    """
+    if fmt == 'binary':
+        yield from _read_binary(stream, operations)
+        return
+
+    lines = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    records = csv.reader(lines) if fmt == 'csv' else (json.loads(line) if line.strip() else [] for line in lines)
+    for number, record in enumerate(records, 1):
+        if isinstance(record, dict):
+            record = [record.get('op'), *record.get('args', ())]
+        if not record or (fmt == 'csv' and record[0].lstrip().startswith('#')):
+            continue
+        name, *params = record
+        types = operations.get(name.strip() if isinstance(name, str) else name)
+        if types is None or len(params) != len(types):
+            raise ValueError(f'Line {number}: invalid operation {record}')
+        try:
+            yield name.strip(), tuple(kind(param.strip() if isinstance(param, str) else param)
+                                      for kind, param in zip(types, params))
+        except (TypeError, ValueError) as ex:
+            raise ValueError(f'Line {number}: invalid arguments {record} ({ex})')
+
+
+def _read_binary(stream, operations: dict):
+    """Parses the binary records of a stream (see the description of the module)."""
+    names = list(operations)
+    while True:
+        code = stream.read(1)
+        if not code:
+            return
+        if code[0] >= len(names):
+            raise ValueError(f'Invalid operation code {code[0]}')
+        name = names[code[0]]
+        params = []
+        for kind in operations[name]:
+            if kind is str:
+                size, = LENGTH.unpack(_read_exactly(stream, LENGTH.size))
+                params.append(_read_exactly(stream, size).decode('utf-8'))
+            else:
+                field = FIELDS[kind]
+                params.append(field.unpack(_read_exactly(stream, field.size))[0])
+        yield name, tuple(params)
+
+
+def _read_exactly(stream, size: int) -> bytes:
+    """Reads the given number of bytes from a stream (a truncated record is an error)."""
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError('Truncated binary record')
+    return data
+
+
+def write_binary(stream, records, operations: dict) -> None:
+    """
+    Write operations in the binary format.
+
+    Args:
+        stream: Binary stream where the records are written.
+        records: Iterable of (name, arguments) tuples (e.g., 'read' of a CSV file).
+        operations: Types of the arguments of each operation, by name.
+    """
+    codes = {name: code for code, name in enumerate(operations)}
+    for name, params in records:
+        record = bytearray((codes[name],))
+        for kind, param in zip(operations[name], params):
+            if kind is str:
+                data = param.encode('utf-8')
+                record += LENGTH.pack(len(data)) + data
+            else:
+                record += FIELDS[kind].pack(param)
+        stream.write(record)
+
+
+def replay(args: argparse.Namespace, operations: dict, begin, inflight: int = 100) -> int:
+    """
+    Send the operations of the --input file and report their results.
+
+    Args:
+        args: An 'argparse.Namespace' object containing the parsed arguments.
+        operations: Types of the arguments of each operation, by name.
+        begin: Callable that starts an operation, begin(name, *arguments), and returns its 'Ice.Future'.
+        inflight: Maximum number of operations pending at a time.
+
+    Returns:
+        The exit status: 0, or 1 if any operation failed.
+    """
+    fmt = args.format or EXTENSIONS.get(os.path.splitext(args.input)[1].lower(), 'csv')
+    source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb', buffering=1 << 20)
+    if args.output == '-':
+        sink = sys.stdout
+    else:
+        sink = open(args.output, 'w', encoding='utf-8', buffering=1 << 20) if args.output else None
+
+    count = errors = 0
+    start = time.perf_counter()
+    with source:
+        calls = ((lambda name=name, params=params: begin(name, *params))
+                 for name, params in read(source, fmt, operations))
+        for result in pipeline.imap(calls, inflight, return_exceptions=True):
+            count += 1
+            if isinstance(result, Exception):
+                errors += 1
+                result = f'error: {type(result).__name__}'
+            if sink:
+                sink.write(f'{result}\n')
+    elapsed = time.perf_counter() - start
+
+    if sink and sink is not sys.stdout:
+        sink.close()
+    print(f'{count} operations in {elapsed:.3f} s ({count / elapsed if elapsed else 0:.0f} operations/s), '
+          f'{errors} errors', file=sys.stderr if sink is sys.stdout else sys.stdout)
+    return 1 if errors else 0
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+"""
+Replica-aware pool of proxies that spreads the calls across several servers.
+
+Every replica is an endpoint serving the same object. The replicas are given
+as 'host:port' texts or taken from the endpoints of a proxy (for instance, the
+one printed by launcher.py for a group of workers). Each call goes to the
+replica with fewer outstanding requests among two picked at random (power of
+two choices) or among all of them (least outstanding requests). A replica whose
+connection fails is marked unhealthy and skipped for a while; after that it is
+tried again lazily, by the next call that picks it. Calls that fail to reach a
+replica are retried on another one.
+
+With a call policy (see common/resilience.py), each replica waits for its
+replies up to the deadline, the failed calls are retried as the policy allows
+(after a jittered backoff, on the replica picked then), and the idempotent
+calls without reply after the hedging delay are also sent to another replica,
+keeping the first reply.
+
+Usage (in a client script):
+    pool = replicas.ReplicaPool(communicator, 'AddSub', ['localhost:10000', 'localhost:10002'],
+                                CalculatorPro.OperationsPrx)
+    res = pool.invoke('add', a, b)
+    future = pool.begin('add', a, b)
+    pool = replicas.ReplicaPool.from_proxy(communicator, 'AddSub:default -p 10000:default -p 10001',
+                                           CalculatorPro.OperationsPrx)
+    pool = replicas.ReplicaPool(communicator, 'AddSub', endpoints, CalculatorPro.OperationsPrx,
+                                policy=resilience.CallPolicy(deadline=100, retries=2, hedge=20, idempotent=('add',)))
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import time, random, threading                                                                  # Import the time, random and threading libraries.
+import Ice                                                                                      # Import the Ice library (Ice runtime).
+
+from . import resilience                                                                        # Import the shared call policy module.
+
+
+STRATEGIES = ('p2c', 'least')                                                                   # Power of two choices and least outstanding requests.
+
+FAILURES = (Ice.ConnectFailedException, Ice.ConnectionLostException, Ice.TimeoutException,     # Exceptions meaning that the replica could not be reached
+            Ice.SocketException, Ice.DNSException)                                              # (errors raised by the operation itself are not retried).
+
+
+def parse_endpoint(endpoint, default_host: str = 'localhost') -> str:
+    """
+    Convert an endpoint given as 'host:port' (or just 'port') or as a (host, port)
+    tuple into an Ice endpoint. Ice endpoints (e.g., 'tcp -h host -p port') are kept.
+
+    Args:
+        endpoint: The endpoint text or tuple.
+        default_host: Host used when only the port is given.
+
+    Returns:
+        The Ice endpoint (e.g., 'default -h localhost -p 10000').
+    """
+    if isinstance(endpoint, str):
+        if ' ' in endpoint.strip():
+            return endpoint.strip()
+        host, _, port = endpoint.rpartition(':')
+    else:
+        host, port = endpoint
+    return f'default -h {host or default_host} -p {int(port)}'
+
+
+class Replica:
+    """
+    Class that holds the state of a replica.
+
+    Attributes:
+        endpoint (str): Ice endpoint of the replica.
+        proxy: The typed proxy of the replica (created on first use).
+        outstanding (int): Number of calls in progress.
+        failures (int): Number of consecutive failures.
+        down_until (float): Time (monotonic) until which the replica is skipped.
+    """
+    __slots__ = ('endpoint', 'proxy', 'outstanding', 'failures', 'down_until')
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.proxy = None
+        self.outstanding = 0
+        self.failures = 0
+        self.down_until = 0.0
+
+    def __repr__(self):
+        return self.endpoint
+
+
+class _Call:
+    """Class that holds the state of an asynchronous call: its future, its attempts in flight and its retries."""
+    __slots__ = ('future', 'operation', 'args', 'pending', 'retry', 'lock')
+
+    def __init__(self, operation: str, args: tuple):
+        self.future = Ice.Future()
+        self.operation = operation
+        self.args = args
+        self.pending = []                                                                       # Invocations in flight (more than one if hedged).
+        self.retry = 0
+        self.lock = threading.Lock()
+
+
+class ReplicaPool:
+    """
+    Class that spreads the calls to an object across its replicas.
+
+    Attributes:
+        communicator (Ice.Communicator): The communicator that creates the proxies.
+        identity (str): Identity of the object served by every replica.
+        replicas (list): The 'Replica' objects of the pool.
+        cast: Proxy class used to type the proxies (e.g., CalculatorPro.OperationsPrx).
+        strategy (str): Selection strategy, 'p2c' or 'least'.
+        cooldown (float): Seconds that a failed replica is skipped (times its consecutive failures, up to 8).
+        policy (CallPolicy): Deadline, retries and hedging of the calls. Without it, a call that cannot
+                             reach a replica is retried once on each other replica.
+        retried (int): Number of calls retried.
+        hedged (int): Number of calls hedged.
+
+    Methods:
+        from_proxy (communicator, proxy, cast): Creates a pool with a replica per endpoint of a proxy.
+        acquire: Picks a replica for a call.
+        release (replica, failed): Records the end of a call.
+        invoke (operation, *args): Calls an operation and returns its result.
+        begin (operation, *args): Starts an asynchronous call and returns its 'Ice.Future'.
+    """
+    def __init__(self, communicator, identity: str, endpoints: list, cast,
+                 strategy: str = 'p2c', cooldown: float = 5.0, policy: resilience.CallPolicy = None):
+        """Constructor of the class. The endpoints are given as accepted by 'parse_endpoint'."""
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown strategy: {strategy}')
+        self.communicator = communicator
+        self.identity = identity
+        self.cast = cast
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.policy = policy
+        self.retried = 0
+        self.hedged = 0
+        self.replicas = [Replica(parse_endpoint(endpoint)) for endpoint in endpoints]
+        if not self.replicas:
+            raise ValueError('At least one endpoint is required')
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_proxy(cls, communicator, proxy: str, cast, **kwargs):
+        """Creates a pool for the object of a proxy, with a replica per endpoint of the proxy."""
+        prx = communicator.stringToProxy(proxy)
+        identity = communicator.identityToString(prx.ice_getIdentity())
+        return cls(communicator, identity, [str(e) for e in prx.ice_getEndpoints()], cast, **kwargs)
+
+    def _proxy(self, replica: Replica):
+        """Returns the proxy of a replica, creating it on first use (no round trip is made)."""
+        if replica.proxy is None:
+            proxy = self.cast.uncheckedCast(self.communicator.stringToProxy(
+                f'{self.identity}:{replica.endpoint}'
+            ))
+            replica.proxy = self.policy.apply(proxy) if self.policy else proxy                 # With the deadline of the policy.
+        return replica.proxy
+
+    def acquire(self) -> Replica:
+        """Picks a replica (among the healthy ones, if any) and counts the call as outstanding."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [r for r in self.replicas if r.down_until <= now] or self.replicas
+            if self.strategy == 'p2c' and len(candidates) > 2:
+                candidates = random.sample(candidates, 2)
+            replica = min(candidates, key=lambda r: r.outstanding)
+            replica.outstanding += 1
+            return replica
+
+    def release(self, replica: Replica, failed: bool = False) -> None:
+        """Records the end of a call and, if it could not reach the replica, marks it as unhealthy."""
+        with self._lock:
+            replica.outstanding -= 1
+            if failed:
+                replica.failures += 1
+                replica.down_until = time.monotonic() + self.cooldown * min(replica.failures, 8)     # Back off on repeated failures.
+                replica.proxy = None                                                            # Reconnect lazily when it is picked again.
+            else:
+                replica.failures = 0
+                replica.down_until = 0.0
+
+    def _failed(self, ex: Exception) -> bool:
+        """Returns whether a call failed to get an answer from its replica (which is then skipped for a while)."""
+        return isinstance(ex, FAILURES) or (self.policy is not None and isinstance(ex, self.policy.retry_on))
+
+    def _retry(self, operation: str, ex: Exception, retry: int):
+        """Returns the delay in seconds before retrying a failed call, or None if it must not be retried."""
+        unreachable = isinstance(ex, resilience.NOT_SENT)                                       # Fail over at once to the other replicas.
+        if self.policy is None:
+            safe, budget = isinstance(ex, FAILURES), len(self.replicas) - 1
+        else:
+            safe = self.policy.retryable(operation, ex)
+            budget = max(self.policy.retries, len(self.replicas) - 1 if unreachable else 0)
+        if not safe or retry >= budget:
+            return None
+        with self._lock:
+            self.retried += 1
+        return 0.0 if self.policy is None or unreachable else self.policy.delay(retry)
+
+    def _hedging(self, operation: str) -> bool:
+        """Returns whether the calls of an operation are hedged."""
+        return (self.policy is not None and self.policy.hedge > 0
+                and operation in self.policy.idempotent and len(self.replicas) > 1)
+
+    def invoke(self, operation: str, *args):
+        """Calls an operation on a replica, retrying it (on the replica picked then) as the policy allows."""
+        if self._hedging(operation):
+            return self.begin(operation, *args).result()                                        # Wait for the first reply of the hedged calls.
+
+        retry = 0
+        while True:
+            replica = self.acquire()
+            try:
+                result = getattr(self._proxy(replica), operation)(*args)
+            except Exception as ex:
+                self.release(replica, self._failed(ex))
+                delay = self._retry(operation, ex, retry)
+                if delay is None:
+                    raise
+                retry += 1
+                time.sleep(delay)
+                continue
+            self.release(replica)
+            return result
+
+    def begin(self, operation: str, *args) -> Ice.Future:
+        """Starts an asynchronous call on a replica (retried and hedged as the policy allows) and returns its 'Ice.Future'."""
+        call = _Call(operation, args)
+        self._begin(call)
+        if self._hedging(operation):
+            resilience.SCHEDULER.after(self.policy.hedge / 1e3, lambda: self._hedge(call))
+        return call.future
+
+    def _hedge(self, call: _Call) -> None:
+        """Sends a call without reply yet to another replica."""
+        if not call.future.done():
+            with self._lock:
+                self.hedged += 1
+            self._begin(call)
+
+    def _begin(self, call: _Call) -> None:
+        """Sends an attempt of a call to a replica; the first reply completes the future of the call."""
+        if call.future.done():                                                                  # Answered while the retry waited.
+            return
+        replica = self.acquire()
+        try:
+            invocation = getattr(self._proxy(replica), call.operation + 'Async')(*call.args)
+        except Exception as ex:
+            self.release(replica)
+            call.future.set_exception(ex)
+            return
+        with call.lock:
+            call.pending.append(invocation)
+
+        def completed(invocation):
+            with call.lock:
+                call.pending.remove(invocation)
+                others = list(call.pending)
+            try:
+                result = invocation.result()
+            except Exception as ex:
+                self.release(replica, self._failed(ex))
+                if call.future.done():                                                          # Canceled, or another attempt already answered.
+                    return
+                with call.lock:
+                    delay = self._retry(call.operation, ex, call.retry)
+                    call.retry += delay is not None
+                if delay is None:
+                    if not others:                                                              # Otherwise, wait for the hedged attempt.
+                        call.future.set_exception(ex)
+                elif delay > 0:
+                    resilience.SCHEDULER.after(delay, lambda: self._begin(call))
+                else:
+                    self._begin(call)
+            else:
+                self.release(replica)
+                call.future.set_result(result)
+                for other in others:                                                            # The slower attempts are no longer needed.
+                    other.cancel()
+
+        invocation.add_done_callback(completed)
+
+    def __repr__(self):
+        return f'{self.identity} {self.replicas}'
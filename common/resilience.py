@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""
+Deadlines, retries and hedged requests of the calls of a client, shared by the client scripts.
+
+Without a deadline, a call waits for its reply forever, so a slow or stuck
+server stalls the client. The policy gives every call:
+  * A deadline (--deadline): the proxies wait at most that many milliseconds
+    for each reply (ice_invocationTimeout) and raise an
+    'Ice.InvocationTimeoutException' after it.
+  * Retries (--retries) with a jittered exponential backoff (--backoff): the
+    delay before retry 'n' is drawn at random between 0 and backoff * 2^n
+    (up to MAX_BACKOFF), so the clients that failed together do not retry
+    together. A call is retried if the server did not run it (it could not
+    be reached, or it rejected the call, e.g., with 'Overloaded') or if the
+    operation is idempotent (declared 'idempotent' in Slice), since then
+    running it twice does no harm.
+  * Hedged requests (--hedge): if the reply of an idempotent call has not
+    arrived after that many milliseconds, the same request is sent to another
+    replica, and the first reply wins (the other call is canceled). A slow
+    replica then costs the hedging delay instead of its whole latency, at the
+    price of a few extra requests (those slower than the delay, e.g., 5% if
+    it is the p95 latency).
+
+The backoff and hedging delays are timed by a single scheduler thread shared
+by the whole process.
+
+Usage (in a client script):
+    resilience.add_resilience_args(parser)
+    policy = resilience.CallPolicy.from_args(args, idempotent=OPERATIONS, retry_on=(CalculatorPro.Overloaded,))
+    pool = replicas.ReplicaPool(communicator, 'AddSub', endpoints, CalculatorPro.OperationsPrx, policy=policy)
+    server = policy.apply(proxies.get(...))
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import time, heapq, random, itertools, threading                                                # Import the time, heapq, random, itertools and threading libraries.
+import argparse                                                                                 # Import the argparse library for cmd arguments.
+import Ice                                                                                      # Import the Ice library (Ice runtime).
+
+
+MAX_BACKOFF = 2.0                                                                               # Maximum delay (seconds) before a retry.
+
+NOT_SENT = (Ice.ConnectFailedException, Ice.DNSException)                                       # Failures that guarantee the request did not reach the server.
+
+UNCERTAIN = (Ice.ConnectionLostException, Ice.TimeoutException, Ice.SocketException)            # Failures after which the request may have run on the server
+                                                                                                # (including the expired deadlines, InvocationTimeoutException).
+
+
+def add_resilience_args(parser: argparse.ArgumentParser, retries: bool = True, hedging: bool = True) -> None:
+    """
+    Add the deadline, retry and hedging options to a parser.
+
+    Args:
+        parser: The 'argparse.ArgumentParser' of the script.
+        retries: Add the retry options.
+        hedging: Add the hedging option (for clients with replicas).
+    """
+    parser.add_argument('--deadline', '-dl', type=int, default=0,
+                        help='Milliseconds to wait for each reply. Use 0 (default) to wait forever.')
+
+    if retries:
+        parser.add_argument('--retries', '-rt', type=int, default=0,
+                            help='Number of times a failed call is retried, if safe (default: 0).')
+
+        parser.add_argument('--backoff', type=float, default=10.0,
+                            help='Base delay in milliseconds before a retry, doubled on each retry and jittered (default: 10).')
+
+    if hedging:
+        parser.add_argument('--hedge', type=float, default=0.0,
+                            help=('Milliseconds after which an idempotent call without reply is also sent to another '
+                                  'replica, e.g., the p95 latency. Use 0 (default) to disable it.'))
+
+
+class Scheduler:
+    """
+    Class that runs functions after a delay, in a single background thread.
+
+    Methods:
+        after (delay, function): Runs a function after the given seconds.
+    """
+    def __init__(self):
+        self._queue = []                                                                        # Heap of (time, sequence, function) items.
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def after(self, delay: float, function) -> None:
+        """Runs 'function()' after the given seconds (exceptions are ignored)."""
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+                self._thread.start()
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._sequence), function))
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    self._condition.wait(self._queue[0][0] - time.monotonic() if self._queue else None)
+                _, _, function = heapq.heappop(self._queue)
+            try:
+                function()
+            except Exception:
+                pass                                                                            # The function reports its own errors (e.g., in a future).
+
+
+SCHEDULER = Scheduler()                                                                         # Scheduler shared by the whole process.
+
+
+class CallPolicy:
+    """
+    Class that holds the deadline, retry and hedging policy of the calls.
+
+    Attributes:
+        deadline (int): Milliseconds to wait for each reply (0 to wait forever).
+        retries (int): Maximum number of retries of a call.
+        backoff (float): Base delay in milliseconds before a retry.
+        hedge (float): Milliseconds after which an idempotent call is hedged (0 to disable it).
+        idempotent (frozenset): Operations that can safely run more than once.
+        retry_on (tuple): User exceptions meaning that the server did not run the call (e.g., 'Overloaded').
+
+    Methods:
+        from_args (args, idempotent, retry_on): Creates the policy of the command-line options.
+        apply (proxy): Returns the proxy with the deadline.
+        retryable (operation, ex): Returns whether a failed call can be retried.
+        delay (retry): Returns the jittered delay before a retry.
+    """
+    def __init__(self, deadline: int = 0, retries: int = 0, backoff: float = 10.0, hedge: float = 0.0,
+                 idempotent=(), retry_on: tuple = ()):
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.idempotent = frozenset(idempotent)
+        self.retry_on = tuple(retry_on)
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace, idempotent=(), retry_on: tuple = ()):
+        """Creates the policy of the command-line options (those not added take their defaults)."""
+        return cls(args.deadline, getattr(args, 'retries', 0), getattr(args, 'backoff', 10.0),
+                   getattr(args, 'hedge', 0.0), idempotent, retry_on)
+
+    def apply(self, proxy):
+        """Returns the proxy with the deadline (the same proxy if there is none)."""
+        return proxy.ice_invocationTimeout(self.deadline) if self.deadline > 0 else proxy
+
+    def retryable(self, operation: str, ex: Exception) -> bool:
+        """Returns whether a call that failed with the given exception can be sent again."""
+        return (isinstance(ex, NOT_SENT + self.retry_on)
+                or (isinstance(ex, UNCERTAIN) and operation in self.idempotent))
+
+    def delay(self, retry: int) -> float:
+        """Returns the delay in seconds before the given retry (0 for the first): full jitter."""
+        return random.uniform(0.0, min(MAX_BACKOFF, self.backoff / 1e3 * (1 << min(retry, 16))))
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Supervisor script that runs several worker processes of a server, so that a
+service can use all the CPU cores of a host (each Python process is limited
+to about one core by the GIL).
+
+Worker i listens on port BASE_PORT + i. A worker that exits unexpectedly is
+restarted (waiting longer after each consecutive crash). The script prints
+one proxy per object with the endpoints of all the workers: plain Ice clients
+connect to one of them at random, and the replica pool of the clients
+(common/replicas.py) spreads every call across all of them. The proxies can
+also be written to a JSON registry file. The arguments after '--' are passed
+to every worker, replacing '{worker}' and '{port}' with its index and port.
+
+Only stateless services can be spread that way. The bank keeps the accounts
+in each worker, and a transfer or a batch spans several accounts, so it runs
+a single worker (use its --threads for concurrency), and more workers are
+refused. The guessing game workers keep their own games, but the proxy of a
+game or tournament points to the worker that started it, so the clients
+only use the multi-endpoint proxy of 'GameFactory' to start them; the
+shared 'NumberGuessingGame' object has a round per worker (a client stays on
+one worker through its connection).
+
+Usage: launcher.py [-h] [--workers WORKERS] [--base-port BASE_PORT] [--host HOST] [--registry REGISTRY] [--pin]
+                   {printer,calculator,calculator-pro,bank,guessing-game} [-- SERVER ARGS ...]
+
+Multiprocess server launcher script.
+
+positional arguments:
+  {printer,calculator,calculator-pro,bank,guessing-game}
+                        Service to run.
+
+options:
+  -h, --help            show this help message and exit
+  --workers WORKERS, -w WORKERS
+                        Number of worker processes. Use the number of CPU cores (default, or the most allowed by the service) or give a number.
+  --base-port BASE_PORT, -p BASE_PORT
+                        Port of the first worker; the others use the following ones (default: 10000).
+  --host HOST, -ht HOST
+                        Host advertised in the proxies. Use localhost (default) or give an IP address.
+  --registry REGISTRY, -r REGISTRY
+                        JSON file where the proxies of the service are written (disabled by default).
+  --pin                 Pin each worker to a CPU core (Linux only).
+
+Examples:
+  python3 launcher.py calculator-pro --workers 4 -- --log-level WARNING
+  python3 launcher.py bank -- --threads 4 --data-dir bank_data/worker-{worker}
+
+Author: Andres J. Sanchez-Fernandez
+Email: sfandres@unex.es
+Date: 2026-10-18
+Version: v1
+"""
+
+
+import sys, os, time, json, signal                                                              # Import the sys, os, time, json and signal libraries.
+import subprocess                                                                               # Import the subprocess library to run the workers.
+import argparse                                                                                 # Import the argparse library for cmd arguments.
+from collections import namedtuple                                                              # Import the namedtuple factory for the service table.
+
+
+Service = namedtuple('Service', ['folder', 'identities', 'args', 'note', 'max_workers'],        # Folder of the server script, objects it serves, default worker
+                     defaults=(None,))                                                          # arguments, a note about the state kept by each worker and the
+                                                                                                # maximum number of workers (None for no limit).
+SERVICES = {
+    'printer': Service('P04_1_printer', ['SimplePrinter'], [], None),
+    'calculator': Service('P04_2_basic_calculator', ['BasicCalculator'], [], None),
+    'calculator-pro': Service('P05_1_calculator_pro', ['AddSub', 'MulDiv'], [], None),
+    'bank': Service('P05_2_bank', ['Account', 'Teller'], ['--data-dir', 'bank_data/worker-{worker}'],
+                    'The accounts are kept by the worker, and transfers span two accounts: '
+                    'a single worker is run (use --threads for concurrency).', max_workers=1),
+    'guessing-game': Service('PE_1_guessing_game', ['GameFactory', 'NumberGuessingGame'], [],
+                             'Each worker keeps its own games: start them through GameFactory, whose games and tournaments '
+                             'point to the worker that started them. NumberGuessingGame has a round per worker.'),
+}
+
+ROOT = os.path.dirname(os.path.abspath(__file__))                                               # Repository root, where the service folders are.
+
+
+def get_args() -> argparse.Namespace:
+    """
+    Parse and retrieve command-line arguments.
+
+    Returns:
+        An 'argparse.Namespace' object containing the parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description='Multiprocess server launcher script.')        # Parser creation and description.
+
+    parser.add_argument('service', type=str, choices=SERVICES,                                  # Options.
+                        help='Service to run.')
+
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help=('Number of worker processes. Use the number of CPU cores (default, '
+                              'or the most allowed by the service) or give a number.'))
+
+    parser.add_argument('--base-port', '-p', type=int, default=10000,
+                        help='Port of the first worker; the others use the following ones (default: 10000).')
+
+    parser.add_argument('--host', '-ht', type=str, default='localhost',
+                        help='Host advertised in the proxies. Use localhost (default) or give an IP address.')
+
+    parser.add_argument('--registry', '-r', type=str, default=None,
+                        help='JSON file where the proxies of the service are written (disabled by default).')
+
+    parser.add_argument('--pin', action='store_true',
+                        help='Pin each worker to a CPU core (Linux only).')
+
+    argv = sys.argv[1:]                                                                         # The arguments after '--' are for the workers.
+    server_args = []
+    if '--' in argv:
+        server_args = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+
+    args = parser.parse_args(argv)                                                              # Parse and return the arguments.
+    args.server_args = server_args
+
+    limit = SERVICES[args.service].max_workers                                                  # The stateful services cannot be spread
+    if args.workers is None:                                                                    # over several workers.
+        args.workers = min(os.cpu_count(), limit or os.cpu_count())
+    elif limit and args.workers > limit:
+        parser.error(f'{args.service} runs at most {limit} worker(s): {SERVICES[args.service].note}')
+    return args
+
+
+class Worker:
+    """
+    Class that holds the state of a worker process.
+
+    Attributes:
+        index (int): Index of the worker.
+        port (int): Port the worker listens on.
+        process (subprocess.Popen): The running process (None while waiting for a restart).
+        started (float): Time (monotonic) when the process was started.
+        crashes (int): Number of consecutive unexpected exits.
+        restart_at (float): Time (monotonic) when the process is restarted.
+    """
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.process = None
+        self.started = 0.0
+        self.crashes = 0
+        self.restart_at = 0.0
+
+
+class Supervisor:
+    """
+    Class that starts the workers of a service and restarts them when they exit.
+
+    Attributes:
+        service (Service): The service run by the workers.
+        workers (list): The 'Worker' objects.
+        host (str): Host advertised in the proxies.
+        server_args (list): Arguments of the server script of every worker.
+        pin (bool): Whether each worker is pinned to a CPU core.
+
+    Methods:
+        proxies: Returns the proxy of each object, with the endpoints of all the workers.
+        start (worker): Starts the process of a worker.
+        run: Supervises the workers until a termination signal is received.
+        stop: Terminates the workers.
+    """
+    def __init__(self, service: Service, workers: int, base_port: int, host: str,
+                 server_args: list, pin: bool = False):
+        self.service = service
+        self.workers = [Worker(i, base_port + i) for i in range(workers)]
+        self.host = host
+        self.server_args = server_args
+        self.pin = pin
+        self._stopping = False
+
+    def proxies(self) -> dict:
+        """Returns the proxy of each object, with the endpoints of all the workers."""
+        endpoints = ':'.join(f'default -h {self.host} -p {w.port}' for w in self.workers)
+        return {identity: f'{identity}:{endpoints}' for identity in self.service.identities}
+
+    def start(self, worker: Worker) -> None:
+        """Starts the process of a worker."""
+        args = [arg.format(worker=worker.index, port=worker.port)
+                for arg in self.service.args + self.server_args]
+        worker.process = subprocess.Popen(
+            [sys.executable, 'server.py', '--port', str(worker.port), *args],
+            cwd=os.path.join(ROOT, self.service.folder)                                         # The Slice modules are generated in the service folder.
+        )
+        worker.started = time.monotonic()
+        if self.pin and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(worker.process.pid, {worker.index % os.cpu_count()})
+        print(f'Worker {worker.index} started (pid {worker.process.pid}, port {worker.port})')
+
+    def run(self) -> None:
+        """Starts the workers and supervises them until a termination signal is received."""
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: setattr(self, '_stopping', True))
+
+        for worker in self.workers:
+            self.start(worker)
+
+        while not self._stopping:
+            now = time.monotonic()
+            for worker in self.workers:
+                if worker.process is None:
+                    if now >= worker.restart_at:                                                # Restart the worker once its delay is over.
+                        self.start(worker)
+                    continue
+
+                code = worker.process.poll()
+                if code is None:
+                    continue
+
+                if now - worker.started > 60:                                                   # A worker that ran for a while starts
+                    worker.crashes = 0                                                          # counting its crashes again.
+                worker.crashes += 1
+                delay = min(2 ** (worker.crashes - 1), 30)
+                print(f'Worker {worker.index} exited with code {code}; restarting in {delay} s')
+                worker.process = None
+                worker.restart_at = now + delay
+            time.sleep(0.2)
+
+        self.stop()
+
+    def stop(self) -> None:
+        """Terminates the workers, killing the ones that do not exit in time."""
+        running = [w.process for w in self.workers if w.process and w.process.poll() is None]
+        for process in running:
+            process.terminate()
+        deadline = time.monotonic() + 5
+        for process in running:
+            try:
+                process.wait(max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                process.kill()
+        print('All the workers have been stopped')
+
+
+def main(args: argparse.Namespace) -> bool:
+    """
+    Main function.
+
+    Args:
+        args: An 'argparse.Namespace' object containing the parsed arguments.
+
+    Returns:
+        A boolean indicating the success of the process.
+    """
+    service = SERVICES[args.service]
+    supervisor = Supervisor(service, max(args.workers, 1), args.base_port, args.host,
+                            args.server_args, args.pin)
+
+    print(f'Service: {args.service} ({len(supervisor.workers)} workers)')                       # Print the proxies that the clients can use.
+    for identity, proxy in supervisor.proxies().items():
+        print(f'Proxy of {identity}: {proxy}')
+    if service.note:
+        print(f'Note: {service.note}')
+
+    if args.registry:                                                                           # Write the registry file, if requested.
+        with open(args.registry, 'w') as f:
+            json.dump({'service': args.service, 'proxies': supervisor.proxies()}, f, indent=2)
+
+    supervisor.run()
+
+    return 0
+
+
+if __name__ == '__main__':
+    args = get_args()                                                                           # Parse and retrieve command-line arguments.
+    sys.exit(main(args))                                                                        # Call the main function and exit with the returned status code.